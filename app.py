@@ -1,6 +1,9 @@
 import streamlit as st
 from features.functions import load_lottie_file
 import streamlit_lottie as st_lottie
+# Installed with ``pip install -e .``; the pages import the same package, so
+# the whole process shares one model registry
+from cnnClassifier.utils.model_registry import model_registry
 
 # App config
 st.set_page_config(
@@ -10,6 +13,16 @@ st.set_page_config(
     initial_sidebar_state="expanded",
 )
 
+# Load and warm up the model once per process, before the first prediction
+@st.cache_resource(show_spinner="Loading model...")
+def warm_up_model():
+    try:
+        model_registry.warm_up("model/model.h5")
+    except Exception as e:
+        st.warning(f"⚠️ Could not warm up model: {str(e)}")
+
+warm_up_model()
+
 # Initialize state
 if 'all_predictions' not in st.session_state:
     st.session_state['all_predictions'] = []
@@ -1,78 +1,150 @@
 import streamlit as st
 import numpy as np
 import tensorflow as tf
-from tensorflow.keras.models import load_model
 from tensorflow.keras.preprocessing import image
+import io
 import os
-import uuid
+from PIL import Image
 
-from src.cnnClassifier.utils.gradcam_utils import explain_image, overlay_heatmap_on_image
-from fpdf import FPDF
+from features.functions import report_download
+from cnnClassifier.utils.gradcam_utils import encode_image, predict_and_explain, render_overlays
+from cnnClassifier.utils.model_registry import model_registry
+from cnnClassifier.utils.prediction_cache import PredictionCache, content_hash
+from cnnClassifier.utils.reports import prediction_report, report_service
+from cnnClassifier.utils.storage import StorageManager
 
 st.header("🧪 Kidney Tumor Prediction", divider="rainbow")
 
 MODEL_PATH = "model/model.h5"
-MODEL = load_model(MODEL_PATH, compile=False)
+CLASS_INDICES_PATH = "model/class_indices.json"
+# Streamlit re-executes this script on every interaction; the registry keeps
+# one loaded copy per process and only reloads when model.h5 changes
+MODEL_HANDLE = model_registry.get(MODEL_PATH)
+MODEL = MODEL_HANDLE.model
 
 UPLOAD_DIR = "uploaded"
+CACHE_DIR = "artifacts/prediction_cache"
 PREDICTION_HISTORY = []
 
-os.makedirs(UPLOAD_DIR, exist_ok=True)
+# Uploads live in a bounded directory: files expire after a day and the
+# least recently used ones are dropped once the quota is reached
+@st.cache_resource
+def get_upload_storage():
+    return StorageManager(UPLOAD_DIR, quota_bytes=1024 * 2**20, ttl_seconds=24 * 3600).start_sweeper()
 
-def generate_pdf_report(label, image_path, save_path):
-    pdf = FPDF()
-    pdf.add_page()
-    pdf.set_font("Arial", size=14)
-    pdf.cell(200, 10, txt="Kidney Tumor Prediction Report", ln=True, align="C")
-    pdf.ln(10)
+UPLOADS = get_upload_storage()
 
-    pdf.set_font("Arial", size=12)
-    pdf.cell(200, 10, txt=f"Prediction: {label}", ln=True)
-    pdf.ln(5)
+# Predictions, heatmaps and reports keyed by image content and model version,
+# so re-uploading a scan skips inference entirely. Raw probabilities are stored
+# as "prediction_probs", apart from PredictionPipeline's decoded "prediction"
+@st.cache_resource
+def get_prediction_cache():
+    return PredictionCache(max_entries=256, disk_dir=CACHE_DIR, max_disk_bytes=512 * 2**20)
 
-    pdf.image(image_path, x=10, y=40, w=100)
-    pdf.output(save_path)
+CACHE = get_prediction_cache()
 
 uploaded_file = st.file_uploader("Upload a kidney CT/MRI scan", type=["jpg", "jpeg", "png"])
 
 if uploaded_file:
-    file_name = f"{uuid.uuid4().hex}_{uploaded_file.name}"
-    file_path = os.path.join(UPLOAD_DIR, file_name)
+    image_bytes = uploaded_file.getvalue()
+    digest = content_hash(image_bytes)
+    extension = os.path.splitext(uploaded_file.name)[1].lower()
+    # Content-addressed name: the same scan uploaded twice is stored once
+    file_path = str(UPLOADS.store(f"{digest}{extension}", image_bytes))
 
-    with open(file_path, "wb") as f:
-        f.write(uploaded_file.getbuffer())
-
-    st.image(file_path, caption="Uploaded Image", use_container_width=True)
+    st.image(image_bytes, caption="Uploaded Image", use_container_width=True)
 
     if st.button("🔍 Predict"):
-        # Preprocess
-        test_image = image.load_img(file_path, target_size=(224, 224))
-        test_array = image.img_to_array(test_image) / 255.0
-        img_array = np.expand_dims(test_array, axis=0).astype(np.float32)
-        img_tensor = tf.convert_to_tensor(img_array)
-
-        # Predict
-        preds = MODEL.predict(img_tensor)
+        version = MODEL_HANDLE.version
+        cached = CACHE.get(digest, version, "prediction_probs")
+
+        if cached is not None:
+            preds = np.asarray(cached["preds"], dtype=np.float32)
+            method_used = cached["method"]
+            heatmap = CACHE.get(digest, version, "heatmap") if method_used else None
+            explain_error = None if heatmap is not None else RuntimeError("no explanation available")
+        else:
+            # Preprocess
+            test_image = image.load_img(file_path, target_size=(224, 224))
+            test_array = image.img_to_array(test_image) / 255.0
+            img_array = np.expand_dims(test_array, axis=0).astype(np.float32)
+            img_tensor = tf.convert_to_tensor(img_array)
+
+            # Predict and explain in one forward pass
+            try:
+                preds, heatmaps, _, method_used = predict_and_explain(img_tensor, MODEL)
+                heatmap = np.asarray(heatmaps[0], dtype=np.float32)
+                explain_error = None
+            except Exception as e:
+                preds, heatmap, method_used = MODEL.predict(img_tensor), None, None
+                explain_error = e
+
+            CACHE.put(digest, version, "prediction_probs", {"preds": np.asarray(preds).tolist(), "method": method_used})
+            if heatmap is not None:
+                CACHE.put(digest, version, "heatmap", heatmap)
+
         if preds.shape[-1] == 1:
             predicted_index = int(preds[0][0] > 0.5)
+            confidence = float(preds[0][0] if predicted_index == 1 else 1 - preds[0][0]) * 100
         else:
             predicted_index = int(np.argmax(preds[0]))
+            confidence = float(preds[0][predicted_index]) * 100
 
-        class_map = {0: "Tumor", 1: "Normal"}
+        class_map = model_registry.get_class_labels(CLASS_INDICES_PATH)
         label = class_map.get(predicted_index, "Unknown")
 
-        st.success(f"✅ Prediction: **{label}**")
-
         # Explainability
+        overlay, explain_warning = None, None
         try:
-            heatmap, pred_index, method_used = explain_image(img_tensor, MODEL)
-            overlay = overlay_heatmap_on_image(heatmap, file_path, alpha=0.45)
-            st.image(overlay, caption=f"Explanation using {method_used.upper()}", use_container_width=True)
+            if explain_error is not None:
+                raise explain_error
+            with Image.open(io.BytesIO(image_bytes)) as original:
+                original_array = np.asarray(original.convert("RGB"))
+            # Encoded once, for both the page and the report
+            overlay = encode_image(render_overlays(heatmap, original_array, alpha=0.45))
         except Exception as e:
-            st.warning(f"⚠️ Could not generate explanation: {str(e)}")
-
-        # PDF report
-        pdf_path = f"{file_path}.pdf"
-        generate_pdf_report(label=label, image_path=file_path, save_path=pdf_path)
-        with open(pdf_path, "rb") as f:
-            st.download_button("📄 Download Report (PDF)", f, file_name="prediction_report.pdf", mime="application/pdf")
+            explain_warning = f"⚠️ Could not generate explanation: {str(e)}"
+
+        # PDF report: rendered on the report workers; the handle lives in the
+        # session and the page shows the button once it is done
+        if CACHE.get(digest, version, "report") is None:
+            st.session_state["report_job"] = report_service.submit(
+                prediction_report,
+                label=label,
+                image=str(UPLOADS.open_path(file_path)),
+                confidence=confidence,
+                overlay=overlay,
+                method=method_used
+            )
+            st.session_state["report_job_ready"] = False
+
+        # Kept in the session so the result survives the rerun that shows the
+        # report button (and any other widget interaction)
+        st.session_state["prediction"] = {
+            "digest": digest,
+            "version": version,
+            "label": label,
+            "confidence": confidence,
+            "overlay": overlay,
+            "method": method_used,
+            "explain_warning": explain_warning
+        }
+
+    result = st.session_state.get("prediction")
+    if result is not None and result["digest"] == digest:
+        st.success(f"✅ Prediction: **{result['label']}** ({result['confidence']:.2f}% confidence)")
+        if result["explain_warning"]:
+            st.warning(result["explain_warning"])
+        if result["overlay"] is not None:
+            st.image(result["overlay"], caption=f"Explanation using {result['method'].upper()}", use_container_width=True)
+
+        report = CACHE.get(digest, result["version"], "report")
+        if report is None:
+            report_download(
+                "report_job",
+                "📄 Download Report (PDF)",
+                "prediction_report.pdf",
+                on_ready=lambda pdf: CACHE.put(digest, result["version"], "report", pdf)
+            )
+        else:
+            st.download_button("📄 Download Report (PDF)", report, file_name="prediction_report.pdf", mime="application/pdf")
@@ -1,75 +1,74 @@
 import streamlit as st
 import pandas as pd
-from sklearn.metrics import accuracy_score, precision_score, recall_score, f1_score, confusion_matrix
+from cnnClassifier.utils.fairness import (
+    read_confusion_counts, metrics_from_counts, fairness_gaps, bootstrap_intervals, permutation_test, GAP_METRICS
+)
 
 st.title("⚖️ Bias Dashboard")
 
 st.markdown(
     """
-    Upload a CSV with columns for **ground truth**, **predictions**, and a **demographic/group column** (e.g., gender, hospital).
-    We'll compute accuracy and fairness metrics per group.
+    Upload a CSV (or Parquet) file with columns for **ground truth**, **predictions**, and one or more **demographic/group columns** (e.g., gender, hospital).
+    We'll compute accuracy and fairness metrics per group, or per combination of groups when several are selected.
     """
 )
 
-uploaded = st.file_uploader("Upload evaluation CSV", type=["csv"])
+uploaded = st.file_uploader("Upload evaluation CSV", type=["csv", "parquet"])
 
 if uploaded:
-    df = pd.read_csv(uploaded)
+    # Only a preview is parsed up front; the analysis streams the file in chunks
+    if uploaded.name.endswith(".parquet"):
+        import pyarrow.parquet as pq
+        preview = next(pq.ParquetFile(uploaded).iter_batches(batch_size=100)).to_pandas()
+    else:
+        preview = pd.read_csv(uploaded, nrows=100)
     st.write("Preview:")
-    st.dataframe(df.head())
+    st.dataframe(preview.head())
 
     # Let user pick columns
     with st.form("bias_form"):
-        all_cols = list(df.columns)
+        all_cols = list(preview.columns)
         y_true_col = st.selectbox("Ground truth column", all_cols)
         y_pred_col = st.selectbox("Prediction column", all_cols)
-        group_col = st.selectbox("Group column (e.g., gender/hospital)", all_cols)
+        group_cols = st.multiselect("Group column(s) (e.g., gender/hospital)", all_cols)
+        with_intervals = st.checkbox("Bootstrap confidence intervals and permutation p-values", value=True)
+        n_resamples = st.number_input("Resamples", min_value=100, max_value=100_000, value=2000, step=500)
+        seed = st.number_input("Random seed", min_value=0, value=0, step=1)
         submit = st.form_submit_button("Analyze")
 
-    if submit:
-        # Normalize labels to 0/1 if needed
-        def to_binary(x):
-            if isinstance(x, str):
-                return 1 if x.lower() in ["tumor", "1", "positive", "yes"] else 0
-            return int(x)
-
-        df["y_true_bin"] = df[y_true_col].apply(to_binary)
-        df["y_pred_bin"] = df[y_pred_col].apply(to_binary)
-
-        groups = df[group_col].unique()
-        rows = []
-        for g in groups:
-            dfg = df[df[group_col] == g]
-            y_true = dfg["y_true_bin"]
-            y_pred = dfg["y_pred_bin"]
-            acc = accuracy_score(y_true, y_pred)
-            prec = precision_score(y_true, y_pred, zero_division=0)
-            rec = recall_score(y_true, y_pred, zero_division=0)  # TPR
-            f1 = f1_score(y_true, y_pred, zero_division=0)
+    if submit and not group_cols:
+        st.warning("Select at least one group column.")
+    elif submit:
+        uploaded.seek(0)
+        try:
+            counts = read_confusion_counts(uploaded, y_true_col, y_pred_col, group_cols)
+        except ValueError as e:
+            st.error(f"❌ {e}")
+            st.stop()
+        result_df = metrics_from_counts(counts).sort_values(by="accuracy", ascending=False)
+        group_key = "group" if len(group_cols) > 1 else group_cols[0]
 
-            # For FPR we need TN/FP
-            tn, fp, fn, tp = confusion_matrix(y_true, y_pred, labels=[0,1]).ravel()
-            fpr = fp / (fp + tn + 1e-9)
-
-            rows.append({
-                group_col: g,
-                "n": len(dfg),
-                "accuracy": acc,
-                "precision": prec,
-                "recall_TPR": rec,
-                "FPR": fpr,
-                "f1": f1,
-            })
-
-        result_df = pd.DataFrame(rows).sort_values(by="accuracy", ascending=False)
         st.subheader("Per-group metrics")
         st.dataframe(result_df, use_container_width=True)
 
         # Fairness gaps (max difference between best and worst groups)
-        for metric in ["accuracy", "recall_TPR", "FPR"]:
-            gap = result_df[metric].max() - result_df[metric].min()
-            st.write(f"**{metric} gap:** {gap:.3f}")
+        if with_intervals:
+            groups_ci, gaps_ci = bootstrap_intervals(counts, n_resamples=int(n_resamples), seed=int(seed))
+            p_values = permutation_test(counts, n_permutations=int(n_resamples), seed=int(seed))
+            for metric in GAP_METRICS:
+                low, high = gaps_ci.loc[metric, ["low", "high"]]
+                st.write(
+                    f"**{metric} gap:** {gaps_ci.loc[metric, 'gap']:.3f} "
+                    f"(95% CI {low:.3f}–{high:.3f}, permutation p = {p_values.loc[metric, 'p_value']:.4f})"
+                )
+
+            st.subheader("Per-group 95% confidence intervals")
+            interval_cols = [f"{m}_{side}" for m in GAP_METRICS for side in ("low", "high")]
+            st.dataframe(groups_ci[[group_key, "n"] + interval_cols], use_container_width=True)
+        else:
+            for metric, gap in fairness_gaps(result_df).items():
+                st.write(f"**{metric} gap:** {gap:.3f}")
 
-        st.bar_chart(result_df.set_index(group_col)[["accuracy", "recall_TPR", "FPR"]])
+        st.bar_chart(result_df.set_index(group_key)[GAP_METRICS])
 else:
-    st.info("Please upload a CSV to see bias metrics.")
\ No newline at end of file
+    st.info("Please upload a CSV to see bias metrics.")
@@ -1,6 +1,6 @@
 import streamlit as st
-from fpdf import FPDF
-import base64
+from features.functions import report_download
+from cnnClassifier.utils.reports import card_report, report_service
 
 st.set_page_config(page_title="Model & Data Cards", page_icon="📄")
 
@@ -46,26 +46,6 @@ st.markdown(model_card_content)
 st.markdown("---")
 st.markdown(data_card_content)
 
-class PDF(FPDF):
-    def header(self):
-        self.set_font("Arial", "B", 16)
-        self.cell(0, 10, "Kidney Tumor Classifier - Model & Data Card", ln=True, align="C")
-        self.ln(10)
-
-    def chapter_title(self, title):
-        self.set_font("Arial", "B", 14)
-        self.cell(0, 10, title, ln=True)
-        self.ln(5)
-
-    def chapter_body(self, body):
-        self.set_font("Arial", "", 12)
-        self.multi_cell(0, 10, body)
-        self.ln()
-
-    def add_section(self, title, body):
-        self.chapter_title(title)
-        self.chapter_body(body)
-
 model_card_plain = """Model Name: Kidney Tumor Classifier
 Model Type: CNN (Convolutional Neural Network)
 Framework: TensorFlow / Keras
@@ -95,20 +75,18 @@ Data Bias Notes:
 - May lack diversity across ethnicity.
 - Needs testing on pediatric populations."""
 
-# Generate PDF
-pdf = PDF()
-pdf.add_page()
-pdf.add_section("Model Card", model_card_plain)
-pdf.add_section("Data Card", data_card_plain)
-
-# Save locally
-pdf_path = "model_data_card.pdf"
-pdf.output(pdf_path)
-
-# Show download link
-with open(pdf_path, "rb") as f:
-    base64_pdf = base64.b64encode(f.read()).decode('utf-8')
-    st.markdown(
-        f'<a href="data:application/pdf;base64,{base64_pdf}" download="Model_Data_Card.pdf">📥 Download Model & Data Card as PDF</a>',
-        unsafe_allow_html=True
-    )
+# The card is static: render it once per process on the report workers and
+# reuse the same bytes on every page render. The page never waits for it; the
+# download button appears once the handle kept in the session is done
+st.session_state["model_data_card_pdf"] = report_service.static(
+    "model_data_card",
+    card_report,
+    "Kidney Tumor Classifier - Model & Data Card",
+    [("Model Card", model_card_plain), ("Data Card", data_card_plain)]
+)
+
+report_download(
+    "model_data_card_pdf",
+    "📥 Download Model & Data Card as PDF",
+    "Model_Data_Card.pdf"
+)
@@ -1,6 +1,39 @@
 import json
+import streamlit as st
 
 def load_lottie_file(path: str):
     """Utility to read lottie JSON files safely."""
     with open(path, "r", encoding="utf-8") as f:
-        return json.load(f)
\ No newline at end of file
+        return json.load(f)
+
+@st.fragment(run_every=1.0)
+def _wait_for_report(state_key: str):
+    # Polls while the PDF renders; the full rerun on completion renders the
+    # button instead, and this fragment (with its timer) is no longer called
+    if st.session_state[state_key].done():
+        st.rerun()
+    st.caption("⏳ Preparing PDF report...")
+
+def report_download(state_key: str, label: str, file_name: str, on_ready=None):
+    """Download button for the ReportHandle kept in ``st.session_state[state_key]``
+
+    The page never waits for the PDF: while it renders, a fragment polls the
+    handle every second and reruns the page once it is done, after which
+    the button is shown and polling stops. ``on_ready`` is called once with
+    the PDF bytes, e.g. to cache them.
+    """
+    handle = st.session_state.get(state_key)
+    if handle is None:
+        return
+    if not handle.done():
+        _wait_for_report(state_key)
+        return
+    try:
+        report = handle.result()
+    except Exception as e:
+        st.warning(f"⚠️ Could not generate report: {str(e)}")
+        return
+    if on_ready is not None and not st.session_state.get(f"{state_key}_ready"):
+        on_ready(report)
+        st.session_state[f"{state_key}_ready"] = True
+    st.download_button(label, report, file_name=file_name, mime="application/pdf")
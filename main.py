@@ -1,9 +1,23 @@
 from cnnClassifier.pipeline.stage_01_data_ingestion import DataIngestionTrainingPipeline
+from cnnClassifier.pipeline.stage_08_data_split import DataSplitPipeline
+from cnnClassifier.pipeline.stage_05_dataset_cache import DatasetCachePipeline
 from cnnClassifier.pipeline.stage_02_prepare_base_model import PrepareBaseModelTrainingPipeline
 from cnnClassifier.pipeline.stage_03_model_training import ModelTrainingPipeline
 from cnnClassifier.pipeline.stage_04_model_evaluation import EvaluationPipeline
+from cnnClassifier.pipeline.stage_06_model_quantization import ModelQuantizationPipeline
+from cnnClassifier.constants import PARAMS_FILE_PATH
+from cnnClassifier.utils.common import read_yaml
+from cnnClassifier.utils.distribute import uses_multi_worker
 from cnnClassifier import logger
 
+# MultiWorkerMirroredStrategy must be created before any other TensorFlow op,
+# but the stages ahead of training run TensorFlow in this same process
+if uses_multi_worker(read_yaml(PARAMS_FILE_PATH).DISTRIBUTION):
+    raise RuntimeError(
+        "multi-worker training cannot run from main.py: unset TF_CONFIG (or set DISTRIBUTION: none) to run "
+        "the pipeline here, or use dvc repro / 'cnnClassifier launch', which start training in its own process"
+    )
+
 STAGE_NAME = "Data Ingestion stage"
 try:
    logger.info(f">>>>>> stage {STAGE_NAME} started <<<<<<") 
@@ -15,6 +29,30 @@ except Exception as e:
         raise e
 
 
+STAGE_NAME = "Data split stage"
+try:
+   logger.info(f"*******************")
+   logger.info(f">>>>>> stage {STAGE_NAME} started <<<<<<")
+   data_split = DataSplitPipeline()
+   data_split.main()
+   logger.info(f">>>>>> stage {STAGE_NAME} completed <<<<<<\n\nx==========x")
+except Exception as e:
+        logger.exception(e)
+        raise e
+
+
+STAGE_NAME = "Dataset cache stage"
+try:
+   logger.info(f"*******************")
+   logger.info(f">>>>>> stage {STAGE_NAME} started <<<<<<")
+   dataset_cache = DatasetCachePipeline()
+   dataset_cache.main()
+   logger.info(f">>>>>> stage {STAGE_NAME} completed <<<<<<\n\nx==========x")
+except Exception as e:
+        logger.exception(e)
+        raise e
+
+
 STAGE_NAME = "Prepare base model"
 try: 
    logger.info(f"*******************")
@@ -47,4 +85,17 @@ try:
 
 except Exception as e:
         logger.exception(e)
-        raise e
\ No newline at end of file
+        raise e
+
+
+STAGE_NAME = "Model quantization stage"
+try:
+   logger.info(f"*******************")
+   logger.info(f">>>>>> stage {STAGE_NAME} started <<<<<<")
+   model_quantization = ModelQuantizationPipeline()
+   model_quantization.main()
+   logger.info(f">>>>>> stage {STAGE_NAME} completed <<<<<<\n\nx==========x")
+
+except Exception as e:
+        logger.exception(e)
+        raise e
@@ -0,0 +1,304 @@
+import os
+import sys
+import shutil
+import argparse
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from cnnClassifier import logger
+from cnnClassifier.utils.common import imageBytesToArray
+
+# Kept in sync with components.dataset_cache, which is not imported here so
+# decode workers never load TensorFlow
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp", ".ppm", ".tif", ".tiff")
+PATH_COLUMN = "path"
+LABEL_COLUMN = "label"
+PREDICTION_COLUMN = "prediction"
+CONFIDENCE_COLUMN = "confidence"
+ERROR_COLUMN = "error"
+
+
+def _decode_batch(paths, target_size):
+    """Decode worker: one batch of files -> (uint8 arrays, per-file errors)
+
+    Failed files get an all-zero image and an error message.
+    """
+    images = np.zeros((len(paths),) + tuple(target_size) + (3,), dtype=np.uint8)
+    errors = [None] * len(paths)
+    for i, path in enumerate(paths):
+        try:
+            with open(path, "rb") as f:
+                images[i] = imageBytesToArray(f.read(), target_size)
+        except Exception as e:
+            errors[i] = f"{type(e).__name__}: {e}"
+    return images, errors
+
+
+def collect_images(source: Path, metadata: Path = None, label_column: str = None, class_names=()) -> pd.DataFrame:
+    """Table of images to score with any metadata columns
+
+    ``source`` is either a directory, walked recursively, or a CSV manifest
+    with a ``path`` column (relative paths resolve against the manifest's
+    directory). For directories the ground truth is taken from the parent
+    folder when it names a class, and ``metadata`` may add columns joined on
+    the path relative to ``source``.
+    """
+    source = Path(source)
+    if source.is_dir():
+        paths = sorted(
+            os.path.relpath(os.path.join(root, name), source)
+            for root, _, files in os.walk(source)
+            for name in files if name.lower().endswith(IMAGE_EXTENSIONS)
+        )
+        table = pd.DataFrame({PATH_COLUMN: paths})
+        by_name = {name.lower(): name for name in class_names}
+        parents = table[PATH_COLUMN].map(lambda p: os.path.basename(os.path.dirname(p)).lower())
+        if parents.isin(by_name).any():
+            table[LABEL_COLUMN] = parents.map(by_name)
+        if metadata is not None:
+            table = table.merge(pd.read_csv(metadata), on=PATH_COLUMN, how="left", suffixes=("", "_metadata"))
+        base = source
+    else:
+        table = pd.read_csv(source)
+        if PATH_COLUMN not in table.columns:
+            raise ValueError(f"manifest {source} has no '{PATH_COLUMN}' column")
+        base = source.parent
+
+    if label_column and label_column != LABEL_COLUMN:
+        table = table.rename(columns={label_column: LABEL_COLUMN})
+    table[PATH_COLUMN] = table[PATH_COLUMN].astype(str)
+    table["_file"] = [str(p if os.path.isabs(p) else base / p) for p in table[PATH_COLUMN]]
+    return table
+
+
+def _is_parquet(output: Path) -> bool:
+    return output.suffix == ".parquet"
+
+
+def _parts_dir(output: Path) -> Path:
+    """Where a Parquet run keeps its per-batch part files until it finishes"""
+    return output.with_name(output.name + ".parts")
+
+
+def _parquet_sources(output: Path) -> list:
+    sources = [output] if output.is_file() else []
+    return sources + sorted(_parts_dir(output).glob("part-*.parquet"))
+
+
+def already_scored(output: Path) -> set:
+    """Paths present in a previous (possibly interrupted) run's output"""
+    if _is_parquet(output):
+        sources = _parquet_sources(output)
+        if not sources:
+            return set()
+        return set(pd.concat(pd.read_parquet(p, columns=[PATH_COLUMN]) for p in sources)[PATH_COLUMN])
+    if not output.exists():
+        return set()
+
+    # Drop a half-written last line left by a crash before appending to the file
+    with open(output, "rb+") as f:
+        data = f.read()
+        end = data.rfind(b"\n") + 1
+        if end < len(data):
+            f.truncate(end)
+    if end == 0:
+        return set()
+    return set(pd.read_csv(output, usecols=[PATH_COLUMN])[PATH_COLUMN].astype(str))
+
+
+def _conform(table, schema):
+    """``table`` with ``schema``'s columns and types; missing columns are null"""
+    import pyarrow as pa
+
+    columns = [
+        table.column(field.name).cast(field.type) if field.name in table.column_names
+        else pa.nulls(len(table), field.type)
+        for field in schema
+    ]
+    return pa.Table.from_arrays(columns, schema=schema)
+
+
+class ResultWriter:
+    """Append scored rows to a CSV file, flushing after every batch
+
+    A ``.parquet`` output is written batch by batch to ``part-NNNNN.parquet``
+    files next to it (``<output>.parts``), so an interrupted run can resume,
+    and ``close`` merges them into the single file the Bias Dashboard loads.
+    """
+
+    def __init__(self, output: Path):
+        self.output = Path(output)
+        self.parquet = _is_parquet(self.output)
+        if self.parquet:
+            self.parts = _parts_dir(self.output)
+            os.makedirs(self.parts, exist_ok=True)
+            self._part = len(list(self.parts.glob("part-*.parquet")))
+        else:
+            os.makedirs(self.output.parent, exist_ok=True)
+            self._columns = None
+            if self.output.exists() and self.output.stat().st_size > 0:
+                self._columns = list(pd.read_csv(self.output, nrows=0).columns)
+
+    def write(self, rows: pd.DataFrame):
+        if self.parquet:
+            path = self.parts / f"part-{self._part:05d}.parquet"
+            rows.to_parquet(path.with_suffix(".tmp"), index=False)
+            os.replace(path.with_suffix(".tmp"), path)
+            self._part += 1
+            return
+
+        header = self._columns is None
+        if not header:
+            rows = rows.reindex(columns=self._columns)
+        with open(self.output, "a", newline="") as f:
+            rows.to_csv(f, header=header, index=False)
+            f.flush()
+            os.fsync(f.fileno())
+        if header:
+            self._columns = list(rows.columns)
+
+    def close(self):
+        """Merge the Parquet part files (and any earlier output) into ``output``"""
+        if not self.parquet:
+            return
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        sources = _parquet_sources(self.output)
+        if sources:
+            # One row group at a time, so memory stays at about one batch
+            schema = pa.unify_schemas([pq.read_schema(p) for p in sources])
+            tmp = self.output.with_name(self.output.name + ".tmp")
+            with pq.ParquetWriter(tmp, schema) as out:
+                for path in sources:
+                    part = pq.ParquetFile(path)
+                    for i in range(part.num_row_groups):
+                        out.write_table(_conform(part.read_row_group(i), schema))
+            os.replace(tmp, self.output)
+        shutil.rmtree(self.parts, ignore_errors=True)
+        logger.info(f"wrote {self.output}")
+
+
+def score(args) -> int:
+    from cnnClassifier.utils.model_registry import model_registry
+
+    model = model_registry.get_model(args.model)
+    idx_to_label = model_registry.get_class_labels(args.class_indices)
+    labels = [idx_to_label.get(i, str(i)) for i in range(max(idx_to_label) + 1)]
+    target_size = (args.image_size, args.image_size)
+
+    table = collect_images(args.input, args.metadata, args.label_column, class_names=labels)
+    output = Path(args.output)
+    if args.resume:
+        done = already_scored(output)
+        table = table[~table[PATH_COLUMN].isin(done)]
+        logger.info(f"resuming: {len(done)} image(s) already scored")
+    elif output.exists() or (_is_parquet(output) and _parts_dir(output).exists()):
+        raise FileExistsError(f"{output} exists; pass --resume to continue it or choose another output")
+
+    total = len(table)
+    logger.info(f"scoring {total} image(s) from {args.input}")
+    writer = ResultWriter(output)
+    if total == 0:
+        writer.close()
+        return 0
+
+    workers = args.workers or os.cpu_count() or 1
+    files = table["_file"].tolist()
+    starts = list(range(0, total, args.batch_size))
+    scored = 0
+
+    # Decode in spawned processes so they do not inherit TensorFlow's state.
+    # Only a few batches are in flight at a time, which keeps memory flat
+    # while the workers stay ahead of the model.
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        in_flight = deque()
+        next_batch = 0
+        for start in starts:
+            while next_batch < len(starts) and len(in_flight) < 2 * workers:
+                s = starts[next_batch]
+                in_flight.append(pool.submit(_decode_batch, files[s:s + args.batch_size], target_size))
+                next_batch += 1
+
+            images, errors = in_flight.popleft().result()
+            rows = table.iloc[start:start + args.batch_size].drop(columns="_file").reset_index(drop=True)
+            ok = np.array([e is None for e in errors])
+
+            probs = np.full((len(rows), len(labels)), np.nan, dtype=np.float32)
+            if ok.any():
+                batch = images[ok].astype(np.float32) / 255.0
+                preds = np.asarray(model.predict(batch, batch_size=len(batch), verbose=0), dtype=np.float32)
+                if preds.shape[-1] == 1:
+                    preds = np.concatenate([1 - preds, preds], axis=-1)
+                probs[ok] = preds
+
+            predicted = np.argmax(np.nan_to_num(probs, nan=-1.0), axis=-1)
+            rows[PREDICTION_COLUMN] = np.where(ok, np.array(labels, dtype=object)[predicted], None)
+            rows[CONFIDENCE_COLUMN] = np.where(ok, np.round(np.nan_to_num(probs).max(axis=-1) * 100, 2), np.nan)
+            for k, label in enumerate(labels):
+                rows[f"prob_{label}"] = probs[:, k]
+            rows[ERROR_COLUMN] = errors
+
+            writer.write(rows)
+            scored += len(rows)
+            logger.info(f"scored {scored}/{total}")
+
+    writer.close()
+    return 0
+
+
+def launch(args) -> int:
+    from cnnClassifier.utils.distribute import launch_local_cluster, default_training_command
+
+    return launch_local_cluster(args.workers, args.train_command or default_training_command())
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="cnnClassifier", description="Kidney tumor classifier tools")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    score_parser = commands.add_parser(
+        "score",
+        help="score a folder or manifest of images",
+        description="Score every image in a directory or CSV manifest and write one row per image, "
+                    "ready to load into the Bias Dashboard."
+    )
+    score_parser.add_argument("input", type=Path, help="image directory or CSV manifest with a 'path' column")
+    score_parser.add_argument("-o", "--output", type=Path, required=True,
+                              help="results file (.csv or .parquet)")
+    score_parser.add_argument("--metadata", type=Path, help="CSV of per-image metadata with a 'path' column")
+    score_parser.add_argument("--label-column", help="column holding the ground truth label")
+    score_parser.add_argument("--model", type=Path, default=Path("model/model.h5"))
+    score_parser.add_argument("--class-indices", type=Path, default=Path("model/class_indices.json"))
+    score_parser.add_argument("--image-size", type=int, default=224)
+    score_parser.add_argument("--batch-size", type=int, default=64)
+    score_parser.add_argument("--workers", type=int, help="decode processes (default: all CPUs)")
+    score_parser.add_argument("--resume", action="store_true", help="skip images already in the output and append")
+    score_parser.set_defaults(func=score)
+
+    launch_parser = commands.add_parser(
+        "launch",
+        help="run multi-worker training as several local processes",
+        description="Start one process per worker on this machine, each with its own TF_CONFIG, to try "
+                    "multi-worker training without a cluster. Runs the training stage unless a command is given."
+    )
+    launch_parser.add_argument("--workers", type=int, default=2, help="number of worker processes")
+    launch_parser.add_argument("train_command", nargs=argparse.REMAINDER, metavar="command",
+                               help="command to run in every worker")
+    launch_parser.set_defaults(func=launch)
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
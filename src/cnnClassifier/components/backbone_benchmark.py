@@ -0,0 +1,144 @@
+import time
+import numpy as np
+import tensorflow as tf
+from pathlib import Path
+from tensorflow.python.framework.convert_to_constants import convert_variables_to_constants_v2
+from cnnClassifier import logger
+from cnnClassifier.entity.config_entity import BackboneBenchmarkConfig
+from cnnClassifier.components.prepare_base_model import PrepareBaseModel
+from cnnClassifier.components.feature_cache import BottleneckFeatureCache, split_frozen_model, dataset_fingerprint
+from cnnClassifier.components.dataset_cache import load_image_list, flow_from_image_list
+from cnnClassifier.components.dataset_split import DatasetSplit
+from cnnClassifier.utils.common import save_json
+from cnnClassifier.utils.gradcam_utils import try_get_last_conv_layer_name
+
+
+class BackboneBenchmark:
+    def __init__(self, config: BackboneBenchmarkConfig):
+        self.config = config
+
+    def _build(self, name: str) -> tf.keras.Model:
+        backbone = PrepareBaseModel.build_backbone(
+            name=name,
+            input_shape=self.config.params_image_size,
+            weights=self.config.params_weights,
+            include_top=False
+        )
+        return PrepareBaseModel._prepare_full_model(
+            model=backbone,
+            classes=self.config.params_classes,
+            freeze_all=True,
+            freeze_till=None,
+            learning_rate=self.config.params_learning_rate,
+            head=self.config.params_head
+        )
+
+    def _generators(self, split: DatasetSplit):
+        datagenerator = tf.keras.preprocessing.image.ImageDataGenerator(rescale=1./255)
+        dataflow_kwargs = dict(
+            target_size=self.config.params_image_size[:-1],
+            batch_size=self.config.params_batch_size,
+            interpolation="bilinear",
+            shuffle=False
+        )
+        return tuple(
+            flow_from_image_list(
+                datagenerator,
+                self.config.training_data,
+                *split.image_list(subset),
+                **dataflow_kwargs
+            )
+            for subset in ("training", "validation")
+        )
+
+    @staticmethod
+    def count_flops(model: tf.keras.Model) -> int:
+        """Floating point operations for one image, from the frozen graph"""
+        spec = tf.TensorSpec([1] + list(model.input_shape[1:]), tf.float32)
+        concrete = tf.function(lambda x: model(x, training=False)).get_concrete_function(spec)
+        frozen = convert_variables_to_constants_v2(concrete)
+
+        with tf.Graph().as_default() as graph:
+            tf.graph_util.import_graph_def(frozen.graph.as_graph_def(), name="")
+            profile = tf.compat.v1.profiler.profile(
+                graph=graph,
+                run_meta=tf.compat.v1.RunMetadata(),
+                cmd="op",
+                options=tf.compat.v1.profiler.ProfileOptionBuilder.float_operation()
+            )
+        return int(profile.total_float_ops)
+
+    @staticmethod
+    def cpu_latency_ms(model: tf.keras.Model, runs: int = 30) -> float:
+        """Median single-image latency on CPU"""
+        x = tf.zeros([1] + list(model.input_shape[1:]), tf.float32)
+        with tf.device("/CPU:0"):
+            model.predict_on_batch(x)
+            timings = []
+            for _ in range(runs):
+                start = time.perf_counter()
+                model.predict_on_batch(x)
+                timings.append((time.perf_counter() - start) * 1000.0)
+        return float(np.median(timings))
+
+    def _accuracy(self, model: tf.keras.Model, data_key: str, split_key: str, train_gen, valid_gen) -> float:
+        # Fit the head on cached bottleneck features: a cheap, comparable
+        # estimate of what each frozen backbone can reach on our data
+        backbone, head = split_frozen_model(model)
+        cache = BottleneckFeatureCache(self.config.feature_cache_dir, backbone, data_key)
+        train_x, train_y = cache.features_for(train_gen, train_gen.samples, tag=f"training_{split_key}")
+        valid_x, valid_y = cache.features_for(valid_gen, valid_gen.samples, tag=f"validation_{split_key}")
+
+        num_classes = head.output_shape[-1]
+        head.compile(
+            optimizer=tf.keras.optimizers.SGD(learning_rate=self.config.params_learning_rate),
+            loss=tf.keras.losses.CategoricalCrossentropy(),
+            metrics=["accuracy"]
+        )
+        head.fit(
+            train_x, np.eye(num_classes, dtype=np.float32)[train_y],
+            batch_size=self.config.params_batch_size,
+            epochs=self.config.params_epochs,
+            shuffle=True,
+            verbose=0
+        )
+        _, accuracy = head.evaluate(
+            valid_x, np.eye(num_classes, dtype=np.float32)[valid_y],
+            batch_size=self.config.params_batch_size,
+            verbose=0
+        )
+        return float(accuracy)
+
+    def run(self):
+        filenames, labels, _ = load_image_list(self.config.training_data, self.config.manifest_path)
+        data_key = dataset_fingerprint(filenames, labels)
+        split = DatasetSplit(self.config.split_path)
+        train_gen, valid_gen = self._generators(split)
+
+        results = []
+        for name in self.config.params_candidates:
+            logger.info(f"benchmarking backbone {name}")
+            model = self._build(name)
+            result = {
+                "backbone": name,
+                "head": self.config.params_head,
+                "params": int(model.count_params()),
+                "flops": self.count_flops(model),
+                "cpu_latency_ms": self.cpu_latency_ms(model),
+                "accuracy": self._accuracy(model, data_key, split.fingerprint, train_gen, valid_gen),
+                "gradcam_layer": try_get_last_conv_layer_name(model)
+            }
+            logger.info(f"{name}: {result}")
+            results.append(result)
+            tf.keras.backend.clear_session()
+
+        # Cheapest-to-serve candidate whose accuracy is within tolerance of the best
+        best_accuracy = max(r["accuracy"] for r in results)
+        eligible = [r for r in results if r["accuracy"] >= best_accuracy - self.config.params_accuracy_tolerance]
+        recommended = min(eligible, key=lambda r: r["cpu_latency_ms"])["backbone"]
+        logger.info(f"recommended backbone: {recommended}")
+
+        save_json(
+            path=Path(self.config.results_path),
+            data={"recommended": recommended, "candidates": results}
+        )
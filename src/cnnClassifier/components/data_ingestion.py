@@ -1,44 +1,287 @@
 import os
+import json
+import shutil
+import hashlib
 import zipfile
-import gdown
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from urllib.error import HTTPError
 from cnnClassifier import logger
 from cnnClassifier.utils.common import get_size
+from cnnClassifier.components.dataset_manifest import DatasetManifest
 from cnnClassifier.entity.config_entity import DataIngestionConfig
 
+
+EXTRACT_MANIFEST = ".extracted.json"
+# Seconds a stalled connection or read may block before the download fails
+HTTP_TIMEOUT_S = 60
+
+
+class LocalFileSource:
+    """Copy from a local path (or ``file://`` URL), resuming a partial copy"""
+
+    def __init__(self, url: str):
+        self.path = Path(url[len("file://"):] if url.startswith("file://") else url)
+
+    def fetch(self, dest: Path, chunk_size: int):
+        offset = dest.stat().st_size if dest.exists() else 0
+        with open(self.path, "rb") as src, open(dest, "ab") as out:
+            src.seek(offset)
+            shutil.copyfileobj(src, out, chunk_size)
+
+
+class HttpSource:
+    """HTTP(S) download in ranged chunks
+
+    Each request asks for the next ``chunk_size`` bytes with a bounded
+    ``Range`` header and appends them, so an interrupted download continues
+    from the last complete chunk. Servers that ignore ranges get a single
+    fresh download.
+    """
+
+    def __init__(self, url: str, timeout: float = HTTP_TIMEOUT_S):
+        self.url = url
+        self.timeout = timeout
+
+    def fetch(self, dest: Path, chunk_size: int):
+        while True:
+            offset = dest.stat().st_size if dest.exists() else 0
+            end = offset + chunk_size - 1
+            request = urllib.request.Request(self.url, headers={"Range": f"bytes={offset}-{end}"})
+            try:
+                response = urllib.request.urlopen(request, timeout=self.timeout)
+            except HTTPError as e:
+                if e.code != 416:
+                    raise
+                # Range not satisfiable: the partial file is already complete
+                return
+
+            with response:
+                if response.status != 206:
+                    if offset:
+                        logger.info("server does not support ranged requests, restarting download")
+                    with open(dest, "wb") as out:
+                        shutil.copyfileobj(response, out, 1 << 20)
+                    return
+                # Content-Range: bytes <first>-<last>/<total or *>
+                total = response.headers.get("Content-Range", "").rpartition("/")[2]
+                with open(dest, "ab") as out:
+                    shutil.copyfileobj(response, out, 1 << 20)
+                    received = out.tell() - offset
+
+            if total.isdigit():
+                if offset + received >= int(total):
+                    return
+            elif received < chunk_size:
+                return
+            if received == 0:
+                raise IOError(f"no data received for bytes {offset}-{end} of {self.url}")
+
+
+class GDriveSource:
+    """Google Drive share link, through ``gdown``'s resumable download"""
+
+    def __init__(self, url: str):
+        file_id = url.split("/")[-2]
+        self.url = 'https://drive.google.com/uc?/export=download&id=' + file_id
+
+    def fetch(self, dest: Path, chunk_size: int):
+        import gdown
+        gdown.download(self.url, str(dest), resume=True)
+
+
+SOURCES = {
+    "gdrive": GDriveSource,
+    "http": HttpSource,
+    "local": LocalFileSource
+}
+
+
+def register_source(name: str, source_cls):
+    """Make ``source_cls`` available as ``data_ingestion.source_type: name``"""
+    SOURCES[name] = source_cls
+
+
+def sha256sum(path: Path, chunk_size: int = 8 * 2**20) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
 class DataIngestion:
     def __init__(self, config: DataIngestionConfig):
         self.config = config
 
-    
+    def _file_checksum(self, path: Path) -> str:
+        """sha256 of ``path``, remembered next to it until the file changes"""
+        st = path.stat()
+        stamp = {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+        sidecar = path.with_name(path.name + ".sha256.json")
+        if sidecar.exists():
+            with open(sidecar) as f:
+                cached = json.load(f)
+            if cached.get("stamp") == stamp:
+                return cached["sha256"]
+
+        checksum = sha256sum(path)
+        with open(sidecar, "w") as f:
+            json.dump({"stamp": stamp, "sha256": checksum}, f)
+        return checksum
+
+    def _pinned_path(self) -> Path:
+        path = Path(self.config.local_data_file)
+        return path.with_name(path.name + ".pinned.sha256")
+
+    def _expected_checksum(self) -> str:
+        """Configured sha256, else the one recorded by the first download"""
+        if self.config.sha256:
+            return self.config.sha256.lower()
+        pinned = self._pinned_path()
+        return pinned.read_text().strip() if pinned.exists() else ""
+
+    def _pin(self, checksum: str):
+        self._pinned_path().write_text(checksum + "\n")
+        logger.info(f"no checksum configured; pinned {checksum} in {self._pinned_path()}, "
+                    f"record it as data_ingestion.sha256 to verify downloads on other machines")
+
+    def _is_valid(self, path: Path) -> bool:
+        if not path.exists():
+            return False
+        expected = self._expected_checksum()
+        if not expected:
+            # First run without a checksum: trust the existing archive once
+            # and pin it, so later runs notice if it changes
+            self._pin(self._file_checksum(path))
+            return True
+        return self._file_checksum(path) == expected
+
     def download_file(self)-> str:
         '''
-        Fetch data from the url
+        Fetch data from the url, resuming an interrupted download and
+        skipping it entirely when the local copy matches the checksum.
+        Without a configured sha256 the first download's checksum is pinned
+        and later downloads must match it
         '''
+        dataset_url = self.config.source_URL
+        zip_download_dir = Path(self.config.local_data_file)
+        os.makedirs(self.config.root_dir, exist_ok=True)
+
+        if self._is_valid(zip_download_dir):
+            logger.info(f"{zip_download_dir} is up to date ({get_size(zip_download_dir)}), skipping download")
+            return str(zip_download_dir)
+
+        source_cls = SOURCES.get(self.config.source_type)
+        if source_cls is None:
+            raise ValueError(f"unknown source_type {self.config.source_type!r}, expected one of {sorted(SOURCES)}")
 
-        try: 
-            dataset_url = self.config.source_URL
-            zip_download_dir = self.config.local_data_file
-            os.makedirs("artifacts/data_ingestion", exist_ok=True)
-            logger.info(f"Downloading data from {dataset_url} into file {zip_download_dir}")
+        partial = zip_download_dir.with_name(zip_download_dir.name + ".part")
+        logger.info(f"Downloading data from {dataset_url} into file {zip_download_dir}"
+                    + (f" (resuming at {partial.stat().st_size} bytes)" if partial.exists() else ""))
+        source_cls(dataset_url).fetch(partial, self.config.chunk_size)
 
-            file_id = dataset_url.split("/")[-2]
-            prefix = 'https://drive.google.com/uc?/export=download&id='
-            gdown.download(prefix+file_id,zip_download_dir)
+        expected = self._expected_checksum()
+        checksum = sha256sum(partial)
+        if expected and checksum != expected:
+            partial.unlink()
+            source = "data_ingestion.sha256" if self.config.sha256 else (
+                f"pinned in {self._pinned_path()}; delete it to accept a new archive"
+            )
+            raise ValueError(f"checksum mismatch for {dataset_url}: expected {expected} ({source}), got {checksum}")
+        os.replace(partial, zip_download_dir)
+        self._file_checksum(zip_download_dir)
+        if not expected:
+            self._pin(checksum)
 
-            logger.info(f"Downloaded data from {dataset_url} into file {zip_download_dir}")
+        logger.info(f"Downloaded data from {dataset_url} into file {zip_download_dir}")
+        return str(zip_download_dir)
 
-        except Exception as e:
-            raise e
-        
-    
+    @staticmethod
+    def _extract_members(zip_path: Path, names: list, unzip_path: str):
+        # One ZipFile handle per worker; zlib releases the GIL while inflating
+        with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+            for name in names:
+                zip_ref.extract(name, unzip_path)
+
+    @staticmethod
+    def _remove_extracted(unzip_path: str, names: list):
+        """Delete files of an earlier extraction and any directories they leave empty"""
+        root = Path(unzip_path).resolve()
+        parents = set()
+        for name in names:
+            target = (root / name).resolve()
+            if root not in target.parents:
+                continue
+            if target.is_file():
+                target.unlink()
+            parents.update(p for p in target.parents if root in p.parents)
+        # Deepest first, so a parent is only checked after its children
+        for directory in sorted(parents, key=lambda p: len(p.parts), reverse=True):
+            if directory.is_dir() and not any(directory.iterdir()):
+                directory.rmdir()
 
     def extract_zip_file(self):
         """
-        zip_file_path: str
-        Extracts the zip file into the data directory
+        Extracts the zip file into the data directory, in parallel, writing
+        only members that are missing or whose CRC/size changed since the
+        last extraction and deleting files the new archive no longer has
         Function returns None
         """
         unzip_path = self.config.unzip_dir
         os.makedirs(unzip_path, exist_ok=True)
+        manifest_path = Path(unzip_path) / EXTRACT_MANIFEST
+        manifest = {}
+        if manifest_path.exists():
+            with open(manifest_path) as f:
+                manifest = json.load(f)
+
         with zipfile.ZipFile(self.config.local_data_file, 'r') as zip_ref:
-            zip_ref.extractall(unzip_path)
\ No newline at end of file
+            members = [info for info in zip_ref.infolist() if not info.is_dir()]
+
+        stale = []
+        for info in members:
+            target = os.path.join(unzip_path, info.filename)
+            recorded = manifest.get(info.filename)
+            up_to_date = (
+                recorded == [info.CRC, info.file_size]
+                and os.path.isfile(target)
+                and os.path.getsize(target) == info.file_size
+            )
+            if not up_to_date:
+                stale.append(info.filename)
+
+        removed = sorted(set(manifest) - {info.filename for info in members})
+        if not stale and not removed:
+            logger.info(f"all {len(members)} files already extracted in {unzip_path}")
+            return
+
+        if removed:
+            self._remove_extracted(unzip_path, removed)
+            logger.info(f"removed {len(removed)} files no longer in {self.config.local_data_file}")
+
+        workers = max(1, min(self.config.num_workers, len(stale) or 1))
+        if stale:
+            batches = [stale[i::workers] for i in range(workers)]
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                list(pool.map(lambda names: self._extract_members(self.config.local_data_file, names, unzip_path), batches))
+
+        manifest = {info.filename: [info.CRC, info.file_size] for info in members}
+        tmp_path = manifest_path.with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, manifest_path)
+        logger.info(f"extracted {len(stale)} of {len(members)} files into {unzip_path} with {workers} workers")
+
+    def build_manifest(self) -> dict:
+        """
+        Indexes the extracted images into the dataset manifest, re-hashing
+        only files added or changed since the last build
+        Function returns the manifest summary
+        """
+        manifest = DatasetManifest(self.config.manifest_path)
+        return manifest.build(
+            self.config.data_dir,
+            num_workers=self.config.num_workers
+        )
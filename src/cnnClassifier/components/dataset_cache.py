@@ -0,0 +1,256 @@
+import os
+import json
+import math
+import hashlib
+import numpy as np
+import tensorflow as tf
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+from cnnClassifier import logger
+from cnnClassifier.entity.config_entity import DatasetCacheConfig
+
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp", ".ppm", ".tif", ".tiff")
+INDEX_FILE = "index.json"
+LABELS_FILE = "labels.npy"
+
+
+def list_image_files(directory: Path):
+    """Class-per-subdirectory listing in the same order as ``flow_from_directory``
+
+    Returns:
+        tuple: (relative filenames, integer labels, class_indices)
+    """
+    directory = Path(directory)
+    classes = sorted(d.name for d in directory.iterdir() if d.is_dir())
+    class_indices = dict(zip(classes, range(len(classes))))
+
+    filenames, labels = [], []
+    for class_name in classes:
+        for root, _, files in sorted(os.walk(directory / class_name)):
+            for name in sorted(files):
+                if name.lower().endswith(IMAGE_EXTENSIONS):
+                    filenames.append(os.path.relpath(os.path.join(root, name), directory))
+                    labels.append(class_indices[class_name])
+
+    return filenames, labels, class_indices
+
+
+def load_image_list(directory: Path, manifest_path: Path = None):
+    """(filenames, labels, class_indices) from the dataset manifest when it
+    exists, falling back to walking ``directory``
+
+    The manifest leaves out duplicate and corrupt images.
+    """
+    if manifest_path is not None and Path(manifest_path).exists():
+        from cnnClassifier.components.dataset_manifest import DatasetManifest
+        return DatasetManifest(manifest_path).image_list()
+    return list_image_files(directory)
+
+
+def flow_from_image_list(datagenerator, directory: Path, filenames, labels, class_indices, **dataflow_kwargs):
+    """``DirectoryIterator``-like flow over an explicit image list
+
+    Uses ``flow_from_dataframe`` so the files are never re-listed or stat-ed.
+    """
+    import pandas as pd
+
+    classes = sorted(class_indices, key=class_indices.get)
+    frame = pd.DataFrame({
+        "filename": list(filenames),
+        "class": [classes[label] for label in labels]
+    })
+    return datagenerator.flow_from_dataframe(
+        frame,
+        directory=str(directory),
+        x_col="filename",
+        y_col="class",
+        classes=classes,
+        class_mode="categorical",
+        validate_filenames=False,
+        **dataflow_kwargs
+    )
+
+
+class DatasetCache:
+    def __init__(self, config: DatasetCacheConfig):
+        self.config = config
+        self.cache_dir = Path(config.cache_dir)
+
+    def _load_image(self, filename: str) -> np.ndarray:
+        height, width = self.config.params_image_size[:2]
+        with Image.open(Path(self.config.source_dir) / filename) as img:
+            img = img.convert("RGB")
+            if img.size != (width, height):
+                img = img.resize((width, height), Image.BILINEAR)
+            return np.asarray(img, dtype=np.uint8)
+
+    def _content_digest(self):
+        """Hash of every indexed image's bytes, from the manifest, or None
+        when there is no manifest to read it from
+        """
+        if self.config.manifest_path is None or not Path(self.config.manifest_path).exists():
+            return None
+        from cnnClassifier.components.dataset_manifest import DatasetManifest
+        digest = hashlib.sha256()
+        for path, _, sha256 in DatasetManifest(self.config.manifest_path).records():
+            digest.update(f"{path}:{sha256}\n".encode())
+        return digest.hexdigest()
+
+    def _is_up_to_date(self, key: dict) -> bool:
+        index_path = self.cache_dir / INDEX_FILE
+        if not index_path.exists():
+            return False
+        with open(index_path) as f:
+            index = json.load(f)
+        return (
+            all(index.get(k) == v for k, v in key.items())
+            and (self.cache_dir / LABELS_FILE).exists()
+            and all((self.cache_dir / s["file"]).exists() for s in index["shards"])
+        )
+
+    def build(self):
+        """Decode and resize every image once into fixed-size uint8 shards
+
+        Writes ``shard_XXXXX.npy`` files of shape (n, height, width, 3), a
+        ``labels.npy`` array and an ``index.json`` holding the class indices
+        and the filename order shared by both.
+        """
+        filenames, labels, class_indices = load_image_list(self.config.source_dir, self.config.manifest_path)
+        if not filenames:
+            raise ValueError(f"no images found in {self.config.source_dir}; nothing to cache")
+
+        height, width = self.config.params_image_size[:2]
+        # Relabeled or replaced images invalidate the shards as well as
+        # added or removed ones
+        key = {
+            "image_size": [height, width],
+            "class_indices": class_indices,
+            "filenames": filenames,
+            "labels": [int(label) for label in labels],
+            "content_digest": self._content_digest()
+        }
+        if self._is_up_to_date(key):
+            logger.info(f"dataset cache at {self.cache_dir} is up to date")
+            return
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        shard_size = self.config.shard_size
+        num_shards = math.ceil(len(filenames) / shard_size)
+        shards = []
+
+        with ThreadPoolExecutor(max_workers=self.config.num_workers) as pool:
+            for shard_id in range(num_shards):
+                shard_files = filenames[shard_id * shard_size:(shard_id + 1) * shard_size]
+                shard_name = f"shard_{shard_id:05d}.npy"
+                shard = np.lib.format.open_memmap(
+                    self.cache_dir / shard_name,
+                    mode="w+",
+                    dtype=np.uint8,
+                    shape=(len(shard_files), height, width, 3)
+                )
+                for i, arr in enumerate(pool.map(self._load_image, shard_files)):
+                    shard[i] = arr
+                shard.flush()
+                del shard
+                shards.append({"file": shard_name, "count": len(shard_files)})
+                logger.info(f"wrote {shard_name} with {len(shard_files)} images")
+
+        np.save(self.cache_dir / LABELS_FILE, np.asarray(labels, dtype=np.int64))
+        with open(self.cache_dir / INDEX_FILE, "w") as f:
+            json.dump({**key, "shards": shards}, f, indent=4)
+
+        logger.info(f"dataset cache with {len(filenames)} images written to {self.cache_dir}")
+
+
+class ShardedDataset:
+    """Read-only view over the shards written by ``DatasetCache.build``
+
+    Shards are opened with ``mmap_mode="r"``, so only the pages touched by
+    a batch are ever read from disk.
+    """
+
+    def __init__(self, cache_dir: Path):
+        self.cache_dir = Path(cache_dir)
+        with open(self.cache_dir / INDEX_FILE) as f:
+            index = json.load(f)
+
+        self.class_indices = index["class_indices"]
+        self.filenames = index["filenames"]
+        self.image_size = index["image_size"]
+        self.labels = np.load(self.cache_dir / LABELS_FILE)
+        self.shards = [np.load(self.cache_dir / s["file"], mmap_mode="r") for s in index["shards"]]
+        self._offsets = np.cumsum([0] + [len(s) for s in self.shards])
+
+    def __len__(self):
+        return int(self._offsets[-1])
+
+    def take(self, indices) -> np.ndarray:
+        """Gather images by global index into one uint8 batch"""
+        indices = np.asarray(indices)
+        out = np.empty((len(indices),) + self.shards[0].shape[1:], dtype=np.uint8)
+        shard_ids = np.searchsorted(self._offsets, indices, side="right") - 1
+        for shard_id in np.unique(shard_ids):
+            mask = shard_ids == shard_id
+            out[mask] = self.shards[shard_id][indices[mask] - self._offsets[shard_id]]
+        return out
+
+    def indices_of(self, filenames) -> np.ndarray:
+        """Global indices of ``filenames``, e.g. one split's image list"""
+        position = {name: i for i, name in enumerate(self.filenames)}
+        missing = [name for name in filenames if name not in position]
+        if missing:
+            raise KeyError(f"{len(missing)} image(s) missing from the dataset cache at {self.cache_dir}, "
+                           f"e.g. {missing[0]}; rebuild it with the dataset_cache stage")
+        return np.asarray([position[name] for name in filenames], dtype=np.int64)
+
+
+class ShardSequence(tf.keras.utils.Sequence):
+    """Keras ``Sequence`` over a ``ShardedDataset`` subset
+
+    Exposes ``samples``, ``batch_size``, ``classes`` and ``class_indices``
+    like the ``DirectoryIterator`` it replaces. When an
+    ``ImageDataGenerator`` is given, its random transforms are applied per
+    image before rescaling.
+    """
+
+    def __init__(self, dataset: ShardedDataset, indices, batch_size: int,
+                 shuffle: bool = False, image_data_generator=None, rescale: float = 1. / 255, seed=None):
+        super().__init__()
+        self.dataset = dataset
+        self.indices = np.asarray(indices)
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.image_data_generator = image_data_generator
+        self.rescale = rescale
+        self.class_indices = dataset.class_indices
+        self.num_classes = len(dataset.class_indices)
+        self.samples = len(self.indices)
+        self.classes = dataset.labels[self.indices]
+        self._rng = np.random.default_rng(seed)
+        self._order = np.arange(self.samples)
+        self.on_epoch_end()
+
+    def __len__(self):
+        return math.ceil(self.samples / self.batch_size)
+
+    def on_epoch_end(self):
+        if self.shuffle:
+            self._rng.shuffle(self._order)
+
+    def __getitem__(self, idx):
+        batch = self._order[idx * self.batch_size:(idx + 1) * self.batch_size]
+        # Sorted gathers keep memmap reads sequential within each shard
+        global_idx = self.indices[batch]
+        order = np.argsort(global_idx)
+        x = np.empty((len(batch),) + tuple(self.dataset.shards[0].shape[1:]), dtype=np.float32)
+        x[order] = self.dataset.take(global_idx[order])
+
+        if self.image_data_generator is not None:
+            for i in range(len(x)):
+                x[i] = self.image_data_generator.random_transform(x[i])
+        x *= self.rescale
+
+        y = np.eye(self.num_classes, dtype=np.float32)[self.dataset.labels[global_idx]]
+        return x, y
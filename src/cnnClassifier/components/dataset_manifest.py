@@ -0,0 +1,200 @@
+import os
+import json
+import sqlite3
+import hashlib
+from collections import Counter
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from PIL import Image
+from cnnClassifier import logger
+
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp", ".ppm", ".tif", ".tiff")
+
+STATUS_OK = "ok"
+STATUS_DUPLICATE = "duplicate"
+STATUS_CORRUPT = "corrupt"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS images (
+    path TEXT PRIMARY KEY,
+    label TEXT NOT NULL,
+    sha256 TEXT,
+    width INTEGER,
+    height INTEGER,
+    bytes INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    duplicate_of TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS images_sha256 ON images (sha256);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+def _inspect(directory: Path, path: str):
+    """(sha256, width, height, error) for one image file"""
+    full_path = directory / path
+    digest = hashlib.sha256()
+    try:
+        with open(full_path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+        # verify() only checks the headers; load() decodes the pixel data, so
+        # truncated or corrupt files are caught too
+        with Image.open(full_path) as img:
+            width, height = img.size
+            img.load()
+        return digest.hexdigest(), width, height, None
+    except Exception as e:
+        return digest.hexdigest(), None, None, f"{type(e).__name__}: {e}"
+
+
+class DatasetManifest:
+    """SQLite index of the extracted dataset
+
+    One row per image file with its class label, content hash, dimensions,
+    size and status: ``ok``, ``duplicate`` (same bytes as
+    an earlier path, recorded in ``duplicate_of``) or ``corrupt`` (could
+    not be decoded). Consumers read the ``ok`` rows instead of walking the
+    directory tree. The train/validation split of these rows is recorded by
+    ``DatasetSplit`` in its own database, see ``components.dataset_split``.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+
+    @contextmanager
+    def _connect(self):
+        # Commits on success, rolls back on error, always closes
+        os.makedirs(self.path.parent, exist_ok=True)
+        conn = sqlite3.connect(self.path)
+        try:
+            conn.executescript(SCHEMA)
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def build(self, directory: Path, num_workers: int = 8) -> dict:
+        """Index ``directory`` (one subdirectory per class)
+
+        Only files that are new or whose size/mtime changed since the last
+        build are hashed and decoded again.
+
+        Returns:
+            dict: summary with class counts, duplicates and corrupt files
+        """
+        directory = Path(directory)
+        classes = sorted(d.name for d in directory.iterdir() if d.is_dir())
+        found = {}
+        for class_name in classes:
+            for root, _, files in os.walk(directory / class_name):
+                for name in files:
+                    if name.lower().endswith(IMAGE_EXTENSIONS):
+                        full_path = os.path.join(root, name)
+                        st = os.stat(full_path)
+                        found[os.path.relpath(full_path, directory)] = (class_name, st.st_size, st.st_mtime_ns)
+
+        with self._connect() as conn:
+            known = {
+                row[0]: row[1:]
+                for row in conn.execute("SELECT path, bytes, mtime_ns, sha256, width, height, error FROM images")
+            }
+            changed = [p for p, (_, size, mtime) in found.items() if known.get(p, (None, None))[:2] != (size, mtime)]
+            with ThreadPoolExecutor(max_workers=num_workers) as pool:
+                inspected = dict(zip(changed, pool.map(lambda p: _inspect(directory, p), changed)))
+
+            rows = []
+            for path in sorted(found):
+                label, size, mtime = found[path]
+                sha256, width, height, error = inspected[path] if path in inspected else known[path][2:]
+                rows.append([path, label, sha256, width, height, size, mtime, error])
+
+            # The first path (in sorted order) with given content is kept;
+            # later copies are flagged so they cannot leak across splits
+            first_seen, records = {}, []
+            for path, label, sha256, width, height, size, mtime, error in rows:
+                if error is not None:
+                    status, duplicate_of = STATUS_CORRUPT, None
+                elif sha256 in first_seen:
+                    status, duplicate_of = STATUS_DUPLICATE, first_seen[sha256]
+                else:
+                    status, duplicate_of = STATUS_OK, None
+                    first_seen[sha256] = path
+                records.append((path, label, sha256, width, height, size, mtime, status, duplicate_of, error))
+
+            conn.execute("DELETE FROM images")
+            conn.executemany(
+                "INSERT INTO images (path, label, sha256, width, height, bytes, mtime_ns, status, duplicate_of, error) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                records
+            )
+            class_indices = dict(zip(classes, range(len(classes))))
+            conn.execute("INSERT OR REPLACE INTO meta VALUES ('class_indices', ?)", (json.dumps(class_indices),))
+
+        summary = self.summary()
+        logger.info(
+            f"manifest {self.path}: {len(found)} files ({len(changed)} re-indexed), "
+            f"{summary['duplicates']} duplicate(s), {summary['corrupt']} corrupt"
+        )
+        if summary["conflicting_labels"]:
+            logger.warning(f"{summary['conflicting_labels']} duplicate image(s) appear under different classes")
+        return summary
+
+    def class_indices(self) -> dict:
+        with self._connect() as conn:
+            row = conn.execute("SELECT value FROM meta WHERE key = 'class_indices'").fetchone()
+        if row is None:
+            raise FileNotFoundError(f"manifest {self.path} has not been built")
+        return json.loads(row[0])
+
+    def image_list(self, statuses=(STATUS_OK,)):
+        """Indexed images in ``flow_from_directory`` order (class, then path)
+
+        Returns:
+            tuple: (relative filenames, integer labels, class_indices)
+        """
+        class_indices = self.class_indices()
+        placeholders = ", ".join("?" * len(statuses))
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"SELECT path, label FROM images WHERE status IN ({placeholders}) ORDER BY label, path",
+                tuple(statuses)
+            ).fetchall()
+        filenames = [path for path, _ in rows]
+        labels = [class_indices[label] for _, label in rows]
+        return filenames, labels, class_indices
+
+    def records(self):
+        """(path, label, sha256) of every ``ok`` image, in ``image_list`` order"""
+        with self._connect() as conn:
+            return conn.execute(
+                "SELECT path, label, sha256 FROM images WHERE status = ? ORDER BY label, path", (STATUS_OK,)
+            ).fetchall()
+
+    def summary(self) -> dict:
+        with self._connect() as conn:
+            status_counts = dict(conn.execute("SELECT status, COUNT(*) FROM images GROUP BY status").fetchall())
+            class_counts = dict(conn.execute(
+                "SELECT label, COUNT(*) FROM images WHERE status = ? GROUP BY label", (STATUS_OK,)
+            ).fetchall())
+            conflicting = conn.execute(
+                "SELECT COUNT(*) FROM images d JOIN images o ON d.duplicate_of = o.path WHERE d.label != o.label"
+            ).fetchone()[0]
+            sizes = Counter(dict(((w, h), n) for w, h, n in conn.execute(
+                "SELECT width, height, COUNT(*) FROM images WHERE status = ? GROUP BY width, height", (STATUS_OK,)
+            ).fetchall()))
+        return {
+            "images": status_counts.get(STATUS_OK, 0),
+            "duplicates": status_counts.get(STATUS_DUPLICATE, 0),
+            "corrupt": status_counts.get(STATUS_CORRUPT, 0),
+            "conflicting_labels": conflicting,
+            "class_counts": class_counts,
+            "most_common_sizes": [f"{w}x{h}: {n}" for (w, h), n in sizes.most_common(5)]
+        }
@@ -0,0 +1,285 @@
+import os
+import csv
+import json
+import sqlite3
+import hashlib
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from pathlib import Path
+from cnnClassifier import logger
+from cnnClassifier.components.dataset_manifest import DatasetManifest
+from cnnClassifier.entity.config_entity import DataSplitConfig
+
+
+SPLIT_MODES = ("holdout", "kfold")
+GROUP_BY = ("content", "patient")
+SUBSETS = ("training", "validation")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS groups (
+    group_key TEXT PRIMARY KEY,
+    label TEXT NOT NULL,
+    fold INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS assignments (
+    path TEXT PRIMARY KEY,
+    label TEXT NOT NULL,
+    group_key TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS assignments_group ON assignments (group_key);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+def group_bucket(group_key: str, seed: int) -> float:
+    """Uniform [0, 1) position of a group, stable across runs and machines"""
+    return int(hashlib.sha256(f"{seed}:{group_key}".encode()).hexdigest()[:8], 16) / 2**32
+
+
+def read_patient_ids(path: Path) -> dict:
+    """``path -> patient_id`` from a CSV with ``path`` and ``patient_id`` columns"""
+    with open(path, newline="") as f:
+        reader = csv.DictReader(f)
+        missing = {"path", "patient_id"} - set(reader.fieldnames or ())
+        if missing:
+            raise ValueError(f"{path} is missing column(s) {sorted(missing)}")
+        return {os.path.normpath(row["path"]): row["patient_id"] for row in reader if row["patient_id"]}
+
+
+class DatasetSplit:
+    """Persisted train/validation assignment over the dataset manifest
+
+    Images are grouped by content hash or patient ID and every group is
+    assigned to a fold once; later runs keep existing assignments and only
+    place new groups, so an image never moves between splits unless the
+    split settings change. ``holdout`` uses fold 0 for validation and fold 1
+    for training, ``kfold`` uses ``fold`` out of ``folds``. With
+    ``stratify`` each class is spread over the folds in proportion.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+
+    @contextmanager
+    def _connect(self):
+        # Commits on success, rolls back on error, always closes
+        os.makedirs(self.path.parent, exist_ok=True)
+        conn = sqlite3.connect(self.path)
+        try:
+            conn.executescript(SCHEMA)
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _fold_shares(mode: str, validation_fraction: float, folds: int) -> list:
+        if mode == "holdout":
+            return [validation_fraction, 1.0 - validation_fraction]
+        return [1.0 / folds] * folds
+
+    def assign(self, records, mode: str = "holdout", stratify: bool = True, validation_fraction: float = 0.2,
+               folds: int = 5, fold: int = 0, group_by: str = "content", seed: int = 42,
+               patient_ids: dict = None, class_indices: dict = None) -> dict:
+        """Assign every image in ``records`` to a fold
+
+        Args:
+            records: (path, label, sha256) rows, see ``DatasetManifest.records``
+            mode (str): ``holdout`` or ``kfold``
+            stratify (bool): balance every class across folds
+            validation_fraction (float): validation share for ``holdout``
+            folds (int): number of folds for ``kfold``
+            fold (int): validation fold for ``kfold``
+            group_by (str): ``content`` (image hash) or ``patient``
+            seed (int): changes the assignment of every group
+            patient_ids (dict): ``path -> patient_id`` when grouping by patient
+            class_indices (dict): class name -> index, as in the manifest
+
+        Returns:
+            dict: summary with per-split class counts
+        """
+        if mode not in SPLIT_MODES:
+            raise ValueError(f"unknown split mode {mode!r}, expected one of {SPLIT_MODES}")
+        if group_by not in GROUP_BY:
+            raise ValueError(f"unknown split grouping {group_by!r}, expected one of {GROUP_BY}")
+        if mode == "kfold" and not 0 <= fold < folds:
+            raise ValueError(f"fold {fold} out of range for {folds} folds")
+
+        patient_ids = patient_ids or {}
+        rows, unmatched = [], 0
+        for path, label, sha256 in records:
+            group_key = sha256
+            if group_by == "patient":
+                patient = patient_ids.get(os.path.normpath(path))
+                if patient is None:
+                    unmatched += 1
+                else:
+                    group_key = f"patient:{patient}"
+            rows.append((path, label, group_key))
+        if unmatched:
+            logger.warning(f"{unmatched} image(s) have no patient ID and are grouped by content instead")
+
+        settings = {
+            "mode": mode,
+            "stratify": bool(stratify),
+            "validation_fraction": float(validation_fraction) if mode == "holdout" else None,
+            "folds": int(folds) if mode == "kfold" else 2,
+            "group_by": group_by,
+            "seed": int(seed)
+        }
+        validation_fold = int(fold) if mode == "kfold" else 0
+        shares = self._fold_shares(mode, validation_fraction, settings["folds"])
+
+        with self._connect() as conn:
+            stored = conn.execute("SELECT value FROM meta WHERE key = 'settings'").fetchone()
+            if stored is None or json.loads(stored[0]) != settings:
+                if stored is not None:
+                    logger.info("split settings changed, reassigning every image")
+                conn.execute("DELETE FROM groups")
+
+            conn.execute("DELETE FROM assignments")
+            conn.executemany("INSERT INTO assignments VALUES (?, ?, ?)", rows)
+            conn.execute("DELETE FROM groups WHERE group_key NOT IN (SELECT group_key FROM assignments)")
+            known = dict(conn.execute("SELECT group_key, fold FROM groups").fetchall())
+
+            sizes = Counter(group_key for _, _, group_key in rows)
+            labels = defaultdict(Counter)
+            for _, label, group_key in rows:
+                labels[group_key][label] += 1
+            # A patient's group is stratified under its most common label
+            group_label = {g: counts.most_common(1)[0][0] for g, counts in labels.items()}
+
+            # Image counts per (stratum, fold) of the groups already placed
+            placed = defaultdict(lambda: [0] * len(shares))
+            for group_key, group_fold in known.items():
+                stratum = group_label[group_key] if stratify else None
+                placed[stratum][group_fold] += sizes[group_key]
+
+            new_groups = sorted((g for g in sizes if g not in known), key=lambda g: group_bucket(g, seed))
+            assigned = []
+            for group_key in new_groups:
+                if stratify:
+                    # Largest shortfall against the target share of the class
+                    counts = placed[group_label[group_key]]
+                    total = sum(counts) + sizes[group_key]
+                    group_fold = max(range(len(shares)), key=lambda f: (shares[f] * total - counts[f], -f))
+                    counts[group_fold] += sizes[group_key]
+                else:
+                    group_fold = self._fold_of(group_bucket(group_key, seed), shares)
+                assigned.append((group_key, group_label[group_key], group_fold))
+            conn.executemany("INSERT INTO groups VALUES (?, ?, ?)", assigned)
+
+            validation = conn.execute(
+                "SELECT a.path FROM assignments a JOIN groups g USING (group_key) WHERE g.fold = ? ORDER BY a.path",
+                (validation_fold,)
+            ).fetchall()
+            digest = hashlib.sha256(json.dumps(settings, sort_keys=True).encode())
+            for (path,) in validation:
+                digest.update(path.encode() + b"\n")
+
+            meta = {
+                "settings": json.dumps(settings),
+                "validation_fold": str(validation_fold),
+                "fingerprint": digest.hexdigest()[:16],
+                "class_indices": json.dumps(class_indices or {})
+            }
+            conn.executemany("INSERT OR REPLACE INTO meta VALUES (?, ?)", meta.items())
+
+        summary = self.summary()
+        logger.info(
+            f"split {self.path}: {len(assigned)} new group(s) assigned, {len(known)} kept; "
+            f"{summary['split_counts']}"
+        )
+        return summary
+
+    @staticmethod
+    def _fold_of(bucket: float, shares: list) -> int:
+        edge = 0.0
+        for f, share in enumerate(shares):
+            edge += share
+            if bucket < edge:
+                return f
+        return len(shares) - 1
+
+    def _meta(self, key: str) -> str:
+        with self._connect() as conn:
+            row = conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            raise FileNotFoundError(f"split {self.path} has not been assigned; run the data_split stage")
+        return row[0]
+
+    @property
+    def fingerprint(self) -> str:
+        """Changes whenever the validation set does"""
+        return self._meta("fingerprint")
+
+    def image_list(self, subset: str):
+        """Images of one split in ``flow_from_directory`` order (class, then path)
+
+        Only the rows of ``subset`` are read, through the split index.
+
+        Returns:
+            tuple: (relative filenames, integer labels, class_indices)
+        """
+        if subset not in SUBSETS:
+            raise ValueError(f"unknown subset {subset!r}, expected one of {SUBSETS}")
+        class_indices = json.loads(self._meta("class_indices"))
+        validation_fold = int(self._meta("validation_fold"))
+        operator = "=" if subset == "validation" else "!="
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"SELECT a.path, a.label FROM assignments a JOIN groups g USING (group_key) "
+                f"WHERE g.fold {operator} ? ORDER BY a.label, a.path",
+                (validation_fold,)
+            ).fetchall()
+        filenames = [path for path, _ in rows]
+        labels = [class_indices[label] for _, label in rows]
+        return filenames, labels, class_indices
+
+    def summary(self) -> dict:
+        validation_fold = int(self._meta("validation_fold"))
+        with self._connect() as conn:
+            counts = conn.execute(
+                "SELECT g.fold, a.label, COUNT(*) FROM assignments a JOIN groups g USING (group_key) "
+                "GROUP BY g.fold, a.label"
+            ).fetchall()
+            num_groups = conn.execute("SELECT COUNT(*) FROM groups").fetchone()[0]
+        fold_sizes, split_counts = Counter(), defaultdict(Counter)
+        for group_fold, label, n in counts:
+            fold_sizes[group_fold] += n
+            split_counts["validation" if group_fold == validation_fold else "training"][label] += n
+        return {
+            "groups": num_groups,
+            "fold_sizes": dict(fold_sizes),
+            "split_counts": {subset: dict(c) for subset, c in split_counts.items()},
+            "fingerprint": self._meta("fingerprint")
+        }
+
+
+class DataSplit:
+    def __init__(self, config: DataSplitConfig):
+        self.config = config
+
+    def assign(self) -> dict:
+        manifest = DatasetManifest(self.config.manifest_path)
+        patient_ids = None
+        if self.config.params_group_by == "patient":
+            if not self.config.patient_ids_path:
+                raise ValueError("SPLIT_GROUP_BY is patient but data_split.patient_ids_path is not set")
+            patient_ids = read_patient_ids(self.config.patient_ids_path)
+
+        return DatasetSplit(self.config.split_path).assign(
+            manifest.records(),
+            mode=self.config.params_mode,
+            stratify=self.config.params_stratify,
+            validation_fraction=self.config.params_validation_fraction,
+            folds=self.config.params_folds,
+            fold=self.config.params_fold,
+            group_by=self.config.params_group_by,
+            seed=self.config.params_seed,
+            patient_ids=patient_ids,
+            class_indices=manifest.class_indices()
+        )
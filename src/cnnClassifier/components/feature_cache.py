@@ -0,0 +1,117 @@
+import os
+import hashlib
+import numpy as np
+import tensorflow as tf
+from pathlib import Path
+from cnnClassifier import logger
+
+
+def split_frozen_model(model: tf.keras.Model):
+    """Split ``model`` into its frozen backbone and trainable head
+
+    The boundary is the output of the last layer before the first layer
+    with trainable weights (the ``Flatten`` for the VGG16 model built by
+    ``PrepareBaseModel``). The head reuses the original layer objects, so
+    fitting it updates ``model`` in place.
+
+    Returns:
+        tuple: (backbone, head) models, or (None, None) if nothing is frozen
+    """
+    first_trainable = next(
+        (i for i, layer in enumerate(model.layers) if layer.trainable_weights),
+        None
+    )
+    if not first_trainable:
+        return None, None
+
+    boundary = model.layers[first_trainable - 1]
+    backbone = tf.keras.Model(inputs=model.inputs, outputs=boundary.output, name="backbone")
+
+    head_input = tf.keras.Input(shape=boundary.output.shape[1:], name="bottleneck_features")
+    x = head_input
+    for layer in model.layers[first_trainable:]:
+        x = layer(x)
+    head = tf.keras.Model(inputs=head_input, outputs=x, name="head")
+
+    return backbone, head
+
+
+def backbone_fingerprint(backbone: tf.keras.Model) -> str:
+    digest = hashlib.sha256()
+    for layer in backbone.layers:
+        digest.update(layer.name.encode())
+        for weight in layer.get_weights():
+            digest.update(np.ascontiguousarray(weight).tobytes())
+    return digest.hexdigest()[:16]
+
+
+def dataset_fingerprint(filenames, labels) -> str:
+    digest = hashlib.sha256()
+    for name, label in zip(filenames, labels):
+        digest.update(f"{name}:{label}\n".encode())
+    return digest.hexdigest()[:16]
+
+
+class BottleneckFeatureCache:
+    """On-disk cache of frozen-backbone outputs
+
+    Features live under ``<root_dir>/<backbone hash>_<dataset hash>_<HxW>/``
+    as ``<tag>_features.npy`` and ``<tag>_labels.npy``, so they are reused
+    by any run whose backbone weights, image list and image size match.
+    """
+
+    def __init__(self, root_dir: Path, backbone: tf.keras.Model, data_key: str):
+        self.backbone = backbone
+        height, width = backbone.input_shape[1:3]
+        key = f"{backbone_fingerprint(backbone)}_{data_key}_{height}x{width}"
+        self.cache_dir = Path(root_dir) / key
+
+    def _paths(self, tag: str):
+        return self.cache_dir / f"{tag}_features.npy", self.cache_dir / f"{tag}_labels.npy"
+
+    def features_for(self, data, num_samples: int, tag: str):
+        """Return (features, integer labels) for ``data``, computing them once
+
+        Args:
+            data: Keras ``Sequence``/``DirectoryIterator`` or ``tf.data``
+                dataset yielding (images, one-hot labels) batches
+            num_samples (int): number of samples in one pass over ``data``
+            tag (str): name of the subset, e.g. ``"training"``
+
+        Returns:
+            tuple: memory-mapped features array and labels array
+        """
+        features_path, labels_path = self._paths(tag)
+        if features_path.exists() and labels_path.exists():
+            logger.info(f"reusing bottleneck features from {features_path}")
+            return np.load(features_path, mmap_mode="r"), np.load(labels_path)
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        if isinstance(data, tf.data.Dataset):
+            batches = iter(data)
+        else:
+            batches = (data[i] for i in range(len(data)))
+
+        features, labels, seen = None, [], 0
+        for x, y in batches:
+            out = self.backbone.predict_on_batch(x)
+            out = out.numpy() if hasattr(out, "numpy") else out
+            take = min(len(out), num_samples - seen)
+            if features is None:
+                tmp_path = features_path.with_suffix(".tmp.npy")
+                features = np.lib.format.open_memmap(
+                    tmp_path, mode="w+", dtype=np.float32, shape=(num_samples,) + out.shape[1:]
+                )
+            features[seen:seen + take] = out[:take]
+            labels.append(np.argmax(np.asarray(y)[:take], axis=-1))
+            seen += take
+            if seen >= num_samples:
+                break
+
+        features.flush()
+        del features
+        os.replace(tmp_path, features_path)
+        np.save(labels_path, np.concatenate(labels).astype(np.int64))
+        logger.info(f"cached {seen} bottleneck feature vectors at {features_path}")
+
+        return np.load(features_path, mmap_mode="r"), np.load(labels_path)
@@ -0,0 +1,88 @@
+import tensorflow as tf
+from cnnClassifier.utils.augmentation import random_augment
+
+
+AUTOTUNE = tf.data.AUTOTUNE
+
+
+def _decode_and_resize(image_size):
+    height, width = image_size[:2]
+
+    def _map(path, label):
+        img = tf.io.decode_image(tf.io.read_file(path), channels=3, expand_animations=False)
+        img = tf.image.resize(img, (height, width), method="bilinear")
+        # Keep the cached copy as uint8 so the in-memory cache stays 4x smaller
+        img = tf.cast(tf.clip_by_value(tf.round(img), 0, 255), tf.uint8)
+        return img, label
+
+    return _map
+
+
+def build_dataset(filepaths, labels, num_classes: int, image_size: list, batch_size: int,
+                  shuffle: bool = False, augmentation_kwargs: dict = None, cache: str = "memory",
+                  repeat: bool = False, seed: int = None) -> tf.data.Dataset:
+    """``tf.data`` input pipeline over image files
+
+    Files are decoded and resized in parallel, optionally cached (``"memory"``,
+    ``"none"`` or a file path for an on-disk cache), shuffled, batched,
+    augmented a whole batch at a time and prefetched.
+
+    Args:
+        filepaths (list): image paths
+        labels (list): integer class index per path
+        num_classes (int): width of the one-hot labels
+        image_size (list): [height, width, channels]
+        batch_size (int): batch size
+        shuffle (bool, optional): reshuffle every epoch. Defaults to False.
+        augmentation_kwargs (dict, optional): ``ImageDataGenerator``-style
+            augmentation settings, or None for no augmentation
+        cache (str, optional): cache mode. Defaults to "memory".
+        repeat (bool, optional): repeat indefinitely. Defaults to False.
+        seed (int, optional): shuffle seed
+
+    Returns:
+        tf.data.Dataset: yields (float32 images in [0, 1], one-hot labels)
+    """
+    filepaths = [str(p) for p in filepaths]
+    ds = tf.data.Dataset.from_tensor_slices((filepaths, list(labels)))
+    ds = ds.map(_decode_and_resize(image_size), num_parallel_calls=AUTOTUNE, deterministic=not shuffle)
+
+    if cache == "memory":
+        ds = ds.cache()
+    elif cache and cache != "none":
+        ds = ds.cache(str(cache))
+
+    if shuffle:
+        ds = ds.shuffle(len(filepaths), seed=seed, reshuffle_each_iteration=True)
+    if repeat:
+        ds = ds.repeat()
+
+    ds = ds.batch(batch_size)
+
+    def _finalize(images, batch_labels):
+        images = tf.cast(images, tf.float32)
+        if augmentation_kwargs:
+            images = random_augment(images, **augmentation_kwargs)
+        return images / 255.0, tf.one_hot(batch_labels, num_classes)
+
+    ds = ds.map(_finalize, num_parallel_calls=AUTOTUNE)
+    return ds.prefetch(AUTOTUNE)
+
+
+def dataset_from_sequence(sequence, num_classes: int, image_size: list) -> tf.data.Dataset:
+    """Endless ``tf.data`` view over a Keras ``Sequence`` of (images, one-hot labels)
+
+    Lets the ``shards`` and ``directory`` backends feed a distribution
+    strategy, which needs a dataset rather than a ``Sequence``.
+    """
+    def generator():
+        while True:
+            for i in range(len(sequence)):
+                yield sequence[i]
+            sequence.on_epoch_end()
+
+    output_signature = (
+        tf.TensorSpec(shape=(None,) + tuple(image_size), dtype=tf.float32),
+        tf.TensorSpec(shape=(None, num_classes), dtype=tf.float32)
+    )
+    return tf.data.Dataset.from_generator(generator, output_signature=output_signature).prefetch(AUTOTUNE)
@@ -4,7 +4,16 @@ import mlflow
 import mlflow.keras
 from urllib.parse import urlparse
 from cnnClassifier.entity.config_entity import EvaluationConfig
-from cnnClassifier.utils.common import read_yaml, create_directories,save_json
+from cnnClassifier.utils.common import read_yaml, create_directories,save_json, load_json
+from cnnClassifier.utils.metrics import classification_report, scalar_metrics, plot_roc_curves, plot_reliability_diagram
+from cnnClassifier.utils.model_registry import fingerprint
+from cnnClassifier import logger
+import os
+from cnnClassifier.components.dataset_cache import ShardedDataset, ShardSequence, load_image_list, flow_from_image_list
+from cnnClassifier.components.dataset_split import DatasetSplit
+from cnnClassifier.components.input_pipeline import build_dataset
+from cnnClassifier.components.feature_cache import BottleneckFeatureCache, split_frozen_model, dataset_fingerprint
+import numpy as np
 
 
 class Evaluation:
@@ -13,10 +22,35 @@ class Evaluation:
 
     
     def _valid_generator(self):
+        # Only the validation rows of the split shared with training are read
+        filenames, labels, class_indices = DatasetSplit(self.config.split_path).image_list("validation")
+        self.valid_samples = len(filenames)
+        self.valid_filenames = list(filenames)
+        self.class_indices = dict(class_indices)
+
+        if self.config.params_data_backend == "shards":
+            dataset = ShardedDataset(self.config.dataset_cache_dir)
+            self.valid_generator = ShardSequence(
+                dataset,
+                dataset.indices_of(filenames),
+                batch_size=self.config.params_batch_size,
+                shuffle=False
+            )
+            return
+
+        if self.config.params_data_backend == "tfdata":
+            self.valid_generator = build_dataset(
+                [os.path.join(self.config.training_data, f) for f in filenames],
+                labels,
+                num_classes=len(class_indices),
+                image_size=self.config.params_image_size,
+                batch_size=self.config.params_batch_size,
+                cache="none"
+            )
+            return
 
         datagenerator_kwargs = dict(
-            rescale = 1./255,
-            validation_split=0.30
+            rescale = 1./255
         )
 
         dataflow_kwargs = dict(
@@ -29,9 +63,10 @@ class Evaluation:
             **datagenerator_kwargs
         )
 
-        self.valid_generator = valid_datagenerator.flow_from_directory(
-            directory=self.config.training_data,
-            subset="validation",
+        self.valid_generator = flow_from_image_list(
+            valid_datagenerator,
+            self.config.training_data,
+            filenames, labels, class_indices,
             shuffle=False,
             **dataflow_kwargs
         )
@@ -44,10 +79,131 @@ class Evaluation:
 
     def evaluation(self):
         self.model = self.load_model(self.config.path_of_model)
-        self._valid_generator()
-        self.score = self.model.evaluate(self.valid_generator)
+        if not self.load_predictions():
+            self._valid_generator()
+            self.probs, self.labels = None, None
+            if self._use_feature_cache():
+                self.probs, self.labels = self._predict_on_cached_features()
+            if self.probs is None:
+                self.probs, self.labels = self.collect_predictions(self.model)
+            self.save_predictions()
+
+        # Everything below is derived from the saved probabilities; adding a
+        # metric never needs another pass over the data
+        self.score = self.score_from_predictions(self.probs, self.labels)
+        self.compute_metrics()
         self.save_score()
 
+    def _use_feature_cache(self) -> bool:
+        # Same condition as training: the cache only exists without augmentation
+        return bool(self.config.params_feature_cache and not self.config.params_is_augmentation)
+
+    def _predictions_key(self) -> dict:
+        return {
+            "model_version": fingerprint(self.config.path_of_model),
+            "split": DatasetSplit(self.config.split_path).fingerprint,
+            "data_backend": self.config.params_data_backend,
+            "feature_cache": self._use_feature_cache(),
+            "image_size": list(self.config.params_image_size)
+        }
+
+    def save_predictions(self):
+        """Persist the validation pass: probabilities, labels, and an index
+        with the file order and class mapping they are aligned to
+        """
+        np.save(self.config.predictions_path, self.probs.astype(np.float32))
+        np.save(self.config.labels_path, self.labels.astype(np.int64))
+        save_json(
+            path=Path(self.config.index_path),
+            data={
+                **self._predictions_key(),
+                "num_samples": int(len(self.labels)),
+                "class_indices": self.class_indices,
+                "filenames": self.valid_filenames[:len(self.labels)]
+            }
+        )
+
+    def load_predictions(self) -> bool:
+        """Reuse saved predictions if they came from this exact model file
+        and validation split
+        """
+        paths = [self.config.predictions_path, self.config.labels_path, self.config.index_path]
+        if not all(os.path.exists(p) for p in paths):
+            return False
+        index = load_json(Path(self.config.index_path))
+        key = self._predictions_key()
+        if any(index.get(k) != v for k, v in key.items()):
+            return False
+
+        self.probs = np.load(self.config.predictions_path)
+        self.labels = np.load(self.config.labels_path)
+        self.class_indices = dict(index.class_indices)
+        self.valid_filenames = list(index.filenames)
+        logger.info(f"reusing validation predictions from {self.config.predictions_path}")
+        return True
+
+    def _predict_on_cached_features(self):
+        # Reuse the frozen-backbone features cached by training (or by an
+        # earlier evaluation) and only run the head over them
+        backbone, head = split_frozen_model(self.model)
+        if backbone is None:
+            return None, None
+
+        filenames, labels, _ = load_image_list(self.config.training_data, self.config.manifest_path)
+        cache = BottleneckFeatureCache(
+            root_dir=self.config.feature_cache_dir,
+            backbone=backbone,
+            data_key=dataset_fingerprint(filenames, labels)
+        )
+        features, feature_labels = cache.features_for(
+            self.valid_generator, self.valid_samples, tag=f"validation_{DatasetSplit(self.config.split_path).fingerprint}"
+        )
+        probs = head.predict(features, batch_size=self.config.params_batch_size, verbose=0)
+        return np.asarray(probs), np.asarray(feature_labels)
+
+    def collect_predictions(self, model):
+        """One pass of ``model`` over the validation data
+
+        ``model`` only needs a Keras-style ``predict``, so TFLite variants
+        can be scored the same way.
+
+        Returns:
+            tuple: (probabilities, integer labels) in validation order
+        """
+        if isinstance(self.valid_generator, tf.data.Dataset):
+            batches = iter(self.valid_generator)
+        else:
+            batches = (self.valid_generator[i] for i in range(len(self.valid_generator)))
+
+        probs, labels = [], []
+        for x, y in batches:
+            probs.append(np.asarray(model.predict(np.asarray(x), verbose=0)))
+            labels.append(np.argmax(np.asarray(y), axis=-1))
+        return np.concatenate(probs)[:self.valid_samples], np.concatenate(labels)[:self.valid_samples]
+
+    @staticmethod
+    def score_from_predictions(probs, labels) -> list:
+        """[categorical cross-entropy, accuracy], as returned by ``model.evaluate``"""
+        probs = np.clip(probs, 1e-7, 1 - 1e-7)
+        loss = float(-np.mean(np.log(probs[np.arange(len(labels)), labels])))
+        accuracy = float(np.mean(np.argmax(probs, axis=-1) == labels))
+        return [loss, accuracy]
+
+    def compute_metrics(self):
+        """Full metric suite and plots from the saved predictions"""
+        idx_to_label = {v: k for k, v in self.class_indices.items()}
+        class_names = [idx_to_label.get(i, str(i)) for i in range(max(self.probs.shape[-1], 2))]
+        report = classification_report(self.probs, self.labels, class_names)
+
+        self.roc_plot_path = Path(self.config.plots_dir) / "roc_curves.png"
+        self.reliability_plot_path = Path(self.config.plots_dir) / "reliability_diagram.png"
+        plot_roc_curves(report, self.roc_plot_path)
+        plot_reliability_diagram(report, self.reliability_plot_path)
+
+        self.metrics = {k: v for k, v in report.items() if not k.startswith("_")}
+        save_json(path=Path(self.config.metrics_path), data=self.metrics)
+        self.metrics_summary = scalar_metrics(report)
+
     def save_score(self):
         scores = {"loss": self.score[0], "accuracy": self.score[1]}
         save_json(path=Path("scores.json"), data=scores)
@@ -60,8 +216,10 @@ class Evaluation:
         with mlflow.start_run():
             mlflow.log_params(self.config.all_params)
             mlflow.log_metrics(
-                {"loss": self.score[0], "accuracy": self.score[1]}
+                {**self.metrics_summary, "loss": self.score[0], "accuracy": self.score[1]}
             )
+            mlflow.log_artifact(str(self.config.metrics_path), artifact_path="evaluation")
+            mlflow.log_artifacts(str(self.config.plots_dir), artifact_path="evaluation/plots")
             # Model registry does not work with file store
             if tracking_url_type_store != "file":
 
@@ -0,0 +1,118 @@
+import os
+import time
+import numpy as np
+import tensorflow as tf
+from pathlib import Path
+from cnnClassifier import logger
+from cnnClassifier.entity.config_entity import QuantizationConfig
+from cnnClassifier.components.dataset_split import DatasetSplit
+from cnnClassifier.components.model_evaluation_mlflow import Evaluation
+from cnnClassifier.utils.common import save_json
+from cnnClassifier.utils.model_registry import TFLiteModel
+
+
+class ModelQuantization:
+    def __init__(self, config: QuantizationConfig):
+        self.config = config
+
+    def _load_model(self) -> tf.keras.Model:
+        return tf.keras.models.load_model(self.config.path_of_model, compile=False)
+
+    def _representative_dataset(self):
+        # A fixed random sample of training images, preprocessed exactly like
+        # at inference time, to calibrate the int8 activation ranges
+        filenames, _, _ = DatasetSplit(self.config.split_path).image_list("training")
+        rng = np.random.default_rng(0)
+        sample = rng.choice(len(filenames), size=min(self.config.params_representative_samples, len(filenames)), replace=False)
+        height, width = self.config.params_image_size[:2]
+
+        def generator():
+            for i in sample:
+                # Bilinear like the training/serving pipelines (load_img
+                # defaults to nearest), so the calibrated ranges match
+                img = tf.keras.preprocessing.image.load_img(
+                    os.path.join(self.config.training_data, filenames[i]),
+                    target_size=(height, width),
+                    interpolation="bilinear"
+                )
+                arr = tf.keras.preprocessing.image.img_to_array(img) / 255.0
+                yield [np.expand_dims(arr, axis=0).astype(np.float32)]
+
+        return generator
+
+    def export_dynamic_range(self):
+        """Weights stored as int8, activations computed in float"""
+        converter = tf.lite.TFLiteConverter.from_keras_model(self._load_model())
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        self._write(converter.convert(), self.config.dynamic_range_model_path)
+
+    def export_int8(self):
+        """Full integer quantization calibrated on training images; the model
+        keeps float32 inputs/outputs so callers need no changes
+        """
+        converter = tf.lite.TFLiteConverter.from_keras_model(self._load_model())
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.representative_dataset = self._representative_dataset()
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+        self._write(converter.convert(), self.config.int8_model_path)
+
+    @staticmethod
+    def _write(tflite_model: bytes, path: Path):
+        with open(path, "wb") as f:
+            f.write(tflite_model)
+        logger.info(f"quantized model saved at: {path} ({len(tflite_model) / 2**20:.1f} MB)")
+
+    @staticmethod
+    def _latency_ms(model, input_shape, runs=20) -> float:
+        x = np.zeros((1,) + tuple(input_shape), dtype=np.float32)
+        model.predict(x, verbose=0)
+        timings = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            model.predict(x, verbose=0)
+            timings.append((time.perf_counter() - start) * 1000.0)
+        return float(np.median(timings))
+
+    @staticmethod
+    def _agreement(predicted, reference, labels, class_names) -> dict:
+        """Share of images where a variant predicts the same class as the
+        float model, overall and per true class
+        """
+        same = predicted == reference
+        per_class = {
+            name: round(float(same[labels == index].mean()), 4)
+            for index, name in class_names.items() if np.any(labels == index)
+        }
+        return {"agreement": round(float(same.mean()), 4), "agreement_per_class": per_class}
+
+    def evaluate_variants(self, evaluation: Evaluation):
+        """Score the Keras model and each quantized variant on the same
+        validation pass used by the evaluation stage, along with how often
+        each variant agrees with the float model
+        """
+        evaluation._valid_generator()
+        class_names = {index: name for name, index in evaluation.class_indices.items()}
+        variants = {
+            "keras": self.config.path_of_model,
+            "dynamic_range": self.config.dynamic_range_model_path,
+            "int8": self.config.int8_model_path
+        }
+
+        scores, reference = {}, None
+        for name, path in variants.items():
+            model = self._load_model() if name == "keras" else TFLiteModel(path)
+            probs, labels = evaluation.collect_predictions(model)
+            loss, accuracy = evaluation.score_from_predictions(probs, labels)
+            predicted = np.argmax(probs, axis=-1)
+            if reference is None:
+                reference = predicted
+            scores[name] = {
+                "loss": loss,
+                "accuracy": accuracy,
+                **self._agreement(predicted, reference, labels, class_names),
+                "size_mb": round(os.path.getsize(path) / 2**20, 2),
+                "latency_ms": self._latency_ms(model, self.config.params_image_size)
+            }
+            logger.info(f"{name}: {scores[name]}")
+
+        save_json(path=Path(self.config.scores_path), data=scores)
@@ -1,27 +1,102 @@
 import os
-import urllib.request as request
-from zipfile import ZipFile
+import math
+import shutil
+import contextlib
+import numpy as np
 import tensorflow as tf
-import time
 from pathlib import Path
 from cnnClassifier.entity.config_entity import TrainingConfig
+from cnnClassifier.components.dataset_cache import ShardedDataset, ShardSequence, load_image_list, flow_from_image_list
+from cnnClassifier.components.dataset_split import DatasetSplit
+from cnnClassifier.components.input_pipeline import build_dataset, dataset_from_sequence
+from cnnClassifier.components.feature_cache import BottleneckFeatureCache, split_frozen_model, dataset_fingerprint
+from cnnClassifier.utils.precision import resolve_precision_policy, cast_model_to_policy, wrap_optimizer
+from cnnClassifier.utils.distribute import resolve_strategy, is_chief, worker_save_path
+from cnnClassifier import logger
+
+
+AUGMENTATION_KWARGS = dict(
+    rotation_range=40,
+    horizontal_flip=True,
+    width_shift_range=0.2,
+    height_shift_range=0.2,
+    shear_range=0.2,
+    zoom_range=0.2
+)
 
 
 class Training:
     def __init__(self, config: TrainingConfig):
         self.config = config
+        # The strategy has to exist before any other TensorFlow op runs;
+        # BATCH_SIZE is per replica, so the global batch grows with the cluster
+        self.strategy = resolve_strategy(config.params_distribution, config.params_communication)
+        self.num_replicas = self.strategy.num_replicas_in_sync if self.strategy else 1
+        self.global_batch_size = config.params_batch_size * self.num_replicas
+
+    def _scope(self):
+        return self.strategy.scope() if self.strategy else contextlib.nullcontext()
 
     
     def get_base_model(self):
-        self.model = tf.keras.models.load_model(
-            self.config.updated_base_model_path
+        with self._scope():
+            self.model = tf.keras.models.load_model(
+                self.config.updated_base_model_path
+            )
+            self.loss = self.model.loss
+            self.optimizer_config = tf.keras.optimizers.serialize(self.model.optimizer)
+            self._configure_execution()
+
+    def _new_optimizer(self):
+        optimizer = tf.keras.optimizers.deserialize(self.optimizer_config)
+        return wrap_optimizer(optimizer, self.precision_policy)
+
+    def _configure_execution(self):
+        # Optionally rebuild the model under a mixed-precision policy (output
+        # layer kept in float32) and recompile it with XLA jit_compile
+        self.precision_policy = resolve_precision_policy(self.config.params_precision)
+        if self.precision_policy == "float32" and not self.config.params_jit_compile:
+            return
+
+        if self.precision_policy != "float32":
+            logger.info(f"training with {self.precision_policy} precision")
+            self.model = cast_model_to_policy(self.model, self.precision_policy)
+
+        self.model.compile(
+            optimizer=self._new_optimizer(),
+            loss=self.loss,
+            metrics=["accuracy"],
+            jit_compile=self.config.params_jit_compile
+        )
+
+    def _model_for_export(self) -> tf.keras.Model:
+        # Serve a plain float32 model regardless of the training precision
+        if self.precision_policy == "float32":
+            return self.model
+
+        model = cast_model_to_policy(self.model, "float32")
+        model.compile(
+            optimizer=tf.keras.optimizers.deserialize(self.optimizer_config),
+            loss=self.loss,
+            metrics=["accuracy"]
         )
+        return model
 
     def train_valid_generator(self):
+        # Both subsets come from the persisted split shared with evaluation
+        self.split = DatasetSplit(self.config.split_path)
+        self.train_files = self.split.image_list("training")
+        self.valid_files = self.split.image_list("validation")
+
+        if self.strategy:
+            return self._distributed_generators()
+        if self.config.params_data_backend == "shards":
+            return self._shard_generators()
+        if self.config.params_data_backend == "tfdata":
+            return self._tfdata_generators()
 
         datagenerator_kwargs = dict(
-            rescale = 1./255,
-            validation_split=0.20
+            rescale = 1./255
         )
 
         dataflow_kwargs = dict(
@@ -34,54 +109,242 @@ class Training:
             **datagenerator_kwargs
         )
 
-        self.valid_generator = valid_datagenerator.flow_from_directory(
-            directory=self.config.training_data,
-            subset="validation",
+        self.valid_generator = flow_from_image_list(
+            valid_datagenerator,
+            self.config.training_data,
+            *self.valid_files,
             shuffle=False,
             **dataflow_kwargs
         )
 
         if self.config.params_is_augmentation:
             train_datagenerator = tf.keras.preprocessing.image.ImageDataGenerator(
-                rotation_range=40,
-                horizontal_flip=True,
-                width_shift_range=0.2,
-                height_shift_range=0.2,
-                shear_range=0.2,
-                zoom_range=0.2,
+                **AUGMENTATION_KWARGS,
                 **datagenerator_kwargs
             )
         else:
             train_datagenerator = valid_datagenerator
 
-        self.train_generator = train_datagenerator.flow_from_directory(
-            directory=self.config.training_data,
-            subset="training",
+        self.train_generator = flow_from_image_list(
+            train_datagenerator,
+            self.config.training_data,
+            *self.train_files,
             shuffle=True,
             **dataflow_kwargs
         )
 
+        self.train_samples = self.train_generator.samples
+        self.valid_samples = self.valid_generator.samples
+
+    def _shard_generators(self):
+        # Stream pre-decoded uint8 images from the memory-mapped shards built
+        # by the dataset_cache stage instead of re-decoding JPEGs every epoch
+        dataset = ShardedDataset(self.config.dataset_cache_dir)
+
+        self.valid_generator = ShardSequence(
+            dataset,
+            dataset.indices_of(self.valid_files[0]),
+            batch_size=self.config.params_batch_size,
+            shuffle=False
+        )
+
+        augmenter = None
+        if self.config.params_is_augmentation:
+            augmenter = tf.keras.preprocessing.image.ImageDataGenerator(**AUGMENTATION_KWARGS)
+
+        self.train_generator = ShardSequence(
+            dataset,
+            dataset.indices_of(self.train_files[0]),
+            batch_size=self.config.params_batch_size,
+            shuffle=True,
+            image_data_generator=augmenter
+        )
+
+        self.train_samples = self.train_generator.samples
+        self.valid_samples = self.valid_generator.samples
+
+    def _tfdata_cache(self, subset: str, worker: int = None) -> str:
+        # Each subset (and each worker sharing a host) gets its own on-disk
+        # cache prefix, tied to the split so a re-split never replays stale files
+        cache = self.config.params_tfdata_cache
+        if cache in ("memory", "none"):
+            return cache
+        cache = f"{cache}_{subset}_{self.split.fingerprint}"
+        return cache if worker is None else f"{cache}_{worker}"
+
+    def _tfdata_generators(self):
+        # Parallel decode/resize, cache, batch-level vectorized augmentation
+        # and prefetch, all inside the tf.data runtime
+        train_filenames, train_labels, class_indices = self.train_files
+        valid_filenames, valid_labels, _ = self.valid_files
+        dataset_kwargs = dict(
+            num_classes=len(class_indices),
+            image_size=self.config.params_image_size,
+            batch_size=self.config.params_batch_size
+        )
+
+        self.valid_generator = build_dataset(
+            [os.path.join(self.config.training_data, f) for f in valid_filenames],
+            valid_labels,
+            cache=self._tfdata_cache("validation"),
+            **dataset_kwargs
+        )
+
+        self.train_generator = build_dataset(
+            [os.path.join(self.config.training_data, f) for f in train_filenames],
+            train_labels,
+            shuffle=True,
+            repeat=True,
+            augmentation_kwargs=AUGMENTATION_KWARGS if self.config.params_is_augmentation else None,
+            cache=self._tfdata_cache("training"),
+            **dataset_kwargs
+        )
+
+        self.train_samples = len(train_filenames)
+        self.valid_samples = len(valid_filenames)
+
+    def _distributed_generators(self):
+        # Each worker reads a disjoint slice of its split, batched to the
+        # per-replica share of the global batch, so no image is decoded twice
+        def creator(files, training: bool):
+            def dataset_fn(input_context):
+                filenames, labels, class_indices = files
+                shard = slice(input_context.input_pipeline_id, None, input_context.num_input_pipelines)
+                batch_size = input_context.get_per_replica_batch_size(self.global_batch_size)
+                return self._worker_dataset(
+                    filenames[shard], labels[shard], class_indices, batch_size, training,
+                    worker=input_context.input_pipeline_id
+                )
+            return tf.keras.utils.experimental.DatasetCreator(dataset_fn)
+
+        self.train_generator = creator(self.train_files, training=True)
+        self.valid_generator = creator(self.valid_files, training=False)
+        self.train_samples = len(self.train_files[0])
+        self.valid_samples = len(self.valid_files[0])
+
+    def _worker_dataset(self, filenames, labels, class_indices, batch_size: int, training: bool, worker: int):
+        """Endless ``tf.data`` pipeline over one worker's slice of a split"""
+        augment = training and self.config.params_is_augmentation
+        num_classes = len(class_indices)
+
+        if self.config.params_data_backend == "tfdata":
+            cache = self._tfdata_cache("training" if training else "validation", worker)
+            return build_dataset(
+                [os.path.join(self.config.training_data, f) for f in filenames],
+                labels,
+                num_classes=num_classes,
+                image_size=self.config.params_image_size,
+                batch_size=batch_size,
+                shuffle=training,
+                repeat=True,
+                augmentation_kwargs=AUGMENTATION_KWARGS if augment else None,
+                cache=cache
+            )
+
+        if self.config.params_data_backend == "shards":
+            dataset = ShardedDataset(self.config.dataset_cache_dir)
+            sequence = ShardSequence(
+                dataset,
+                dataset.indices_of(filenames),
+                batch_size=batch_size,
+                shuffle=training,
+                image_data_generator=tf.keras.preprocessing.image.ImageDataGenerator(**AUGMENTATION_KWARGS) if augment else None
+            )
+        else:
+            datagenerator = tf.keras.preprocessing.image.ImageDataGenerator(
+                rescale=1./255,
+                **(AUGMENTATION_KWARGS if augment else {})
+            )
+            sequence = flow_from_image_list(
+                datagenerator,
+                self.config.training_data,
+                filenames, labels, class_indices,
+                target_size=self.config.params_image_size[:-1],
+                batch_size=batch_size,
+                interpolation="bilinear",
+                shuffle=training
+            )
+        return dataset_from_sequence(sequence, num_classes, self.config.params_image_size)
+
     
     @staticmethod
     def save_model(path: Path, model: tf.keras.Model):
         model.save(path)
 
+    def _export(self):
+        # Every worker takes part in saving, but only the chief writes to
+        # the real location; the others write to a temporary directory
+        path = worker_save_path(self.config.trained_model_path)
+        self.save_model(path=path, model=self._model_for_export())
+        if not is_chief():
+            shutil.rmtree(path.parent, ignore_errors=True)
+
+    def _callbacks(self) -> list:
+        if not self.strategy:
+            return []
+        # Lets a restarted cluster resume from the last finished epoch; the
+        # chief owns the backup and removes it once training completes
+        return [tf.keras.callbacks.BackupAndRestore(backup_dir=str(Path(self.config.root_dir) / "backup"))]
+
 
 
     
     def train(self):
-        self.steps_per_epoch = self.train_generator.samples // self.train_generator.batch_size
-        self.validation_steps = self.valid_generator.samples // self.valid_generator.batch_size
+        # At least one step, or the endless distributed datasets would be
+        # treated as unbounded once the global batch outgrows a split
+        self.steps_per_epoch = max(1, math.ceil(self.train_samples / self.global_batch_size))
+        self.validation_steps = max(1, math.ceil(self.valid_samples / self.global_batch_size))
+
+        if self.config.params_feature_cache and not self.config.params_is_augmentation:
+            backbone, head = split_frozen_model(self.model) if not self.strategy else (None, None)
+            if backbone is not None:
+                self._train_on_cached_features(backbone, head)
+                self._export()
+                return
+            if self.strategy:
+                logger.info("feature cache is single-process only, training end to end across workers")
+            else:
+                logger.info("model has no frozen backbone, training end to end")
 
         self.model.fit(
             self.train_generator,
             epochs=self.config.params_epochs,
             steps_per_epoch=self.steps_per_epoch,
             validation_steps=self.validation_steps,
-            validation_data=self.valid_generator
+            validation_data=self.valid_generator,
+            callbacks=self._callbacks()
         )
 
-        self.save_model(
-            path=self.config.trained_model_path,
-            model=self.model
+        self._export()
+
+    def _train_on_cached_features(self, backbone, head):
+        # Without augmentation the frozen backbone maps each image to the same
+        # features every epoch, so run it once and fit only the head on them
+        filenames, labels, _ = load_image_list(self.config.training_data, self.config.manifest_path)
+        cache = BottleneckFeatureCache(
+            root_dir=self.config.feature_cache_dir,
+            backbone=backbone,
+            data_key=dataset_fingerprint(filenames, labels)
+        )
+        train_x, train_y = cache.features_for(
+            self.train_generator, self.train_samples, tag=f"training_{self.split.fingerprint}"
+        )
+        valid_x, valid_y = cache.features_for(
+            self.valid_generator, self.valid_samples, tag=f"validation_{self.split.fingerprint}"
+        )
+
+        num_classes = head.output_shape[-1]
+        head.compile(
+            optimizer=self._new_optimizer(),
+            loss=self.loss,
+            metrics=["accuracy"],
+            jit_compile=self.config.params_jit_compile
+        )
+        head.fit(
+            train_x,
+            np.eye(num_classes, dtype=np.float32)[train_y],
+            batch_size=self.config.params_batch_size,
+            epochs=self.config.params_epochs,
+            shuffle=True,
+            validation_data=(valid_x, np.eye(num_classes, dtype=np.float32)[valid_y])
         )
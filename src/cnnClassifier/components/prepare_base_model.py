@@ -6,13 +6,30 @@ from pathlib import Path
 from cnnClassifier.entity.config_entity import PrepareBaseModelConfig
 
 
+# name -> (constructor, input scale). Backbones with built-in preprocessing
+# expect pixels in [0, 255] while our pipelines feed [0, 1], so they get a
+# Rescaling layer in front; VGG16 has always been trained on [0, 1] inputs.
+BACKBONES = {
+    "vgg16": (tf.keras.applications.vgg16.VGG16, None),
+    "mobilenet_v3_small": (tf.keras.applications.MobileNetV3Small, 255.0),
+    "mobilenet_v3_large": (tf.keras.applications.MobileNetV3Large, 255.0),
+    "efficientnet_b0": (tf.keras.applications.efficientnet.EfficientNetB0, 255.0),
+}
+
+HEADS = {
+    "flatten": tf.keras.layers.Flatten,
+    "gap": tf.keras.layers.GlobalAveragePooling2D,
+}
+
+
 class PrepareBaseModel:
     def __init__(self, config: PrepareBaseModelConfig):
         self.config = config
 
     
     def get_base_model(self):
-        self.model = tf.keras.applications.vgg16.VGG16(
+        self.model = self.build_backbone(
+            name=self.config.params_backbone,
             input_shape=self.config.params_image_size,
             weights=self.config.params_weights,
             include_top=self.config.params_include_top
@@ -20,10 +37,34 @@ class PrepareBaseModel:
 
         self.save_model(path=self.config.base_model_path, model=self.model)
 
+    @staticmethod
+    def build_backbone(name, input_shape, weights, include_top):
+        if name not in BACKBONES:
+            raise ValueError(f"BACKBONE must be one of {list(BACKBONES)}, got {name!r}")
+        constructor, input_scale = BACKBONES[name]
+
+        if input_scale is None:
+            return constructor(
+                input_shape=input_shape,
+                weights=weights,
+                include_top=include_top
+            )
+
+        # Build the backbone on top of the rescaling layer (rather than nesting
+        # it) so its layers stay in one flat graph, which Grad-CAM relies on
+        inputs = tf.keras.Input(shape=input_shape)
+        scaled = tf.keras.layers.Rescaling(input_scale, name="input_rescaling")(inputs)
+        return constructor(
+            input_tensor=scaled,
+            input_shape=input_shape,
+            weights=weights,
+            include_top=include_top
+        )
+
     
 
     @staticmethod
-    def _prepare_full_model(model, classes, freeze_all, freeze_till, learning_rate):
+    def _prepare_full_model(model, classes, freeze_all, freeze_till, learning_rate, head="flatten"):
         if freeze_all:
             for layer in model.layers:
                 model.trainable = False
@@ -31,7 +72,9 @@ class PrepareBaseModel:
             for layer in model.layers[:-freeze_till]:
                 model.trainable = False
 
-        flatten_in = tf.keras.layers.Flatten()(model.output)
+        if head not in HEADS:
+            raise ValueError(f"HEAD must be one of {list(HEADS)}, got {head!r}")
+        flatten_in = HEADS[head]()(model.output)
         prediction = tf.keras.layers.Dense(
             units=classes,
             activation="softmax"
@@ -57,7 +100,8 @@ class PrepareBaseModel:
             classes=self.config.params_classes,
             freeze_all=True,
             freeze_till=None,
-            learning_rate=self.config.params_learning_rate
+            learning_rate=self.config.params_learning_rate,
+            head=self.config.params_head
         )
 
         self.save_model(path=self.config.updated_base_model_path, model=self.full_model)
@@ -1,7 +1,8 @@
 from cnnClassifier.constants import *
 from cnnClassifier.utils.common import read_yaml, create_directories
 import os
-from cnnClassifier.entity.config_entity import (DataIngestionConfig, PrepareBaseModelConfig, TrainingConfig, EvaluationConfig)
+from cnnClassifier.entity.config_entity import (DataIngestionConfig, DataSplitConfig, DatasetCacheConfig, PrepareBaseModelConfig, BackboneBenchmarkConfig, TrainingConfig, EvaluationConfig,
+                                                 QuantizationConfig, ServingConfig)
 
 class ConfigurationManager:
     def __init__(
@@ -24,14 +25,64 @@ class ConfigurationManager:
         data_ingestion_config = DataIngestionConfig(
             root_dir=config.root_dir,
             source_URL=config.source_URL,
+            source_type=config.source_type,
+            sha256=str(config.sha256 or ""),
             local_data_file=config.local_data_file,
-            unzip_dir=config.unzip_dir 
+            unzip_dir=config.unzip_dir,
+            data_dir=Path(config.data_dir),
+            manifest_path=Path(config.manifest_path),
+            chunk_size=int(config.chunk_size),
+            num_workers=int(config.num_workers)
         )
 
         return data_ingestion_config
     
 
-    
+    def get_data_split_config(self) -> DataSplitConfig:
+        config = self.config.data_split
+
+        create_directories([config.root_dir])
+
+        data_split_config = DataSplitConfig(
+            root_dir=Path(config.root_dir),
+            split_path=Path(config.split_path),
+            manifest_path=Path(self.config.data_ingestion.manifest_path),
+            patient_ids_path=str(config.patient_ids_path or ""),
+            params_mode=self.params.SPLIT_MODE,
+            params_stratify=self.params.SPLIT_STRATIFY,
+            params_validation_fraction=float(self.params.VALIDATION_FRACTION),
+            params_folds=int(self.params.SPLIT_FOLDS),
+            params_fold=int(self.params.SPLIT_FOLD),
+            params_group_by=self.params.SPLIT_GROUP_BY,
+            params_seed=int(self.params.SPLIT_SEED)
+        )
+
+        return data_split_config
+
+
+    def _dataset_cache_dir(self) -> Path:
+        # Shards are keyed on image size so several resolutions can coexist
+        height, width = self.params.IMAGE_SIZE[:2]
+        return Path(self.config.dataset_cache.root_dir) / f"{height}x{width}"
+
+    def get_dataset_cache_config(self) -> DatasetCacheConfig:
+        config = self.config.dataset_cache
+
+        create_directories([config.root_dir])
+
+        dataset_cache_config = DatasetCacheConfig(
+            root_dir=Path(config.root_dir),
+            cache_dir=self._dataset_cache_dir(),
+            source_dir=Path(config.source_dir),
+            manifest_path=Path(self.config.data_ingestion.manifest_path),
+            shard_size=int(config.shard_size),
+            num_workers=int(config.num_workers),
+            params_image_size=self.params.IMAGE_SIZE
+        )
+
+        return dataset_cache_config
+
+
     def get_prepare_base_model_config(self) -> PrepareBaseModelConfig:
         config = self.config.prepare_base_model
         
@@ -45,16 +96,43 @@ class ConfigurationManager:
             params_learning_rate=self.params.LEARNING_RATE,
             params_include_top=self.params.INCLUDE_TOP,
             params_weights=self.params.WEIGHTS,
-            params_classes=self.params.CLASSES
+            params_classes=self.params.CLASSES,
+            params_backbone=self.params.BACKBONE,
+            params_head=self.params.HEAD
         )
 
-        return prepare_base_model_config    
+        return prepare_base_model_config
+
+    def get_backbone_benchmark_config(self) -> BackboneBenchmarkConfig:
+        config = self.config.backbone_benchmark
+
+        create_directories([config.root_dir])
+
+        backbone_benchmark_config = BackboneBenchmarkConfig(
+            root_dir=Path(config.root_dir),
+            results_path=Path(config.results_path),
+            training_data=Path(self.config.data_ingestion.data_dir),
+            manifest_path=Path(self.config.data_ingestion.manifest_path),
+            split_path=Path(self.config.data_split.split_path),
+            feature_cache_dir=Path(self.config.feature_cache.root_dir),
+            params_candidates=list(self.params.BENCHMARK_BACKBONES),
+            params_head=self.params.HEAD,
+            params_image_size=self.params.IMAGE_SIZE,
+            params_batch_size=self.params.BATCH_SIZE,
+            params_epochs=self.params.BENCHMARK_EPOCHS,
+            params_learning_rate=self.params.LEARNING_RATE,
+            params_weights=self.params.WEIGHTS,
+            params_classes=self.params.CLASSES,
+            params_accuracy_tolerance=self.params.BENCHMARK_ACCURACY_TOLERANCE
+        )
+
+        return backbone_benchmark_config    
 
     def get_training_config(self) -> TrainingConfig:
         training = self.config.training
         prepare_base_model = self.config.prepare_base_model
         params = self.params
-        training_data = os.path.join(self.config.data_ingestion.unzip_dir, "kidney-ct-scan-image")
+        training_data = self.config.data_ingestion.data_dir
         create_directories([
             Path(training.root_dir)
         ])
@@ -64,21 +142,84 @@ class ConfigurationManager:
             trained_model_path=Path(training.trained_model_path),
             updated_base_model_path=Path(prepare_base_model.updated_base_model_path),
             training_data=Path(training_data),
+            manifest_path=Path(self.config.data_ingestion.manifest_path),
+            split_path=Path(self.config.data_split.split_path),
             params_epochs=params.EPOCHS,
             params_batch_size=params.BATCH_SIZE,
             params_is_augmentation=params.AUGMENTATION,
-            params_image_size=params.IMAGE_SIZE
+            params_image_size=params.IMAGE_SIZE,
+            params_data_backend=params.DATA_BACKEND,
+            params_tfdata_cache=str(params.TFDATA_CACHE),
+            params_feature_cache=params.FEATURE_CACHE,
+            params_precision=params.PRECISION,
+            params_jit_compile=params.JIT_COMPILE,
+            params_distribution=params.DISTRIBUTION,
+            params_communication=params.COMMUNICATION,
+            dataset_cache_dir=self._dataset_cache_dir(),
+            feature_cache_dir=Path(self.config.feature_cache.root_dir)
         )
 
         return training_config
 
     def get_evaluation_config(self) -> EvaluationConfig:
+        config = self.config.evaluation
+
+        create_directories([config.root_dir, config.plots_dir])
+
         eval_config = EvaluationConfig(
             path_of_model="artifacts/training/model.h5",
-            training_data="artifacts/data_ingestion/kidney-ct-scan-image",
+            training_data=Path(self.config.data_ingestion.data_dir),
+            manifest_path=Path(self.config.data_ingestion.manifest_path),
+            split_path=Path(self.config.data_split.split_path),
             mlflow_uri="https://dagshub.com/jagannath-nayak/Kidney-Disease-Classification-MLflow-DVC.mlflow",
             all_params=self.params,
             params_image_size=self.params.IMAGE_SIZE,
-            params_batch_size=self.params.BATCH_SIZE
+            params_batch_size=self.params.BATCH_SIZE,
+            params_data_backend=self.params.DATA_BACKEND,
+            params_feature_cache=self.params.FEATURE_CACHE,
+            params_is_augmentation=self.params.AUGMENTATION,
+            dataset_cache_dir=self._dataset_cache_dir(),
+            feature_cache_dir=Path(self.config.feature_cache.root_dir),
+            root_dir=Path(config.root_dir),
+            predictions_path=Path(config.predictions_path),
+            labels_path=Path(config.labels_path),
+            index_path=Path(config.index_path),
+            metrics_path=Path(config.metrics_path),
+            plots_dir=Path(config.plots_dir)
         )
-        return eval_config        
\ No newline at end of file
+        return eval_config
+
+    def get_quantization_config(self) -> QuantizationConfig:
+        config = self.config.model_quantization
+
+        create_directories([config.root_dir])
+
+        quantization_config = QuantizationConfig(
+            root_dir=Path(config.root_dir),
+            path_of_model=Path(self.config.training.trained_model_path),
+            training_data=Path(self.config.data_ingestion.data_dir),
+            split_path=Path(self.config.data_split.split_path),
+            dynamic_range_model_path=Path(config.dynamic_range_model_path),
+            int8_model_path=Path(config.int8_model_path),
+            scores_path=Path(config.scores_path),
+            params_image_size=self.params.IMAGE_SIZE,
+            params_representative_samples=self.params.QUANTIZATION_SAMPLES
+        )
+
+        return quantization_config
+
+    def get_serving_config(self) -> ServingConfig:
+        config = self.config.serving
+
+        serving_config = ServingConfig(
+            model_path=Path(config.model_path),
+            class_indices_path=Path(config.class_indices_path),
+            host=config.host,
+            port=int(config.port),
+            max_batch_size=int(config.max_batch_size),
+            max_wait_ms=float(config.max_wait_ms),
+            max_queue_size=int(config.max_queue_size),
+            predict_timeout_s=float(config.predict_timeout_s)
+        )
+
+        return serving_config
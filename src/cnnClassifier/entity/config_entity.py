@@ -5,8 +5,38 @@ from pathlib import Path
 class DataIngestionConfig:
     root_dir: Path
     source_URL: str
+    source_type: str
+    sha256: str
     local_data_file: Path
     unzip_dir: Path
+    data_dir: Path
+    manifest_path: Path
+    chunk_size: int
+    num_workers: int
+
+@dataclass(frozen=True)
+class DataSplitConfig:
+    root_dir: Path
+    split_path: Path
+    manifest_path: Path
+    patient_ids_path: str
+    params_mode: str
+    params_stratify: bool
+    params_validation_fraction: float
+    params_folds: int
+    params_fold: int
+    params_group_by: str
+    params_seed: int
+
+@dataclass(frozen=True)
+class DatasetCacheConfig:
+    root_dir: Path
+    cache_dir: Path
+    source_dir: Path
+    manifest_path: Path
+    shard_size: int
+    num_workers: int
+    params_image_size: list
 
 @dataclass(frozen=True)
 class PrepareBaseModelConfig:
@@ -17,7 +47,28 @@ class PrepareBaseModelConfig:
     params_learning_rate: float
     params_include_top: bool
     params_weights: str
-    params_classes: int    
+    params_classes: int
+    params_backbone: str
+    params_head: str
+
+
+@dataclass(frozen=True)
+class BackboneBenchmarkConfig:
+    root_dir: Path
+    results_path: Path
+    training_data: Path
+    manifest_path: Path
+    split_path: Path
+    feature_cache_dir: Path
+    params_candidates: list
+    params_head: str
+    params_image_size: list
+    params_batch_size: int
+    params_epochs: int
+    params_learning_rate: float
+    params_weights: str
+    params_classes: int
+    params_accuracy_tolerance: float
 
 @dataclass(frozen=True)
 class TrainingConfig:
@@ -25,17 +76,65 @@ class TrainingConfig:
     trained_model_path: Path
     updated_base_model_path: Path
     training_data: Path
+    manifest_path: Path
+    split_path: Path
     params_epochs: int
     params_batch_size: int
     params_is_augmentation: bool
     params_image_size: list
+    params_data_backend: str
+    params_tfdata_cache: str
+    params_feature_cache: bool
+    params_precision: str
+    params_jit_compile: bool
+    params_distribution: str
+    params_communication: str
+    dataset_cache_dir: Path
+    feature_cache_dir: Path
 
 
 @dataclass(frozen=True)
 class EvaluationConfig:
     path_of_model: Path
     training_data: Path
+    manifest_path: Path
+    split_path: Path
     all_params: dict
     mlflow_uri: str
     params_image_size: list
-    params_batch_size: int        
\ No newline at end of file
+    params_batch_size: int
+    params_data_backend: str
+    params_feature_cache: bool
+    params_is_augmentation: bool
+    dataset_cache_dir: Path
+    feature_cache_dir: Path
+    root_dir: Path
+    predictions_path: Path
+    labels_path: Path
+    index_path: Path
+    metrics_path: Path
+    plots_dir: Path
+
+@dataclass(frozen=True)
+class QuantizationConfig:
+    root_dir: Path
+    path_of_model: Path
+    training_data: Path
+    split_path: Path
+    dynamic_range_model_path: Path
+    int8_model_path: Path
+    scores_path: Path
+    params_image_size: list
+    params_representative_samples: int
+
+
+@dataclass(frozen=True)
+class ServingConfig:
+    model_path: Path
+    class_indices_path: Path
+    host: str
+    port: int
+    max_batch_size: int
+    max_wait_ms: float
+    max_queue_size: int
+    predict_timeout_s: float
@@ -0,0 +1,215 @@
+import os
+import time
+import queue
+import threading
+from collections import Counter
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from flask import Flask, request, jsonify, render_template
+from flask_cors import CORS
+from cnnClassifier import logger
+from cnnClassifier.config.configuration import ConfigurationManager
+from cnnClassifier.entity.config_entity import ServingConfig
+from cnnClassifier.pipeline.prediction import PredictionPipeline, load_image_array
+from cnnClassifier.utils.common import decodeImageIntoArray, decodeImageStreamIntoArray
+
+
+STAGE_NAME = "Inference server"
+
+
+class MicroBatcher:
+    """Queue single-image requests and run them through the model together.
+
+    A background thread takes the oldest queued request, then keeps
+    collecting until either ``max_batch_size`` requests are waiting or
+    ``max_wait_ms`` has passed since that first request arrived, and runs
+    the whole group as one forward pass. ``max_wait_ms`` bounds the latency
+    added to any single request.
+    """
+
+    def __init__(self, predict_fn, max_batch_size=16, max_wait_ms=10.0, max_queue_size=1024, predict_timeout_s=30.0):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.predict_timeout_s = predict_timeout_s
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._stop = threading.Event()
+        self._thread = None
+
+        self._metrics_lock = threading.Lock()
+        self._requests_total = 0
+        self._batches_total = 0
+        self._batch_sizes = Counter()
+        self._queue_wait_ms_total = 0.0
+        self._queue_wait_ms_max = 0.0
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=5.0):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def submit(self, array) -> Future:
+        """Enqueue one preprocessed image; the future resolves to its result"""
+        future = Future()
+        self._queue.put_nowait((time.monotonic(), array, future))
+        return future
+
+    @property
+    def result_timeout(self) -> float:
+        """Longest a caller should wait: batching delay plus one forward pass"""
+        return self.max_wait_ms / 1000.0 + self.predict_timeout_s
+
+    def predict(self, array, timeout=None):
+        return self.submit(array).result(self.result_timeout if timeout is None else timeout)
+
+    def _collect(self):
+        try:
+            first = self._queue.get(timeout=0.1)
+        except queue.Empty:
+            return []
+
+        batch = [first]
+        deadline = first[0] + self.max_wait_ms / 1000.0
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while not self._stop.is_set():
+            batch = self._collect()
+            if not batch:
+                continue
+
+            started = time.monotonic()
+            arrays = [item[1] for item in batch]
+            try:
+                results = list(self.predict_fn(arrays))
+                if len(results) != len(batch):
+                    raise RuntimeError(f"predict_fn returned {len(results)} result(s) for {len(batch)} image(s)")
+            except Exception as e:
+                # Every waiting request gets the error, and the worker keeps
+                # serving later batches
+                logger.exception(e)
+                for _, _, future in batch:
+                    future.set_exception(e)
+            else:
+                for (_, _, future), result in zip(batch, results):
+                    future.set_result(result)
+
+            waits = [(started - item[0]) * 1000.0 for item in batch]
+            with self._metrics_lock:
+                self._requests_total += len(batch)
+                self._batches_total += 1
+                self._batch_sizes[len(batch)] += 1
+                self._queue_wait_ms_total += sum(waits)
+                self._queue_wait_ms_max = max(self._queue_wait_ms_max, max(waits))
+
+    def metrics(self) -> dict:
+        with self._metrics_lock:
+            batches = self._batches_total
+            requests_total = self._requests_total
+            return {
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait_ms,
+                "queue_depth": self._queue.qsize(),
+                "requests_total": requests_total,
+                "batches_total": batches,
+                "mean_batch_size": requests_total / batches if batches else 0.0,
+                "batch_size_histogram": {str(k): v for k, v in sorted(self._batch_sizes.items())},
+                "mean_queue_wait_ms": self._queue_wait_ms_total / requests_total if requests_total else 0.0,
+                "max_queue_wait_ms": self._queue_wait_ms_max,
+            }
+
+
+def build_batcher(config: ServingConfig) -> MicroBatcher:
+    pipeline = PredictionPipeline(
+        model_path=config.model_path,
+        class_indices_path=config.class_indices_path
+    )
+
+    return MicroBatcher(
+        # Requests arrive decoded, so the batch goes straight to the model
+        predict_fn=pipeline.predict_arrays,
+        max_batch_size=config.max_batch_size,
+        max_wait_ms=config.max_wait_ms,
+        max_queue_size=config.max_queue_size,
+        predict_timeout_s=config.predict_timeout_s
+    )
+
+
+def create_app(batcher: MicroBatcher, target_size=(224, 224)) -> Flask:
+    """Flask app serving ``templates/index.html`` with a micro-batched /predict
+
+    The app never starts the batcher itself, so tests can drive it through
+    ``app.test_client()`` with a batcher wrapping any ``predict_fn``.
+    """
+    app = Flask(__name__, template_folder=os.path.abspath("templates"))
+    CORS(app)
+
+    @app.route("/", methods=["GET"])
+    def home():
+        return render_template("index.html")
+
+    @app.route("/predict", methods=["POST"])
+    def predict_route():
+        # JSON bodies carry a base64 "image" field (templates/index.html);
+        # anything else is streamed: text/plain as base64, otherwise raw bytes
+        try:
+            if request.is_json:
+                payload = request.get_json(silent=True) or {}
+                if "image" not in payload:
+                    return jsonify({"error": "request body must be JSON with an 'image' field"}), 400
+                array = decodeImageIntoArray(payload["image"], target_size)
+            else:
+                array = decodeImageStreamIntoArray(
+                    request.stream,
+                    target_size,
+                    is_base64=request.mimetype == "text/plain"
+                )
+            array = load_image_array(array, target_size)
+        except Exception as e:
+            return jsonify({"error": f"could not decode image: {e}"}), 400
+
+        try:
+            result = batcher.predict(array)
+        except queue.Full:
+            return jsonify({"error": "server busy, try again"}), 503
+        except FutureTimeoutError:
+            # The batcher is stalled or not running; fail instead of hanging
+            return jsonify({"error": "prediction timed out, try again"}), 503
+        except Exception as e:
+            # Raised by predict_fn on the batcher thread, already logged there
+            return jsonify({"error": f"prediction failed: {e}"}), 500
+        status = 500 if "error" in result else 200
+        return jsonify(result), status
+
+    @app.route("/metrics", methods=["GET"])
+    def metrics_route():
+        return jsonify(batcher.metrics())
+
+    return app
+
+
+if __name__ == '__main__':
+    try:
+        logger.info(f">>>>>> {STAGE_NAME} starting <<<<<<")
+        config = ConfigurationManager().get_serving_config()
+        PredictionPipeline.warm_up(config.model_path)
+        batcher = build_batcher(config).start()
+        app = create_app(batcher)
+        app.run(host=config.host, port=config.port, threaded=True)
+    except Exception as e:
+        logger.exception(e)
+        raise e
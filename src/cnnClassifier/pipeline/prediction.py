@@ -1,46 +1,267 @@
 import numpy as np
-from tensorflow.keras.models import load_model
+import tensorflow as tf
 from tensorflow.keras.preprocessing import image
 import os
-import json
+from concurrent.futures import ThreadPoolExecutor
+from cnnClassifier.utils.model_registry import model_registry
+from cnnClassifier.utils.common import imageBytesToArray
+from cnnClassifier.utils.prediction_cache import content_hash
+from cnnClassifier.utils.augmentation import tta_transforms, tta_views
+
+
+TTA_AGGREGATES = ("mean", "geometric")
+
+
+def load_image_array(source, target_size=(224, 224)):
+    """Decode and resize one image into a float32 array scaled to [0, 1]
+
+    Args:
+        source: path to an image file, encoded image bytes, or an HxWxC
+            array (uint8 or already scaled floats)
+        target_size (tuple): (height, width) expected by the model
+
+    Returns:
+        np.ndarray: float32 array of shape (height, width, 3)
+    """
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = imageBytesToArray(source, target_size)
+
+    if isinstance(source, np.ndarray):
+        arr = source.astype(np.float32)
+        if arr.ndim == 2:
+            arr = np.stack([arr] * 3, axis=-1)
+        if arr.shape[-1] == 4:
+            arr = arr[..., :3]
+        if source.dtype == np.uint8 or arr.max() > 1.0:
+            arr = arr / 255.0
+        if tuple(arr.shape[:2]) != tuple(target_size):
+            arr = tf.image.resize(arr, target_size, method="bilinear").numpy()
+        return arr
+
+    img = image.load_img(source, target_size=target_size)
+    return image.img_to_array(img) / 255.0
+
+
+def aggregate_views(view_preds, aggregate="mean"):
+    """Combine per-view probabilities of shape (batch, views, classes)
+
+    ``"geometric"`` takes the renormalized geometric mean, which punishes
+    views that are confidently wrong more than the arithmetic mean does.
+
+    Returns:
+        tuple: (aggregated probabilities (batch, classes), variance across
+        views (batch, classes))
+    """
+    if aggregate not in TTA_AGGREGATES:
+        raise ValueError(f"aggregate must be one of {TTA_AGGREGATES}, got {aggregate!r}")
+    view_preds = np.asarray(view_preds, dtype=np.float64)
+    if view_preds.shape[-1] == 1:
+        view_preds = np.concatenate([1 - view_preds, view_preds], axis=-1)
+
+    if aggregate == "mean":
+        probs = view_preds.mean(axis=1)
+    else:
+        probs = np.exp(np.log(np.clip(view_preds, 1e-7, 1.0)).mean(axis=1))
+        probs = probs / probs.sum(axis=-1, keepdims=True)
+    return probs.astype(np.float32), view_preds.var(axis=1).astype(np.float32)
+
 
 class PredictionPipeline:
-    def __init__(self, filename):
+    def __init__(self, filename=None,
+                 model_path=os.path.join("model", "model.h5"),
+                 class_indices_path=os.path.join("model", "class_indices.json"),
+                 target_size=(224, 224),
+                 cache=None,
+                 max_forward_batch=64):
         self.filename = filename
+        self.model_path = model_path
+        self.class_indices_path = class_indices_path
+        self.target_size = tuple(target_size)
+        # Optional PredictionCache: results are reused for byte-identical
+        # images as long as the model on disk has not changed
+        self.cache = cache
+        # Upper bound on images per model call; TTA multiplies a batch by its
+        # number of views, so those are fed through in chunks of this size
+        self.max_forward_batch = max_forward_batch
+
+    @staticmethod
+    def warm_up(model_path=os.path.join("model", "model.h5")):
+        """Load the model into the shared registry ahead of the first request"""
+        model_registry.warm_up(model_path)
+
+    @staticmethod
+    def _decode_predictions(preds, idx_to_label):
+        results = []
+        for row in preds:
+            if row.shape[0] == 2:
+                predicted_index = int(np.argmax(row))
+                confidence = float(row[predicted_index])
+            else:
+                predicted_index = int(row[0] > 0.5)
+                confidence = float(row[0] if predicted_index == 1 else 1 - row[0])
+
+            results.append({
+                "class": idx_to_label.get(predicted_index, "Unknown"),
+                "confidence": round(confidence * 100, 2)  # return as percentage
+            })
+        return results
+
+    def _predict_arrays(self, model, arrays, tta=False, aggregate="mean"):
+        """Forward pass over a stacked batch, optionally with test-time augmentation
+
+        With ``tta`` the augmented views of each chunk of images are built in
+        one vectorized op and scored in one ``predict`` call, holding about
+        ``max_forward_batch`` views at a time.
+
+        Returns:
+            tuple: (probabilities, per-image TTA details or None)
+        """
+        if not tta:
+            return model.predict(arrays, batch_size=min(len(arrays), self.max_forward_batch), verbose=0), None
+
+        transforms = tta_transforms(*self.target_size)
+        num_views = int(transforms.shape[0])
+        # Build and score the views of a few images at a time, so the view
+        # tensor and each model call hold about max_forward_batch images
+        # (never fewer than one image's views)
+        step = max(1, self.max_forward_batch // num_views)
+        view_preds = []
+        for start in range(0, len(arrays), step):
+            views = tf.clip_by_value(tta_views(arrays[start:start + step], transforms), 0.0, 1.0).numpy()
+            view_preds.append(model.predict(views, batch_size=len(views), verbose=0))
+        view_preds = np.concatenate(view_preds).reshape(len(arrays), num_views, -1)
 
-    def predict(self):
-        # Load the trained model
-        model = load_model(os.path.join("model", "model.h5"), compile=False)
+        probs, variance = aggregate_views(view_preds, aggregate)
+        view_votes = np.argmax(view_preds, axis=-1) if view_preds.shape[-1] > 1 else (view_preds[..., 0] > 0.5)
+        predicted = np.argmax(probs, axis=-1)
+        details = [{
+            "views": num_views,
+            "aggregate": aggregate,
+            "variance": round(float(variance[i, predicted[i]]), 6),
+            "std": round(float(np.sqrt(variance[i, predicted[i]])) * 100, 2),
+            "agreement": round(float(np.mean(view_votes[i] == predicted[i])), 4)
+        } for i in range(len(arrays))]
+        return probs, details
 
-        # Load class index mapping
+    def predict_arrays(self, arrays):
+        """Score already decoded and resized images in one forward pass
+
+        Args:
+            arrays (list): float32 HxWx3 arrays scaled to [0, 1]
+
+        Returns:
+            list: one dict with ``class`` and ``confidence`` per array
+        """
+        model = model_registry.get_model(self.model_path)
+        idx_to_label = model_registry.get_class_labels(self.class_indices_path)
+        preds, _ = self._predict_arrays(model, np.stack(arrays).astype(np.float32))
+        return self._decode_predictions(preds, idx_to_label)
+
+    def predict(self, tta=False, aggregate="mean"):
+        # Resolve the trained model and class index mapping through the
+        # process-wide registry; both are only read from disk when they change
+        handle = model_registry.get(self.model_path)
+        idx_to_label = model_registry.get_class_labels(self.class_indices_path)
+
+        digest = self._safe_content_hash(self.filename) if self.cache is not None else None
+        kind = f"prediction_tta_{aggregate}" if tta else "prediction"
+        result = self.cache.get(digest, handle.version, kind) if digest else None
+        if result is None:
+            # Load and preprocess the image
+            test_image = load_image_array(self.filename, self.target_size)
+            test_image = np.expand_dims(test_image, axis=0)
+
+            # Predict
+            preds, details = self._predict_arrays(handle.model, test_image, tta, aggregate)
+            result = self._decode_predictions(preds, idx_to_label)[0]
+            if details:
+                result["tta"] = details[0]
+            if digest:
+                self.cache.put(digest, handle.version, kind, result)
+
+        result = dict(result)
+        print(f"Prediction: {result['class']} (Confidence: {result['confidence'] / 100:.2f})")
+
+        return result
+
+    @staticmethod
+    def _safe_content_hash(source):
         try:
-            with open(os.path.join("model", "class_indices.json"), "r") as f:
-                class_indices = json.load(f)
-            idx_to_label = {v: k for k, v in class_indices.items()}
-        except Exception as e:
-            print("Warning: Could not load class_indices.json. Using default.")
-            idx_to_label = {0: "Tumor", 1: "Normal"}
-
-        # Load and preprocess the image
-        test_image = image.load_img(self.filename, target_size=(224, 224))
-        test_image = image.img_to_array(test_image) / 255.0
-        test_image = np.expand_dims(test_image, axis=0)
-
-        # Predict
-        preds = model.predict(test_image)
-
-        if preds.shape[1] == 2:
-            predicted_index = np.argmax(preds, axis=1)[0]
-            confidence = float(preds[0][predicted_index])
-        else:
-            predicted_index = int(preds[0][0] > 0.5)
-            confidence = float(preds[0][0] if predicted_index == 1 else 1 - preds[0][0])
-
-        label = idx_to_label.get(predicted_index, "Unknown")
-
-        print(f"Prediction: {label} (Confidence: {confidence:.2f})")
-
-        return {
-            "class": label,
-            "confidence": round(confidence * 100, 2)  # return as percentage
-        }
+            return content_hash(source)
+        except OSError:
+            # Unreadable files are reported by the decode step
+            return None
+
+    def predict_batch(self, inputs, batch_size=32, num_workers=None, tta=False, aggregate="mean"):
+        """Score many images with one forward pass per batch
+
+        Images are decoded and resized on a thread pool, up to two batches
+        ahead of the one running through the model. A file that cannot be decoded is reported in
+        its own result instead of failing the whole call.
+
+        Args:
+            inputs (list): image paths, encoded image bytes and/or HxWxC arrays
+            batch_size (int, optional): images per forward pass. Defaults to 32.
+            num_workers (int, optional): decode threads. Defaults to the
+                ThreadPoolExecutor default.
+            tta (bool, optional): average over flipped, rotated and cropped
+                views of each image and report their spread under ``tta``.
+                Defaults to False.
+            aggregate (str, optional): ``"mean"`` or ``"geometric"``.
+
+        Returns:
+            list: one dict per input, in input order, with ``class`` and
+            ``confidence`` on success or ``error`` on failure
+        """
+        handle = model_registry.get(self.model_path)
+        model = handle.model
+        idx_to_label = model_registry.get_class_labels(self.class_indices_path)
+        inputs = list(inputs)
+        results = [None] * len(inputs)
+        kind = f"prediction_tta_{aggregate}" if tta else "prediction"
+
+        with ThreadPoolExecutor(max_workers=num_workers) as pool:
+            digests = [None] * len(inputs)
+            if self.cache is not None:
+                for i, digest in enumerate(pool.map(self._safe_content_hash, inputs)):
+                    digests[i] = digest
+                    cached = self.cache.get(digest, handle.version, kind) if digest else None
+                    if cached is not None:
+                        results[i] = dict(cached)
+
+            pending = [i for i in range(len(inputs)) if results[i] is None]
+            # At most two batches are decoded ahead of the model, so memory
+            # stays proportional to batch_size rather than to len(inputs)
+            futures = {}
+            submitted = 0
+
+            for start in range(0, len(pending), batch_size):
+                while submitted < min(len(pending), start + 2 * batch_size):
+                    i = pending[submitted]
+                    futures[i] = pool.submit(load_image_array, inputs[i], self.target_size)
+                    submitted += 1
+
+                indices, arrays = [], []
+                for i in pending[start:start + batch_size]:
+                    try:
+                        arrays.append(futures.pop(i).result())
+                        indices.append(i)
+                    except Exception as e:
+                        results[i] = {"error": f"{type(e).__name__}: {e}"}
+
+                if not arrays:
+                    continue
+
+                preds, details = self._predict_arrays(model, np.stack(arrays).astype(np.float32), tta, aggregate)
+                for j, (i, result) in enumerate(zip(indices, self._decode_predictions(preds, idx_to_label))):
+                    if details:
+                        result["tta"] = details[j]
+                    results[i] = result
+                    if digests[i]:
+                        self.cache.put(digests[i], handle.version, kind, dict(result))
+
+        for src, result in zip(inputs, results):
+            if isinstance(src, (str, os.PathLike)):
+                result["source"] = str(src)
+
+        return results
@@ -0,0 +1,35 @@
+from cnnClassifier.config.configuration import ConfigurationManager
+from cnnClassifier.components.model_quantization import ModelQuantization
+from cnnClassifier.components.model_evaluation_mlflow import Evaluation
+from cnnClassifier import logger
+
+
+
+STAGE_NAME = "Model quantization stage"
+
+
+class ModelQuantizationPipeline:
+    def __init__(self):
+        pass
+
+    def main(self):
+        config = ConfigurationManager()
+        quantization_config = config.get_quantization_config()
+        model_quantization = ModelQuantization(config=quantization_config)
+        model_quantization.export_dynamic_range()
+        model_quantization.export_int8()
+        model_quantization.evaluate_variants(Evaluation(config.get_evaluation_config()))
+
+
+
+
+if __name__ == '__main__':
+    try:
+        logger.info(f"*******************")
+        logger.info(f">>>>>> stage {STAGE_NAME} started <<<<<<")
+        obj = ModelQuantizationPipeline()
+        obj.main()
+        logger.info(f">>>>>> stage {STAGE_NAME} completed <<<<<<\n\nx==========x")
+    except Exception as e:
+        logger.exception(e)
+        raise e
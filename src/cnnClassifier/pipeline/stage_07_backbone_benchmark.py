@@ -0,0 +1,32 @@
+from cnnClassifier.config.configuration import ConfigurationManager
+from cnnClassifier.components.backbone_benchmark import BackboneBenchmark
+from cnnClassifier import logger
+
+
+
+STAGE_NAME = "Backbone benchmark stage"
+
+
+class BackboneBenchmarkPipeline:
+    def __init__(self):
+        pass
+
+    def main(self):
+        config = ConfigurationManager()
+        backbone_benchmark_config = config.get_backbone_benchmark_config()
+        backbone_benchmark = BackboneBenchmark(config=backbone_benchmark_config)
+        backbone_benchmark.run()
+
+
+
+
+if __name__ == '__main__':
+    try:
+        logger.info(f"*******************")
+        logger.info(f">>>>>> stage {STAGE_NAME} started <<<<<<")
+        obj = BackboneBenchmarkPipeline()
+        obj.main()
+        logger.info(f">>>>>> stage {STAGE_NAME} completed <<<<<<\n\nx==========x")
+    except Exception as e:
+        logger.exception(e)
+        raise e
@@ -0,0 +1,30 @@
+from cnnClassifier.config.configuration import ConfigurationManager
+from cnnClassifier.components.dataset_split import DataSplit
+from cnnClassifier import logger
+
+
+STAGE_NAME = "Data split stage"
+
+
+class DataSplitPipeline:
+    def __init__(self):
+        pass
+
+    def main(self):
+        config = ConfigurationManager()
+        data_split_config = config.get_data_split_config()
+        data_split = DataSplit(config=data_split_config)
+        data_split.assign()
+
+
+
+if __name__ == '__main__':
+    try:
+        logger.info(f"*******************")
+        logger.info(f">>>>>> stage {STAGE_NAME} started <<<<<<")
+        obj = DataSplitPipeline()
+        obj.main()
+        logger.info(f">>>>>> stage {STAGE_NAME} completed <<<<<<\n\nx==========x")
+    except Exception as e:
+        logger.exception(e)
+        raise e
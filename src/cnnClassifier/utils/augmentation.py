@@ -0,0 +1,138 @@
+import math
+import tensorflow as tf
+
+
+def affine_transforms(height, width, angles=None, shears=None, tx=None, ty=None,
+                      zx=None, zy=None, flips=None, batch_size=None):
+    """Batch of projective transforms for ``ImageProjectiveTransformV3``
+
+    Each argument is a length-``batch_size`` tensor (or None for identity)
+    and follows ``ImageDataGenerator.apply_affine_transform``: angles and
+    shears in radians, shifts in pixels, zooms as scale factors and flips
+    as booleans. Transforms are composed about the image centre and map
+    output pixels back to input pixels.
+
+    Returns:
+        tf.Tensor: float32 tensor of shape (batch_size, 8)
+    """
+    given = [t for t in (angles, shears, tx, ty, zx, zy, flips) if t is not None]
+    if batch_size is None:
+        batch_size = tf.shape(given[0])[0]
+
+    zeros = tf.zeros([batch_size], tf.float32)
+    ones = tf.ones([batch_size], tf.float32)
+
+    def _or(value, default):
+        return default if value is None else tf.cast(value, tf.float32)
+
+    angles, shears = _or(angles, zeros), _or(shears, zeros)
+    tx, ty = _or(tx, zeros), _or(ty, zeros)
+    zx, zy = _or(zx, ones), _or(zy, ones)
+    flip_sign = ones - 2.0 * _or(flips, zeros)
+
+    cos_a, sin_a = tf.cos(angles), tf.sin(angles)
+    sin_s, cos_s = tf.sin(shears), tf.cos(shears)
+
+    # M = R @ S @ Z, written out so every entry is a (batch,) vector
+    m00 = cos_a * zx
+    m01 = (-cos_a * sin_s - sin_a * cos_s) * zy
+    m10 = sin_a * zx
+    m11 = (-sin_a * sin_s + cos_a * cos_s) * zy
+
+    # Horizontal flip is applied after the affine, i.e. first on output coords
+    m00 = m00 * flip_sign
+    m10 = m10 * flip_sign
+
+    cx, cy = (width - 1) / 2.0, (height - 1) / 2.0
+    a2 = cx - m00 * cx - m01 * cy + tx
+    b2 = cy - m10 * cx - m11 * cy + ty
+
+    return tf.stack([m00, m01, a2, m10, m11, b2, zeros, zeros], axis=1)
+
+
+def random_affine_transforms(batch_size, height, width, rotation_range=0.0, width_shift_range=0.0,
+                             height_shift_range=0.0, shear_range=0.0, zoom_range=0.0,
+                             horizontal_flip=False, seed=None):
+    """Random transforms with ``ImageDataGenerator`` semantics
+
+    ``rotation_range`` and ``shear_range`` are in degrees, shift ranges are
+    fractions of the image size and ``zoom_range`` draws each axis
+    independently from [1 - zoom_range, 1 + zoom_range].
+    """
+    def uniform(limit, low=None, high=None):
+        low = -limit if low is None else low
+        high = limit if high is None else high
+        return tf.random.uniform([batch_size], low, high, seed=seed)
+
+    return affine_transforms(
+        height, width,
+        angles=uniform(math.radians(rotation_range)),
+        shears=uniform(math.radians(shear_range)),
+        tx=uniform(width_shift_range) * width,
+        ty=uniform(height_shift_range) * height,
+        zx=uniform(None, 1.0 - zoom_range, 1.0 + zoom_range),
+        zy=uniform(None, 1.0 - zoom_range, 1.0 + zoom_range),
+        flips=uniform(None, 0.0, 1.0) < 0.5 if horizontal_flip else None,
+        batch_size=batch_size
+    )
+
+
+def apply_affine(images, transforms, fill_mode="NEAREST", interpolation="BILINEAR"):
+    """Warp a (batch, height, width, channels) float tensor in one op"""
+    images = tf.convert_to_tensor(images, tf.float32)
+    return tf.raw_ops.ImageProjectiveTransformV3(
+        images=images,
+        transforms=tf.cast(transforms, tf.float32),
+        output_shape=tf.shape(images)[1:3],
+        fill_value=0.0,
+        interpolation=interpolation,
+        fill_mode=fill_mode
+    )
+
+
+def random_augment(images, **augmentation_kwargs):
+    """Vectorized equivalent of ``ImageDataGenerator(**augmentation_kwargs)``"""
+    shape = tf.shape(images)
+    transforms = random_affine_transforms(
+        shape[0],
+        tf.cast(shape[1], tf.float32),
+        tf.cast(shape[2], tf.float32),
+        **augmentation_kwargs
+    )
+    return apply_affine(images, transforms)
+
+
+def tta_transforms(height, width, rotations=(-10.0, 0.0, 10.0), flips=(False, True), zooms=(1.0, 0.9)):
+    """Deterministic grid of test-time augmentation transforms
+
+    Every combination of rotation (degrees), horizontal flip and zoom is one
+    view; a zoom below 1 crops the centre of the image. The identity view
+    is always first.
+
+    Returns:
+        tf.Tensor: float32 tensor of shape (num_views, 8)
+    """
+    grid = [(r, f, z) for z in zooms for f in flips for r in rotations]
+    grid.sort(key=lambda v: (v[0] != 0.0, bool(v[1]), v[2] != 1.0))
+    angles, flip_flags, zoom_factors = zip(*grid)
+    return affine_transforms(
+        float(height), float(width),
+        angles=tf.constant([math.radians(a) for a in angles], tf.float32),
+        zx=tf.constant(zoom_factors, tf.float32),
+        zy=tf.constant(zoom_factors, tf.float32),
+        flips=tf.constant(flip_flags, tf.bool),
+        batch_size=len(grid)
+    )
+
+
+def tta_views(images, transforms):
+    """All views of all images as one (batch * views, H, W, C) tensor
+
+    Views of the same image are contiguous, so the result reshapes to
+    (batch, views, ...).
+    """
+    images = tf.convert_to_tensor(images, tf.float32)
+    num_views = tf.shape(transforms)[0]
+    repeated = tf.repeat(images, num_views, axis=0)
+    tiled = tf.tile(transforms, [tf.shape(images)[0], 1])
+    return apply_affine(repeated, tiled, fill_mode="REFLECT")
@@ -9,6 +9,9 @@ from box import ConfigBox
 from pathlib import Path
 from typing import Any
 import base64
+import io
+import numpy as np
+from PIL import Image
 
 @ensure_annotations
 def read_yaml(path_to_yaml: Path) -> ConfigBox:
@@ -122,4 +125,104 @@ def decodeImage(imgstring, fileName):
 
 def encodeImageIntoBase64(croppedImagePath):
     with open(croppedImagePath, "rb") as f:
-        return base64.b64encode(f.read())
\ No newline at end of file
+        return base64.b64encode(f.read())
+
+
+def _strip_data_url(imgstring):
+    """drop a ``data:image/...;base64,`` prefix if the client sent one"""
+    head = imgstring[:64]
+    sep = "," if isinstance(head, str) else b","
+    if head[:5] in ("data:", b"data:") and sep in head:
+        return imgstring[imgstring.index(sep) + 1:]
+    return imgstring
+
+def imageBytesToArray(imgdata, target_size=None, interpolation="nearest"):
+    """decode encoded image bytes straight into a uint8 RGB array
+
+    Args:
+        imgdata (bytes | bytearray | memoryview | io.BytesIO): encoded image
+        target_size (tuple, optional): (height, width) to resize to
+        interpolation (str, optional): PIL resampling filter name, "nearest"
+            matches ``keras.preprocessing.image.load_img``
+
+    Returns:
+        np.ndarray: uint8 array of shape (height, width, 3)
+    """
+    buffer = imgdata if isinstance(imgdata, io.BytesIO) else io.BytesIO(imgdata)
+    with Image.open(buffer) as img:
+        img = img.convert("RGB")
+        if target_size is not None:
+            height, width = target_size
+            if img.size != (width, height):
+                resample = getattr(Image, interpolation.upper())
+                img = img.resize((width, height), resample)
+        return np.asarray(img, dtype=np.uint8)
+
+def iterDecodeBase64(chunks):
+    """incrementally base64-decode an iterable of str/bytes chunks
+
+    Chunks may be split anywhere; undecodable tails are carried over to the
+    next chunk so only one chunk is ever held at a time.
+
+    Yields:
+        bytes: decoded bytes
+    """
+    carry = b""
+    first = True
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode("ascii")
+        if first:
+            chunk = _strip_data_url(chunk)
+            first = False
+        chunk = carry + b"".join(chunk.split())
+        usable = len(chunk) - len(chunk) % 4
+        carry = chunk[usable:]
+        if usable:
+            yield base64.b64decode(chunk[:usable])
+    if carry:
+        yield base64.b64decode(carry + b"=" * (-len(carry) % 4))
+
+def _iter_stream(stream, chunk_size):
+    if hasattr(stream, "read"):
+        return iter(lambda: stream.read(chunk_size), stream.read(0))
+    return iter(stream)
+
+def decodeImageIntoArray(imgstring, target_size=None):
+    """decode a base64 image straight into a uint8 array, without touching disk"""
+    imgdata = base64.b64decode(_strip_data_url(imgstring))
+    return imageBytesToArray(imgdata, target_size)
+
+def decodeImageStreamIntoArray(stream, target_size=None, is_base64=True, chunk_size=1 << 16):
+    """decode a large upload chunk by chunk into a uint8 array
+
+    Args:
+        stream: file-like object with ``read`` or an iterable of chunks
+        target_size (tuple, optional): (height, width) to resize to
+        is_base64 (bool, optional): whether the stream is base64 text rather
+            than raw image bytes. Defaults to True.
+        chunk_size (int, optional): bytes read per chunk. Defaults to 64 KB.
+
+    Returns:
+        np.ndarray: uint8 array of shape (height, width, 3)
+    """
+    chunks = _iter_stream(stream, chunk_size)
+    if is_base64:
+        chunks = iterDecodeBase64(chunks)
+
+    buffer = io.BytesIO()
+    for chunk in chunks:
+        buffer.write(chunk)
+    buffer.seek(0)
+    return imageBytesToArray(buffer, target_size)
+
+def encodeImageIntoBase64Stream(croppedImagePath, chunk_size=3 << 16):
+    """yield the base64 encoding of a file in chunks
+
+    ``chunk_size`` is rounded down to a multiple of 3 so the concatenated
+    chunks equal ``encodeImageIntoBase64`` of the same file.
+    """
+    chunk_size = max(3, chunk_size - chunk_size % 3)
+    with open(croppedImagePath, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            yield base64.b64encode(chunk)
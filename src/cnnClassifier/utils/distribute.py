@@ -0,0 +1,137 @@
+import os
+import sys
+import json
+import time
+import socket
+import tempfile
+import subprocess
+from pathlib import Path
+from cnnClassifier import logger
+
+
+DISTRIBUTION_STRATEGIES = ("auto", "none", "multi_worker")
+COMMUNICATION_IMPLEMENTATIONS = ("auto", "ring", "nccl")
+
+
+def tf_config() -> dict:
+    """Parsed ``TF_CONFIG`` environment variable, or an empty dict"""
+    return json.loads(os.environ.get("TF_CONFIG") or "{}")
+
+
+def num_workers() -> int:
+    cluster = tf_config().get("cluster", {})
+    return len(cluster.get("chief", [])) + len(cluster.get("worker", []))
+
+
+def task_id() -> str:
+    task = tf_config().get("task", {})
+    return f"{task.get('type', 'worker')}_{task.get('index', 0)}"
+
+
+def is_chief() -> bool:
+    """True on the task that owns checkpoints and the exported model: the
+    ``chief`` if the cluster has one, else worker 0, else a lone process
+    """
+    config = tf_config()
+    task = config.get("task", {})
+    if not task:
+        return True
+    if "chief" in config.get("cluster", {}):
+        return task.get("type") == "chief"
+    return task.get("type") == "worker" and int(task.get("index", 0)) == 0
+
+
+def uses_multi_worker(requested: str) -> bool:
+    """True if ``resolve_strategy(requested)`` builds a ``MultiWorkerMirroredStrategy``"""
+    return requested == "multi_worker" or (requested == "auto" and num_workers() > 1)
+
+
+def resolve_strategy(requested: str, communication: str = "auto"):
+    """``MultiWorkerMirroredStrategy`` built from ``TF_CONFIG``, or None to
+    train in a single process
+
+    ``auto`` distributes only when ``TF_CONFIG`` describes more than one
+    worker. Must be called before any other TensorFlow op runs.
+    """
+    if requested not in DISTRIBUTION_STRATEGIES:
+        raise ValueError(f"DISTRIBUTION must be one of {DISTRIBUTION_STRATEGIES}, got {requested!r}")
+    if communication not in COMMUNICATION_IMPLEMENTATIONS:
+        raise ValueError(f"COMMUNICATION must be one of {COMMUNICATION_IMPLEMENTATIONS}, got {communication!r}")
+    if not uses_multi_worker(requested):
+        return None
+    if requested == "multi_worker" and not tf_config():
+        logger.warning("DISTRIBUTION is multi_worker but TF_CONFIG is not set, running as a single worker")
+
+    import tensorflow as tf
+
+    implementation = {
+        "auto": tf.distribute.experimental.CommunicationImplementation.AUTO,
+        "ring": tf.distribute.experimental.CommunicationImplementation.RING,
+        "nccl": tf.distribute.experimental.CommunicationImplementation.NCCL
+    }[communication]
+    strategy = tf.distribute.MultiWorkerMirroredStrategy(
+        communication_options=tf.distribute.experimental.CommunicationOptions(implementation=implementation)
+    )
+    logger.info(f"{task_id()}: training on {strategy.num_replicas_in_sync} replica(s) across {max(num_workers(), 1)} worker(s)")
+    return strategy
+
+
+def worker_save_path(path: Path) -> Path:
+    """Where this task writes ``path``: the real location on the chief, a
+    throwaway directory on every other worker
+    """
+    path = Path(path)
+    if is_chief():
+        return path
+    return Path(tempfile.mkdtemp(prefix=f"{task_id()}_")) / path.name
+
+
+def _free_ports(count: int) -> list:
+    sockets = []
+    for _ in range(count):
+        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        s.bind(("localhost", 0))
+        sockets.append(s)
+    ports = [s.getsockname()[1] for s in sockets]
+    for s in sockets:
+        s.close()
+    return ports
+
+
+def launch_local_cluster(workers: int, command: list, poll_interval: float = 1.0) -> int:
+    """Run ``command`` once per worker on this machine, each with its own
+    ``TF_CONFIG``, and wait for all of them
+
+    If any worker fails the others are stopped, since the collective ops
+    would otherwise wait for it forever.
+
+    Returns:
+        int: 0 if every worker succeeded, else the first failing exit code
+    """
+    cluster = {"worker": [f"localhost:{port}" for port in _free_ports(workers)]}
+    processes = []
+    for index in range(workers):
+        env = dict(os.environ, TF_CONFIG=json.dumps({"cluster": cluster, "task": {"type": "worker", "index": index}}))
+        processes.append(subprocess.Popen(command, env=env))
+    logger.info(f"launched {workers} local worker(s): {' '.join(command)}")
+
+    try:
+        while True:
+            codes = [p.poll() for p in processes]
+            failed = [code for code in codes if code not in (None, 0)]
+            if failed:
+                logger.error(f"a worker exited with code {failed[0]}, stopping the others")
+                return failed[0]
+            if all(code == 0 for code in codes):
+                return 0
+            time.sleep(poll_interval)
+    finally:
+        for p in processes:
+            if p.poll() is None:
+                p.terminate()
+        for p in processes:
+            p.wait()
+
+
+def default_training_command() -> list:
+    return [sys.executable, str(Path("src/cnnClassifier/pipeline/stage_03_model_training.py"))]
@@ -0,0 +1,279 @@
+import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, Optional, Sequence, Union
+
+import numpy as np
+import pandas as pd
+
+POSITIVE_LABELS = ("tumor", "1", "positive", "yes")
+COUNT_COLUMNS = ["tp", "fp", "tn", "fn"]
+GAP_METRICS = ["accuracy", "recall_TPR", "FPR"]
+METRICS = ["accuracy", "precision", "recall_TPR", "FPR", "f1"]
+GROUP_SEPARATOR = " × "
+
+
+def _label_to_binary(value) -> int:
+    if isinstance(value, str):
+        return 1 if value.strip().lower() in POSITIVE_LABELS else 0
+    return int(value)
+
+
+def to_binary_labels(values: pd.Series) -> np.ndarray:
+    """Map a label column to 0/1 without a Python call per row
+
+    Strings count as positive when they are one of ``POSITIVE_LABELS``
+    (case-insensitive), anything else is cast with ``int``. Only the
+    distinct values go through that rule; rows are mapped by their factor
+    code. Missing values become -1.
+
+    Raises:
+        ValueError: if a non-string label is neither 0 nor 1
+    """
+    codes, uniques = pd.factorize(values, use_na_sentinel=True)
+    mapping = np.fromiter((_label_to_binary(u) for u in uniques), dtype=np.int64, count=len(uniques))
+    invalid = (mapping != 0) & (mapping != 1)
+    if invalid.any():
+        raise ValueError(
+            f"column {values.name!r} has labels other than 0/1: {list(uniques[invalid][:5])}; "
+            f"use 0/1 or one of {POSITIVE_LABELS} for the positive class"
+        )
+    return np.where(codes >= 0, mapping[codes], -1).astype(np.int8)
+
+
+def _as_list(group_cols: Union[str, Sequence[str]]) -> list:
+    return [group_cols] if isinstance(group_cols, str) else list(group_cols)
+
+
+def confusion_counts(df: pd.DataFrame, y_true_col: str, y_pred_col: str,
+                     group_cols: Union[str, Sequence[str]]) -> pd.DataFrame:
+    """TP/FP/TN/FN per group in a single groupby
+
+    Several ``group_cols`` give intersectional groups (one row per observed
+    combination). Rows whose labels are missing are skipped.
+
+    Returns:
+        pd.DataFrame: indexed by the group columns, with ``tp``, ``fp``,
+        ``tn`` and ``fn`` columns
+    """
+    group_cols = _as_list(group_cols)
+    y_true = to_binary_labels(df[y_true_col])
+    y_pred = to_binary_labels(df[y_pred_col])
+    valid = (y_true >= 0) & (y_pred >= 0)
+
+    # 0 = TN, 1 = FP, 2 = FN, 3 = TP
+    cell = pd.Series((2 * y_true + y_pred)[valid], name="cell")
+    keys = [df[col].to_numpy()[valid] for col in group_cols]
+    counts = (
+        cell.groupby(keys, dropna=False, sort=False)
+        .value_counts()
+        .unstack("cell", fill_value=0)
+        .reindex(columns=[3, 1, 0, 2], fill_value=0)
+    )
+    counts.columns = COUNT_COLUMNS
+    counts.index.names = group_cols
+    return counts.astype(np.int64)
+
+
+def combine_counts(parts: Iterable[pd.DataFrame]) -> pd.DataFrame:
+    """Sum per-chunk confusion counts into one table"""
+    parts = list(parts)
+    if not parts:
+        return pd.DataFrame(columns=COUNT_COLUMNS, dtype=np.int64)
+    combined = pd.concat(parts)
+    return combined.groupby(level=list(range(combined.index.nlevels)), dropna=False, sort=False).sum()
+
+
+def read_confusion_counts(source, y_true_col: str, y_pred_col: str, group_cols: Union[str, Sequence[str]],
+                          chunksize: int = 500_000) -> pd.DataFrame:
+    """Confusion counts per group for a CSV or Parquet file, read
+    ``chunksize`` rows at a time
+
+    Only the label and group columns are parsed, and each chunk is reduced
+    to its counts before the next one is read, so memory stays bounded by
+    the chunk size and the number of groups.
+    """
+    group_cols = _as_list(group_cols)
+    usecols = list(dict.fromkeys([y_true_col, y_pred_col] + group_cols))
+    name = str(getattr(source, "name", source))
+    if name.endswith(".parquet"):
+        import pyarrow.parquet as pq
+        batches = pq.ParquetFile(source).iter_batches(batch_size=chunksize, columns=usecols)
+        reader = (batch.to_pandas() for batch in batches)
+    else:
+        reader = pd.read_csv(source, usecols=usecols, chunksize=chunksize)
+    return combine_counts(confusion_counts(chunk, y_true_col, y_pred_col, group_cols) for chunk in reader)
+
+
+def _rates(tp, fp, tn, fn) -> dict:
+    """Metrics from count arrays of any (broadcastable) shape"""
+    n = tp + fp + tn + fn
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return {
+            "accuracy": np.where(n > 0, (tp + tn) / n, 0.0),
+            "precision": np.where(tp + fp > 0, tp / (tp + fp), 0.0),
+            "recall_TPR": np.where(tp + fn > 0, tp / (tp + fn), 0.0),
+            "FPR": fp / (fp + tn + 1e-9),
+            "f1": np.where(2 * tp + fp + fn > 0, 2 * tp / (2 * tp + fp + fn), 0.0),
+        }
+
+
+def metrics_from_counts(counts: pd.DataFrame) -> pd.DataFrame:
+    """Per-group metrics computed column-wise from confusion counts
+
+    Matches sklearn's accuracy/precision/recall/f1 with ``zero_division=0``.
+    """
+    tp, fp, tn, fn = (counts[c].to_numpy(dtype=np.float64) for c in COUNT_COLUMNS)
+    metrics = pd.DataFrame({"n": (tp + fp + tn + fn).astype(np.int64), **_rates(tp, fp, tn, fn)}, index=counts.index)
+
+    metrics = metrics.reset_index()
+    group_cols = list(counts.index.names)
+    if len(group_cols) > 1:
+        metrics.insert(0, "group", metrics[group_cols].astype(str).agg(GROUP_SEPARATOR.join, axis=1))
+    return metrics
+
+
+def fairness_gaps(metrics: pd.DataFrame, columns: Sequence[str] = GAP_METRICS) -> dict:
+    """Max - min of each metric across groups"""
+    return {col: float(metrics[col].max() - metrics[col].min()) for col in columns}
+
+
+def _metric_stack(cells: np.ndarray) -> np.ndarray:
+    """(..., 4) count arrays in ``COUNT_COLUMNS`` order -> (..., len(METRICS))"""
+    cells = cells.astype(np.float64)
+    rates = _rates(cells[..., 0], cells[..., 1], cells[..., 2], cells[..., 3])
+    return np.stack([rates[m] for m in METRICS], axis=-1)
+
+
+def _bootstrap_chunk(cells: np.ndarray, size: int, seed: np.random.SeedSequence) -> np.ndarray:
+    """Per-group metrics for ``size`` bootstrap resamples
+
+    Resampling a group's rows with replacement only changes its confusion
+    counts, which are multinomial in the group size and observed cell
+    frequencies; one draw per group replaces an n-row resample.
+
+    Returns:
+        np.ndarray: (size, groups, len(METRICS))
+    """
+    rng = np.random.default_rng(seed)
+    n = cells.sum(axis=1)
+    pvals = cells / np.maximum(n, 1)[:, None]
+    resampled = np.stack([rng.multinomial(n_g, p_g, size=size) for n_g, p_g in zip(n, pvals)], axis=1)
+    return _metric_stack(resampled)
+
+
+def _permutation_chunk(cells: np.ndarray, size: int, seed: np.random.SeedSequence) -> np.ndarray:
+    """Max - min metric gaps for ``size`` random reassignments of group labels
+
+    Shuffling group labels over all rows deals each group a sample without
+    replacement from the pooled confusion cells: a multivariate
+    hypergeometric draw, taken as a chain of univariate hypergeometric draws
+    (group by group, cell by cell), each vectorized over the resamples.
+
+    Returns:
+        np.ndarray: (size, len(METRICS))
+    """
+    rng = np.random.default_rng(seed)
+    pool = np.broadcast_to(cells.sum(axis=0), (size, cells.shape[1])).astype(np.int64)
+    resampled = np.zeros((size,) + cells.shape, dtype=np.int64)
+    for g, n_g in enumerate(cells.sum(axis=1)[:-1]):
+        remaining = np.full(size, n_g, dtype=np.int64)
+        left = pool.sum(axis=1)
+        for k in range(cells.shape[1] - 1):
+            left = left - pool[:, k]
+            draw = rng.hypergeometric(pool[:, k], left, remaining) if n_g else np.zeros(size, np.int64)
+            resampled[:, g, k] = draw
+            remaining = remaining - draw
+        resampled[:, g, -1] = remaining
+        pool = pool - resampled[:, g]
+    resampled[:, -1] = pool
+
+    metrics = _metric_stack(resampled)
+    return metrics.max(axis=1) - metrics.min(axis=1)
+
+
+def _run_chunks(fn, cells: np.ndarray, total: int, seed: Optional[int], n_jobs: Optional[int],
+                chunk_size: int) -> np.ndarray:
+    """Run ``fn`` over fixed-size chunks of resamples, in parallel if asked
+
+    Every chunk gets its own child of ``SeedSequence(seed)``, and chunks are
+    concatenated in order, so a fixed seed gives the same result whatever
+    the number of workers.
+    """
+    sizes = [min(chunk_size, total - start) for start in range(0, total, chunk_size)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    n_jobs = n_jobs or os.cpu_count() or 1
+
+    if n_jobs == 1 or len(sizes) == 1:
+        return np.concatenate([fn(cells, size, s) for size, s in zip(sizes, seeds)])
+    # Spawned, not forked: the callers (Streamlit, TensorFlow) are multithreaded
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=min(n_jobs, len(sizes)), mp_context=context) as pool:
+        return np.concatenate(list(pool.map(fn, [cells] * len(sizes), sizes, seeds)))
+
+
+def _cells(counts: pd.DataFrame) -> np.ndarray:
+    return counts[COUNT_COLUMNS].to_numpy(dtype=np.int64)
+
+
+def bootstrap_intervals(counts: pd.DataFrame, n_resamples: int = 2000, confidence: float = 0.95,
+                        seed: Optional[int] = None, n_jobs: Optional[int] = None, chunk_size: int = 1000):
+    """Percentile bootstrap intervals for per-group metrics and their gaps
+
+    Groups are resampled independently (stratified bootstrap), so group
+    sizes stay fixed.
+
+    Args:
+        counts (pd.DataFrame): output of ``confusion_counts``
+        n_resamples (int): bootstrap resamples
+        confidence (float): interval coverage
+        seed (int, optional): makes the result reproducible
+        n_jobs (int, optional): worker processes; defaults to all CPUs
+        chunk_size (int): resamples per task
+
+    Returns:
+        tuple: (per-group DataFrame with ``<metric>_low``/``<metric>_high``
+        columns, DataFrame of gap estimates and intervals by metric)
+    """
+    cells = _cells(counts)
+    draws = _run_chunks(_bootstrap_chunk, cells, n_resamples, seed, n_jobs, chunk_size)
+    tail = (1 - confidence) / 2 * 100
+    low, high = np.percentile(draws, [tail, 100 - tail], axis=0)
+
+    groups = metrics_from_counts(counts)
+    for j, metric in enumerate(METRICS):
+        groups[f"{metric}_low"] = low[:, j]
+        groups[f"{metric}_high"] = high[:, j]
+
+    observed = _metric_stack(cells)
+    gap_draws = draws.max(axis=1) - draws.min(axis=1)
+    gap_low, gap_high = np.percentile(gap_draws, [tail, 100 - tail], axis=0)
+    gaps = pd.DataFrame({
+        "gap": observed.max(axis=0) - observed.min(axis=0),
+        "low": gap_low,
+        "high": gap_high,
+    }, index=pd.Index(METRICS, name="metric"))
+    return groups, gaps
+
+
+def permutation_test(counts: pd.DataFrame, n_permutations: int = 2000, seed: Optional[int] = None,
+                     n_jobs: Optional[int] = None, chunk_size: int = 1000) -> pd.DataFrame:
+    """Permutation p-values for the max - min gap of each metric
+
+    The null hypothesis is that outcomes do not depend on the group. The
+    p-value is the share of label permutations whose gap is at least the
+    observed one, with the usual +1 correction.
+
+    Returns:
+        pd.DataFrame: ``gap``, null ``null_mean`` and ``p_value`` by metric
+    """
+    cells = _cells(counts)
+    null_gaps = _run_chunks(_permutation_chunk, cells, n_permutations, seed, n_jobs, chunk_size)
+    observed = _metric_stack(cells)
+    gap = observed.max(axis=0) - observed.min(axis=0)
+    exceed = (null_gaps >= gap - 1e-12).sum(axis=0)
+    return pd.DataFrame({
+        "gap": gap,
+        "null_mean": null_gaps.mean(axis=0),
+        "p_value": (exceed + 1) / (n_permutations + 1),
+    }, index=pd.Index(METRICS, name="metric"))
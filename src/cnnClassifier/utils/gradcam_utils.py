@@ -1,4 +1,7 @@
 # utils/gradcam_utils.py
+import io
+import weakref
+from collections import OrderedDict
 import numpy as np
 import tensorflow as tf
 from tensorflow.keras.models import Model
@@ -16,92 +19,332 @@ def try_get_last_conv_layer_name(model):
             continue
     return None
 
-def make_gradcam_heatmap(img_array, model, last_conv_layer_name):
-    grad_model = Model(
-        inputs=model.inputs,
-        outputs=[model.get_layer(last_conv_layer_name).output, model.output],
-    )
+class GradCamExplainer:
+    """Grad-CAM for one model, built once and reused across requests.
 
-    with tf.GradientTape() as tape:
-        conv_outputs, predictions = grad_model(img_array)
-        if predictions.shape[-1] == 1:
-            pred_index = tf.cast(predictions[0, 0] > 0.5, tf.int64)
-        else:
-            pred_index = tf.argmax(predictions[0])
-        class_channel = predictions[:, pred_index]
+    The gradient sub-model is built on first use and wrapped in a
+    ``tf.function`` with a fixed ``[None, H, W, C]`` input signature, so
+    each call is a single traced forward/backward pass that returns the
+    predictions together with one heatmap per image.
+
+    Only a weak reference to ``model`` is kept, so a cached explainer never
+    keeps a replaced model alive.
+    """
+
+    def __init__(self, model, last_conv_layer_name=None):
+        self._model_ref = weakref.ref(model)
+        self.last_conv_layer_name = last_conv_layer_name or try_get_last_conv_layer_name(model)
+        if self.last_conv_layer_name is None:
+            raise ValueError("model has no 4D feature map to explain with Grad-CAM")
+
+        self.grad_model = None
+        signature = [tf.TensorSpec([None] + list(model.input_shape[1:]), tf.float32)]
+        self._explain = tf.function(self._explain_batch, input_signature=signature)
+
+    @property
+    def model(self):
+        model = self._model_ref()
+        if model is None:
+            raise ReferenceError("the model this explainer was built for has been released")
+        return model
+
+    def _build_grad_model(self):
+        model = self.model
+        self.grad_model = Model(
+            inputs=model.inputs,
+            outputs=[model.get_layer(self.last_conv_layer_name).output, model.output],
+        )
+
+    def _explain_batch(self, images):
+        with tf.GradientTape() as tape:
+            conv_outputs, predictions = self.grad_model(images, training=False)
+            if predictions.shape[-1] == 1:
+                pred_index = tf.cast(predictions[:, 0] > 0.5, tf.int64)
+                class_channel = tf.where(pred_index == 1, predictions[:, 0], 1.0 - predictions[:, 0])
+            else:
+                pred_index = tf.argmax(predictions, axis=-1)
+                class_channel = tf.gather(predictions, pred_index, axis=1, batch_dims=1)
+
+        # Samples do not interact in inference mode, so the gradient of the
+        # summed class scores gives every image its own gradients
+        grads = tape.gradient(class_channel, conv_outputs)
+        pooled_grads = tf.reduce_mean(grads, axis=(1, 2))
+        heatmaps = tf.nn.relu(tf.einsum("bhwc,bc->bhw", conv_outputs, pooled_grads))
+        heatmaps /= tf.reduce_max(heatmaps, axis=(1, 2), keepdims=True) + 1e-8
+        return predictions, heatmaps, pred_index
+
+    def explain(self, images):
+        """Predictions and Grad-CAM heatmaps for a batch in one pass
+
+        Args:
+            images: float array of shape (batch, H, W, C)
+
+        Returns:
+            tuple: (predictions, heatmaps of shape (batch, h, w), predicted indices)
+        """
+        if self.grad_model is None:
+            self._build_grad_model()
+        predictions, heatmaps, pred_index = self._explain(tf.convert_to_tensor(images, dtype=tf.float32))
+        return predictions.numpy(), heatmaps.numpy().astype(np.float32), pred_index.numpy().astype(int)
 
-    grads = tape.gradient(class_channel, conv_outputs)
-    pooled_grads = tf.reduce_mean(grads, axis=(0, 1, 2))
-    conv_outputs = conv_outputs[0]
-    heatmap = tf.reduce_sum(tf.multiply(pooled_grads, conv_outputs), axis=-1)
 
-    heatmap = np.maximum(heatmap.numpy(), 0)
-    heatmap /= (np.max(heatmap) + 1e-8)
-    return heatmap.astype(np.float32), int(pred_index.numpy())
+MAX_EXPLAINED_MODELS = 2
+_EXPLAINERS = OrderedDict()
+
+def get_gradcam_explainer(model, last_conv_layer_name=None):
+    """Cached ``GradCamExplainer`` for ``model``
+
+    Entries go away once their model is garbage collected, and only the
+    ``MAX_EXPLAINED_MODELS`` most recently used models are kept, so models
+    replaced by a registry reload never accumulate.
+    """
+    for key in [k for k, (ref, _) in _EXPLAINERS.items() if ref() is None]:
+        del _EXPLAINERS[key]
+
+    entry = _EXPLAINERS.get(id(model))
+    if entry is None or entry[0]() is not model:
+        entry = (weakref.ref(model), {})
+        _EXPLAINERS[id(model)] = entry
+    _EXPLAINERS.move_to_end(id(model))
+    while len(_EXPLAINERS) > MAX_EXPLAINED_MODELS:
+        _EXPLAINERS.popitem(last=False)
+
+    per_model = entry[1]
+    if last_conv_layer_name not in per_model:
+        per_model[last_conv_layer_name] = GradCamExplainer(model, last_conv_layer_name)
+    return per_model[last_conv_layer_name]
+
+def make_gradcam_heatmap(img_array, model, last_conv_layer_name):
+    _, heatmaps, pred_index = get_gradcam_explainer(model, last_conv_layer_name).explain(img_array)
+    return heatmaps[0], int(pred_index[0])
+
+IG_BATCH_SIZE = 16
 
 def _compute_predictions_and_gradients(inputs, model, target_class_idx):
+    """Target-class score and its input gradient for every row of ``inputs``
+
+    ``target_class_idx`` is an int or a per-row int tensor.
+    """
     with tf.GradientTape() as tape:
         tape.watch(inputs)
         preds = model(inputs, training=False)
         if preds.shape[-1] == 1:
-            p_idx = 0
+            pred = preds[:, 0]
         else:
-            p_idx = target_class_idx
-        pred = preds[:, p_idx]
+            targets = tf.broadcast_to(tf.cast(target_class_idx, tf.int32), tf.shape(preds)[:1])
+            pred = tf.gather(preds, targets, axis=1, batch_dims=1)
     grads = tape.gradient(pred, inputs)
     return pred, grads
 
-def integrated_gradients(inputs, model, target_class_idx, baseline=None, steps=50):
-    if baseline is None:
-        baseline = tf.zeros_like(inputs)
+def _weighted_gradient_sum(inputs, baseline, model, targets, alphas, weights, batch_size):
+    """sum_k weights[k] * grad f(baseline + alphas[k] * (inputs - baseline)) per image
 
-    interpolated_inputs = [
-        baseline + (float(i) / steps) * (inputs - baseline)
-        for i in range(0, steps + 1)
-    ]
-    interpolated_inputs = tf.concat(interpolated_inputs, axis=0)
+    The (image, alpha) pairs are evaluated ``batch_size`` rows at a time, so
+    peak memory depends on ``batch_size`` rather than on the step count.
 
-    preds, grads = _compute_predictions_and_gradients(interpolated_inputs, model, target_class_idx)
-    grads = tf.reshape(grads, (steps + 1,) + grads.shape[1:])
-    avg_grads = tf.reduce_mean((grads[:-1] + grads[1:]) / 2.0, axis=0)
+    Returns:
+        tuple: (weighted gradient sums of shape inputs.shape, scores of
+        shape (num_images, len(alphas)))
+    """
+    num_images, num_alphas = int(inputs.shape[0]), len(alphas)
+    delta = inputs - baseline
+    alphas = tf.constant(alphas, tf.float32)
+    weights = tf.constant(weights, tf.float32)
+    image_idx = np.repeat(np.arange(num_images), num_alphas)
+    alpha_idx = np.tile(np.arange(num_alphas), num_images)
 
-    integrated_grads = (inputs - baseline) * avg_grads
-    return integrated_grads[0]
+    total = tf.zeros_like(inputs)
+    scores = np.zeros((num_images, num_alphas), dtype=np.float32)
+    for start in range(0, len(image_idx), batch_size):
+        rows_n = image_idx[start:start + batch_size]
+        rows_k = alpha_idx[start:start + batch_size]
+        row_alphas = tf.reshape(tf.gather(alphas, rows_k), (-1, 1, 1, 1))
+        interpolated = tf.gather(baseline, rows_n) + row_alphas * tf.gather(delta, rows_n)
 
-def make_integrated_gradients_heatmap(img_array, model):
+        pred, grads = _compute_predictions_and_gradients(interpolated, model, tf.gather(targets, rows_n))
+        weighted = grads * tf.reshape(tf.gather(weights, rows_k), (-1, 1, 1, 1))
+        total += tf.math.unsorted_segment_sum(weighted, rows_n, num_images)
+        scores[rows_n, rows_k] = pred.numpy()
+
+    return total, scores
+
+def batched_integrated_gradients(inputs, model, target_class_idx, baseline=None, steps=50,
+                                 batch_size=IG_BATCH_SIZE, adaptive=False, tolerance=0.05, max_steps=400):
+    """Integrated Gradients for a batch of images with bounded memory
+
+    The path integral is approximated with the trapezoidal rule over
+    ``steps`` intervals. With ``adaptive=True`` the step count is doubled,
+    reusing every gradient already computed, until the completeness error
+    ``|sum(attributions) - (f(x) - f(baseline))| / |f(x) - f(baseline)|``
+    is below ``tolerance`` for every image or ``max_steps`` is reached.
+
+    Args:
+        inputs: float tensor of shape (N, H, W, C)
+        model: Keras model
+        target_class_idx: int or length-N sequence of class indices
+        baseline: tensor like ``inputs``; zeros by default
+        steps (int): initial number of intervals
+        batch_size (int): interpolated images per gradient computation
+        adaptive (bool): refine until the completeness check passes
+        tolerance (float): relative completeness error accepted
+        max_steps (int): upper bound on intervals when adaptive
+
+    Returns:
+        tuple: (attributions of shape (N, H, W, C), completeness errors (N,))
+    """
+    inputs = tf.convert_to_tensor(inputs, dtype=tf.float32)
+    baseline = tf.zeros_like(inputs) if baseline is None else tf.convert_to_tensor(baseline, dtype=tf.float32)
+    targets = tf.broadcast_to(tf.constant(target_class_idx, tf.int32), [int(inputs.shape[0])])
+
+    alphas = np.linspace(0.0, 1.0, steps + 1)
+    weights = np.full(steps + 1, 1.0 / steps)
+    weights[[0, -1]] *= 0.5
+    grad_sum, scores = _weighted_gradient_sum(inputs, baseline, model, targets, alphas, weights, batch_size)
+    score_gap = scores[:, -1] - scores[:, 0]
+
+    while True:
+        attributions = (inputs - baseline) * grad_sum
+        totals = tf.reduce_sum(attributions, axis=(1, 2, 3)).numpy()
+        errors = np.abs(totals - score_gap) / (np.abs(score_gap) + 1e-8)
+        if not adaptive or steps * 2 > max_steps or np.all(errors <= tolerance):
+            return attributions, errors
+
+        # Trapezoid refinement: T_2n = T_n / 2 + (1 / 2n) * sum f(midpoints)
+        midpoints = (np.arange(steps) + 0.5) / steps
+        mid_sum, _ = _weighted_gradient_sum(
+            inputs, baseline, model, targets, midpoints, np.full(steps, 0.5 / steps), batch_size
+        )
+        grad_sum = 0.5 * grad_sum + mid_sum
+        steps *= 2
+
+def integrated_gradients(inputs, model, target_class_idx, baseline=None, steps=50):
+    attributions, _ = batched_integrated_gradients(inputs, model, target_class_idx, baseline=baseline, steps=steps)
+    return attributions[0]
+
+def make_integrated_gradients_heatmaps(img_array, model, steps=50, batch_size=IG_BATCH_SIZE, adaptive=False):
+    """IG heatmaps for every image in ``img_array`` w.r.t. its predicted class
+
+    Returns:
+        tuple: (heatmaps of shape (N, H, W), predicted indices (N,))
+    """
+    img_array = tf.convert_to_tensor(img_array, dtype=tf.float32)
     preds = model(img_array, training=False).numpy()
     if preds.shape[-1] == 1:
-        pred_index = int(preds[0, 0] > 0.5)
+        pred_index = (preds[:, 0] > 0.5).astype(int)
     else:
-        pred_index = int(np.argmax(preds[0]))
+        pred_index = np.argmax(preds, axis=-1).astype(int)
 
-    ig_attrib = integrated_gradients(
-        inputs=tf.convert_to_tensor(img_array, dtype=tf.float32),
+    ig_attrib, _ = batched_integrated_gradients(
+        inputs=img_array,
         model=model,
         target_class_idx=pred_index,
         baseline=None,
-        steps=50,
-    ).numpy()
+        steps=steps,
+        batch_size=batch_size,
+        adaptive=adaptive
+    )
+
+    heatmaps = np.mean(np.abs(ig_attrib.numpy()), axis=-1)
+    heatmaps = heatmaps - heatmaps.min(axis=(1, 2), keepdims=True)
+    heatmaps = heatmaps / (heatmaps.max(axis=(1, 2), keepdims=True) + 1e-8)
+    return heatmaps.astype(np.float32), pred_index
+
+def make_integrated_gradients_heatmap(img_array, model):
+    heatmaps, pred_index = make_integrated_gradients_heatmaps(img_array, model)
+    return heatmaps[0], int(pred_index[0])
+
+_COLORMAP_LUTS = {}
+
+def colormap_lut(colormap=cm.jet):
+    """256-entry uint8 RGB lookup table for ``colormap``, computed once per colormap"""
+    lut = _COLORMAP_LUTS.get(colormap.name)
+    if lut is None:
+        lut = np.round(colormap(np.linspace(0.0, 1.0, 256))[:, :3] * 255).astype(np.uint8)
+        _COLORMAP_LUTS[colormap.name] = lut
+    return lut
 
-    heatmap = np.mean(np.abs(ig_attrib), axis=-1)
-    heatmap = heatmap - np.min(heatmap)
-    heatmap = heatmap / (np.max(heatmap) + 1e-8)
-    return heatmap.astype(np.float32), pred_index
+def _bilinear_axis(src, dst):
+    # Half-pixel-centred sample positions, like PIL / tf.image.resize
+    pos = np.clip((np.arange(dst, dtype=np.float32) + 0.5) * (src / dst) - 0.5, 0, src - 1)
+    lo = np.floor(pos).astype(np.int64)
+    hi = np.minimum(lo + 1, src - 1)
+    return lo, hi, (pos - lo).astype(np.float32)
+
+def resize_heatmaps(heatmaps, size):
+    """Bilinearly resize a batch of heatmaps (N, h, w) to ``size`` = (H, W)"""
+    heatmaps = np.asarray(heatmaps, dtype=np.float32)
+    height, width = size
+    r0, r1, wr = _bilinear_axis(heatmaps.shape[1], height)
+    c0, c1, wc = _bilinear_axis(heatmaps.shape[2], width)
+    rows = heatmaps[:, r0, :] + (heatmaps[:, r1, :] - heatmaps[:, r0, :]) * wr[None, :, None]
+    return rows[:, :, c0] + (rows[:, :, c1] - rows[:, :, c0]) * wc[None, None, :]
+
+def render_overlays(heatmaps, images, alpha=0.4, colormap=cm.jet):
+    """Colorize ``heatmaps`` and alpha-blend them onto ``images`` in one pass
+
+    Args:
+        heatmaps: (N, h, w) or (h, w) array with values in [0, 1]
+        images: (N, H, W, 3) or (H, W, 3) uint8 array, or floats in [0, 1]
+        alpha (float): weight of the heatmap in the blend
+        colormap: matplotlib colormap
+
+    Returns:
+        np.ndarray: uint8 overlays shaped like ``images``
+    """
+    images = np.asarray(images)
+    single = images.ndim == 3
+    if single:
+        images, heatmaps = images[None], np.asarray(heatmaps)[None]
+    if images.dtype != np.uint8:
+        images = np.clip(np.round(images * 255.0), 0, 255).astype(np.uint8)
+
+    resized = resize_heatmaps(heatmaps, images.shape[1:3])
+    indices = np.clip(resized * 255.0 + 0.5, 0, 255).astype(np.uint8)
+    colored = colormap_lut(colormap)[indices]
+
+    # Fixed-point blend: out = (img * (256 - a) + colored * a) / 256
+    a = int(round(alpha * 256))
+    blended = images.astype(np.uint16) * (256 - a) + colored.astype(np.uint16) * a
+    overlays = (blended >> 8).astype(np.uint8)
+    return overlays[0] if single else overlays
+
+def encode_image(array, format="PNG", quality=90):
+    """Encode a uint8 RGB array (e.g. an overlay) as PNG or JPEG bytes"""
+    buffer = io.BytesIO()
+    format = "JPEG" if format.upper() == "JPG" else format.upper()
+    options = {"quality": quality} if format == "JPEG" else {"compress_level": 1}
+    Image.fromarray(array).save(buffer, format=format, **options)
+    return buffer.getvalue()
 
 def overlay_heatmap_on_image(heatmap, image_path, alpha=0.4, colormap=cm.jet):
-    img = Image.open(image_path).convert("RGB")
-    heatmap_uint8 = np.uint8(255 * heatmap)
-    heatmap_pil = Image.fromarray(heatmap_uint8).resize(img.size)
-    colored = colormap(np.array(heatmap_pil) / 255.0)[:, :, :3]
-    colored = Image.fromarray((colored * 255).astype("uint8")).resize(img.size)
-    overlay = Image.blend(img, colored, alpha=alpha)
-    return overlay
+    """Overlay for a single image given as a path or an in-memory array"""
+    if isinstance(image_path, np.ndarray):
+        img = image_path
+    else:
+        with Image.open(image_path) as f:
+            img = np.asarray(f.convert("RGB"))
+    return Image.fromarray(render_overlays(heatmap, img, alpha=alpha, colormap=colormap))
+
+def predict_and_explain(img_array, model):
+    """Predictions plus one heatmap per image, sharing a single forward pass
+    when Grad-CAM applies
+
+    Returns:
+        tuple: (predictions, heatmaps, predicted indices, method used)
+    """
+    try:
+        explainer = get_gradcam_explainer(model)
+    except ValueError:
+        explainer = None
+
+    if explainer is not None:
+        preds, heatmaps, pred_index = explainer.explain(img_array)
+        return preds, heatmaps, pred_index, "gradcam"
+
+    preds = model(img_array, training=False).numpy()
+    heatmaps, pred_index = make_integrated_gradients_heatmaps(img_array, model)
+    return preds, heatmaps, pred_index, "ig"
 
 def explain_image(img_array, model):
-    last_conv = try_get_last_conv_layer_name(model)
-    if last_conv is not None:
-        heatmap, pred_index = make_gradcam_heatmap(img_array, model, last_conv)
-        return heatmap, pred_index, "gradcam"
-    else:
-        heatmap, pred_index = make_integrated_gradients_heatmap(img_array, model)
-        return heatmap, pred_index, "ig"
+    _, heatmaps, pred_index, method = predict_and_explain(img_array, model)
+    return heatmaps[0], int(pred_index[0]), method
@@ -0,0 +1,179 @@
+from pathlib import Path
+from typing import Sequence
+
+import numpy as np
+
+
+def confusion_matrix(labels: np.ndarray, predicted: np.ndarray, num_classes: int) -> np.ndarray:
+    """(num_classes, num_classes) counts, rows are true classes"""
+    return np.bincount(labels * num_classes + predicted, minlength=num_classes ** 2).reshape(num_classes, num_classes)
+
+
+def roc_curve(scores: np.ndarray, positives: np.ndarray):
+    """False/true positive rates at every distinct threshold, plus the AUC
+
+    One sort, then cumulative sums; tied scores form a single step so the
+    AUC matches the trapezoidal (Mann-Whitney) estimate.
+
+    Returns:
+        tuple: (fpr, tpr, auc); auc is NaN when only one class is present
+    """
+    order = np.argsort(-scores, kind="mergesort")
+    scores, positives = scores[order], positives[order].astype(np.float64)
+    distinct = np.r_[np.flatnonzero(np.diff(scores)), len(scores) - 1]
+    tps = np.cumsum(positives)[distinct]
+    fps = (distinct + 1) - tps
+
+    num_pos, num_neg = tps[-1] if len(tps) else 0.0, fps[-1] if len(fps) else 0.0
+    if num_pos == 0 or num_neg == 0:
+        return np.array([0.0, 1.0]), np.array([0.0, 1.0]), float("nan")
+    tpr = np.r_[0.0, tps / num_pos]
+    fpr = np.r_[0.0, fps / num_neg]
+    return fpr, tpr, float(np.sum(np.diff(fpr) * (tpr[1:] + tpr[:-1]) / 2))
+
+
+def calibration_bins(confidence: np.ndarray, correct: np.ndarray, num_bins: int = 15) -> dict:
+    """Equal-width confidence bins for a reliability diagram and the ECE"""
+    edges = np.linspace(0.0, 1.0, num_bins + 1)
+    bin_ids = np.clip(np.digitize(confidence, edges[1:-1], right=True), 0, num_bins - 1)
+    counts = np.bincount(bin_ids, minlength=num_bins)
+    conf_sum = np.bincount(bin_ids, weights=confidence, minlength=num_bins)
+    acc_sum = np.bincount(bin_ids, weights=correct.astype(np.float64), minlength=num_bins)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean_confidence = np.where(counts > 0, conf_sum / counts, np.nan)
+        accuracy = np.where(counts > 0, acc_sum / counts, np.nan)
+    gaps = np.abs(np.nan_to_num(accuracy) - np.nan_to_num(mean_confidence))
+    weights = counts / max(len(confidence), 1)
+    return {
+        "edges": edges,
+        "counts": counts,
+        "mean_confidence": mean_confidence,
+        "accuracy": accuracy,
+        "ece": float(np.sum(weights * gaps)),
+        "mce": float(gaps[counts > 0].max()) if counts.any() else 0.0,
+    }
+
+
+def classification_report(probs: np.ndarray, labels: np.ndarray, class_names: Sequence[str],
+                          num_bins: int = 15) -> dict:
+    """Every evaluation metric, derived from one array of probabilities
+
+    A single-column (sigmoid) output is treated as P(class 1).
+
+    Args:
+        probs (np.ndarray): (N, C) predicted probabilities
+        labels (np.ndarray): (N,) integer labels aligned with ``probs``
+        class_names (Sequence[str]): name of every class index
+        num_bins (int): calibration bins
+
+    Returns:
+        dict: JSON-serializable metrics, with the ROC curves and calibration
+        bins under the private ``_curves`` key for plotting
+    """
+    probs = np.asarray(probs, dtype=np.float64)
+    if probs.shape[-1] == 1:
+        probs = np.concatenate([1 - probs, probs], axis=-1)
+    labels = np.asarray(labels, dtype=np.int64)
+    num_classes = probs.shape[-1]
+    predicted = np.argmax(probs, axis=-1)
+
+    cm = confusion_matrix(labels, predicted, num_classes)
+    tp = np.diag(cm).astype(np.float64)
+    support = cm.sum(axis=1)
+    predicted_count = cm.sum(axis=0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        precision = np.where(predicted_count > 0, tp / predicted_count, 0.0)
+        recall = np.where(support > 0, tp / support, 0.0)
+        f1 = np.where(precision + recall > 0, 2 * precision * recall / (precision + recall), 0.0)
+
+    one_hot = np.eye(num_classes)[labels]
+    roc = [roc_curve(probs[:, k], one_hot[:, k]) for k in range(num_classes)]
+    auc = np.array([r[2] for r in roc])
+
+    clipped = np.clip(probs, 1e-7, 1 - 1e-7)
+    confidence = probs.max(axis=-1)
+    calibration = calibration_bins(confidence, predicted == labels, num_bins)
+
+    per_class = {
+        name: {
+            "precision": float(precision[k]),
+            "recall": float(recall[k]),
+            "f1": float(f1[k]),
+            "roc_auc": float(auc[k]),
+            "support": int(support[k]),
+        }
+        for k, name in enumerate(class_names)
+    }
+    weights = support / max(support.sum(), 1)
+    return {
+        "num_samples": int(len(labels)),
+        "accuracy": float(np.mean(predicted == labels)),
+        "loss": float(-np.mean(np.log(clipped[np.arange(len(labels)), labels]))),
+        "brier": float(np.mean(np.sum((probs - one_hot) ** 2, axis=-1))),
+        "ece": calibration["ece"],
+        "mce": calibration["mce"],
+        "macro_precision": float(precision.mean()),
+        "macro_recall": float(recall.mean()),
+        "macro_f1": float(f1.mean()),
+        "weighted_f1": float(np.sum(weights * f1)),
+        "macro_roc_auc": float(np.nanmean(auc)) if not np.all(np.isnan(auc)) else float("nan"),
+        "per_class": per_class,
+        "confusion_matrix": cm.tolist(),
+        "class_names": list(class_names),
+        "_curves": {
+            "roc": {name: (roc[k][0], roc[k][1], roc[k][2]) for k, name in enumerate(class_names)},
+            "calibration": calibration,
+        },
+    }
+
+
+def scalar_metrics(report: dict) -> dict:
+    """Flat ``name -> float`` view of ``classification_report``, for MLflow"""
+    metrics = {k: v for k, v in report.items() if isinstance(v, float) and np.isfinite(v)}
+    for name, values in report["per_class"].items():
+        for metric, value in values.items():
+            if metric != "support" and np.isfinite(value):
+                metrics[f"{metric}_{name}"] = value
+    return metrics
+
+
+def plot_roc_curves(report: dict, path: Path):
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    fig, ax = plt.subplots(figsize=(5, 5))
+    for name, (fpr, tpr, auc) in report["_curves"]["roc"].items():
+        ax.plot(fpr, tpr, label=f"{name} (AUC = {auc:.3f})")
+    ax.plot([0, 1], [0, 1], linestyle="--", color="grey", linewidth=1)
+    ax.set_xlabel("False positive rate")
+    ax.set_ylabel("True positive rate")
+    ax.set_title("ROC curves (one-vs-rest)")
+    ax.legend(loc="lower right")
+    fig.tight_layout()
+    fig.savefig(path, dpi=120)
+    plt.close(fig)
+
+
+def plot_reliability_diagram(report: dict, path: Path):
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    calibration = report["_curves"]["calibration"]
+    edges = calibration["edges"]
+    centers = (edges[:-1] + edges[1:]) / 2
+    filled = calibration["counts"] > 0
+
+    fig, ax = plt.subplots(figsize=(5, 5))
+    ax.bar(centers[filled], calibration["accuracy"][filled], width=np.diff(edges)[filled],
+           edgecolor="black", alpha=0.7, label="Accuracy")
+    ax.plot([0, 1], [0, 1], linestyle="--", color="grey", linewidth=1, label="Perfect calibration")
+    ax.set_xlabel("Confidence")
+    ax.set_ylabel("Accuracy")
+    ax.set_title(f"Reliability diagram (ECE = {calibration['ece']:.3f})")
+    ax.legend(loc="upper left")
+    fig.tight_layout()
+    fig.savefig(path, dpi=120)
+    plt.close(fig)
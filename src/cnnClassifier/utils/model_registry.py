@@ -0,0 +1,224 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+from cnnClassifier import logger
+
+
+DEFAULT_MODEL_PATH = Path("model/model.h5")
+DEFAULT_CLASS_INDICES_PATH = Path("model/class_indices.json")
+DEFAULT_IDX_TO_LABEL = {0: "Tumor", 1: "Normal"}
+
+
+@dataclass(frozen=True)
+class ModelHandle:
+    path: Path
+    version: str
+    model: Any
+    loaded_at: float
+
+
+def _keras_loader(path: Path) -> Any:
+    from tensorflow.keras.models import load_model
+    return load_model(path, compile=False)
+
+
+class TFLiteModel:
+    """Keras-like ``predict`` over a TFLite interpreter
+
+    Handles any batch size by resizing the input tensor, and quantizes /
+    dequantizes inputs and outputs for fully integer models. Calls are
+    serialized because an interpreter is not thread-safe.
+    """
+
+    def __init__(self, path: Path, num_threads: Optional[int] = None):
+        import tensorflow as tf
+
+        self.path = Path(path)
+        self.interpreter = tf.lite.Interpreter(model_path=str(path), num_threads=num_threads)
+        self.interpreter.allocate_tensors()
+        self._input = self.interpreter.get_input_details()[0]
+        self._output = self.interpreter.get_output_details()[0]
+        self.input_shape = (None,) + tuple(int(d) for d in self._input["shape"][1:])
+        self._lock = threading.Lock()
+
+    def predict(self, x, batch_size=None, verbose=0):
+        import numpy as np
+
+        x = np.asarray(x, dtype=np.float32)
+        index = self._input["index"]
+        with self._lock:
+            if self.interpreter.get_input_details()[0]["shape"][0] != len(x):
+                self.interpreter.resize_tensor_input(index, [len(x)] + list(x.shape[1:]))
+                self.interpreter.allocate_tensors()
+
+            dtype = self._input["dtype"]
+            if dtype != np.float32:
+                scale, zero_point = self._input["quantization"]
+                info = np.iinfo(dtype)
+                x = np.clip(np.round(x / scale + zero_point), info.min, info.max).astype(dtype)
+
+            self.interpreter.set_tensor(index, x)
+            self.interpreter.invoke()
+            out = self.interpreter.get_tensor(self._output["index"])
+
+        if self._output["dtype"] != np.float32:
+            scale, zero_point = self._output["quantization"]
+            out = (out.astype(np.float32) - zero_point) * scale
+        return out
+
+    __call__ = predict
+
+
+def fingerprint(path: Path, hash_contents: bool = False) -> str:
+    """Version string for a model file or SavedModel directory
+
+    Args:
+        path (Path): model file or directory
+        hash_contents (bool, optional): hash the bytes instead of using
+            mtime/size. Defaults to False.
+
+    Returns:
+        str: version string that changes whenever the model changes on disk
+    """
+    path = Path(path)
+    files = [path] if path.is_file() else sorted(p for p in path.rglob("*") if p.is_file())
+    if not files:
+        raise FileNotFoundError(f"model not found at: {path}")
+
+    digest = hashlib.sha256()
+    for f in files:
+        if hash_contents:
+            with open(f, "rb") as fh:
+                for chunk in iter(lambda: fh.read(1 << 20), b""):
+                    digest.update(chunk)
+        else:
+            st = f.stat()
+            digest.update(f"{f}:{st.st_mtime_ns}:{st.st_size}".encode())
+    return digest.hexdigest()[:16]
+
+
+class ModelRegistry:
+    """Process-wide cache of loaded models keyed by path and on-disk version.
+
+    Every lookup re-stats the model (at most once per ``check_interval``
+    seconds) and transparently reloads it when the file has changed, so a
+    retrained ``model.h5`` is picked up without restarting the server.
+    """
+
+    def __init__(self, check_interval: float = 2.0, hash_contents: bool = False):
+        self.check_interval = check_interval
+        self.hash_contents = hash_contents
+        self._handles: Dict[str, ModelHandle] = {}
+        self._last_checked: Dict[str, float] = {}
+        self._labels: Dict[str, tuple] = {}
+        self._warmed: Dict[str, str] = {}
+        self._loaders: Dict[str, Callable[[Path], Any]] = {
+            ".h5": _keras_loader,
+            ".keras": _keras_loader,
+            ".tflite": TFLiteModel
+        }
+        self._lock = threading.Lock()
+        self._key_locks: Dict[str, threading.Lock] = {}
+
+    def register_loader(self, suffix: str, loader: Callable[[Path], Any]):
+        """Use ``loader`` for model files ending with ``suffix``"""
+        self._loaders[suffix] = loader
+
+    def _key_lock(self, key: str) -> threading.Lock:
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def get(self, path: Path = DEFAULT_MODEL_PATH) -> ModelHandle:
+        """Return the loaded model for ``path``, loading or reloading it if needed"""
+        path = Path(path)
+        key = str(path.resolve())
+        now = time.monotonic()
+
+        handle = self._handles.get(key)
+        if handle is not None and now - self._last_checked.get(key, 0.0) < self.check_interval:
+            return handle
+
+        with self._key_lock(key):
+            handle = self._handles.get(key)
+            version = fingerprint(path, self.hash_contents)
+            self._last_checked[key] = time.monotonic()
+            if handle is not None and handle.version == version:
+                return handle
+
+            if handle is not None:
+                logger.info(f"model at {path} changed on disk, reloading")
+            loader = self._loaders.get(path.suffix, _keras_loader)
+            start = time.perf_counter()
+            model = loader(path)
+            logger.info(f"model loaded from: {path} (version {version}) in {time.perf_counter() - start:.2f}s")
+
+            handle = ModelHandle(path=path, version=version, model=model, loaded_at=time.time())
+            self._handles[key] = handle
+            return handle
+
+    def get_model(self, path: Path = DEFAULT_MODEL_PATH) -> Any:
+        return self.get(path).model
+
+    def get_class_labels(self, path: Path = DEFAULT_CLASS_INDICES_PATH) -> dict:
+        """Index -> label mapping from ``class_indices.json``, cached by mtime
+
+        Falls back to the default Tumor/Normal mapping when the file is
+        missing or unreadable.
+        """
+        path = Path(path)
+        key = str(path.resolve())
+        try:
+            stamp = os.stat(path).st_mtime_ns
+        except OSError:
+            stamp = None
+
+        cached = self._labels.get(key)
+        if cached is not None and cached[0] == stamp:
+            return cached[1]
+
+        try:
+            with open(path, "r") as f:
+                class_indices = json.load(f)
+            idx_to_label = {int(v): k for k, v in class_indices.items()}
+        except Exception:
+            logger.warning(f"could not load {path}, using default class labels")
+            idx_to_label = dict(DEFAULT_IDX_TO_LABEL)
+
+        self._labels[key] = (stamp, idx_to_label)
+        return idx_to_label
+
+    def warm_up(self, path: Path = DEFAULT_MODEL_PATH, input_shape: Optional[tuple] = None) -> ModelHandle:
+        """Load ``path`` and run one dummy forward pass so the first real
+        request does not pay for graph tracing. No-op if already warm.
+        """
+        import numpy as np
+
+        handle = self.get(path)
+        key = str(Path(path).resolve())
+        # The per-model lock makes concurrent callers wait for one warm-up
+        # instead of each running their own
+        with self._key_lock(key):
+            if self._warmed.get(key) == handle.version:
+                return handle
+
+            if input_shape is None:
+                input_shape = tuple(handle.model.input_shape[1:])
+            handle.model.predict(np.zeros((1,) + tuple(input_shape), dtype=np.float32), verbose=0)
+            self._warmed[key] = handle.version
+        logger.info(f"model at {path} warmed up")
+        return handle
+
+    def evict(self, path: Path):
+        key = str(Path(path).resolve())
+        with self._key_lock(key):
+            self._handles.pop(key, None)
+            self._last_checked.pop(key, None)
+            self._warmed.pop(key, None)
+
+
+model_registry = ModelRegistry()
@@ -0,0 +1,58 @@
+import tensorflow as tf
+from cnnClassifier import logger
+
+
+PRECISION_POLICIES = ("float32", "mixed_bfloat16", "mixed_float16")
+
+
+def cpu_supports_bfloat16() -> bool:
+    """True when the host CPU has native bfloat16 instructions (AVX512-BF16 / AMX)"""
+    try:
+        with open("/proc/cpuinfo") as f:
+            flags = f.read()
+    except OSError:
+        return False
+    return "avx512_bf16" in flags or "amx_bf16" in flags
+
+
+def resolve_precision_policy(requested: str) -> str:
+    """Pick the policy to train with, falling back to float32 when the
+    hardware cannot run the requested one efficiently
+    """
+    if requested not in PRECISION_POLICIES:
+        raise ValueError(f"PRECISION must be one of {PRECISION_POLICIES}, got {requested!r}")
+
+    has_gpu = bool(tf.config.list_physical_devices("GPU"))
+    if requested == "mixed_bfloat16" and not (has_gpu or cpu_supports_bfloat16()):
+        logger.warning("CPU has no native bfloat16 support, training in float32")
+        return "float32"
+    if requested == "mixed_float16" and not has_gpu:
+        logger.warning("mixed_float16 needs a GPU, training in float32")
+        return "float32"
+    return requested
+
+
+def cast_model_to_policy(model: tf.keras.Model, policy: str) -> tf.keras.Model:
+    """Rebuild ``model`` with every layer under ``policy`` except the output
+    layers, which stay float32 so softmax and the loss run at full precision.
+    Weights and trainable flags are carried over.
+    """
+    output_names = set(model.output_names)
+
+    def _clone(layer):
+        config = layer.get_config()
+        config["dtype"] = "float32" if layer.name in output_names else policy
+        return layer.__class__.from_config(config)
+
+    clone = tf.keras.models.clone_model(model, clone_function=_clone)
+    clone.set_weights(model.get_weights())
+    return clone
+
+
+def wrap_optimizer(optimizer: tf.keras.optimizers.Optimizer, policy: str):
+    """Add dynamic loss scaling for float16; bfloat16 has float32's exponent
+    range and needs none
+    """
+    if policy == "mixed_float16":
+        return tf.keras.mixed_precision.LossScaleOptimizer(optimizer)
+    return optimizer
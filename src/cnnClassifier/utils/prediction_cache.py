@@ -0,0 +1,209 @@
+import os
+import json
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+import numpy as np
+from cnnClassifier import logger
+
+
+_EXTENSIONS = {np.ndarray: ".npy", bytes: ".bin", dict: ".json"}
+
+
+def content_hash(source) -> str:
+    """sha256 of an image given as encoded bytes, a file path or an array
+
+    Arrays are hashed together with their shape and dtype so equal buffers
+    with different layouts do not collide.
+    """
+    digest = hashlib.sha256()
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        digest.update(source)
+    elif isinstance(source, np.ndarray):
+        digest.update(f"{source.shape}:{source.dtype}:".encode())
+        digest.update(np.ascontiguousarray(source).tobytes())
+    else:
+        with open(source, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _nbytes(value) -> int:
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, bytes):
+        return len(value)
+    return len(json.dumps(value))
+
+
+class PredictionCache:
+    """Two-tier cache of per-image results keyed by content and model version
+
+    Entries are addressed by (content hash, model version, kind), where kind
+    names the artifact, e.g. ``"prediction"``, ``"heatmap"`` or ``"report"``.
+    Retraining the model changes its version, so stale results are never
+    served. Values are numpy arrays, bytes, or JSON-serializable dicts.
+
+    The memory tier is an LRU bounded by ``max_entries`` and
+    ``max_memory_bytes``. When ``disk_dir`` is set, entries are also written
+    to ``<disk_dir>/<model version>/<hash>.<kind>.<ext>`` and the oldest
+    (by last access) are deleted once the tier exceeds ``max_disk_bytes``.
+    """
+
+    def __init__(self, max_entries: int = 256, max_memory_bytes: int = 256 * 2**20,
+                 disk_dir: Optional[Path] = None, max_disk_bytes: int = 1024 * 2**20):
+        self.max_entries = max_entries
+        self.max_memory_bytes = max_memory_bytes
+        self.disk_dir = Path(disk_dir) if disk_dir is not None else None
+        self.max_disk_bytes = max_disk_bytes
+
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        self._disk_bytes = 0
+        if self.disk_dir is not None:
+            os.makedirs(self.disk_dir, exist_ok=True)
+            self._disk_bytes = sum(size for _, size, _ in self._committed_entries())
+
+    @staticmethod
+    def _key(digest: str, version: str, kind: str) -> tuple:
+        return (version, digest, kind)
+
+    def _disk_path(self, key: tuple, ext: str) -> Path:
+        version, digest, kind = key
+        return self.disk_dir / version / f"{digest}.{kind}{ext}"
+
+    def _remember(self, key: tuple, value):
+        size = _nbytes(value)
+        if size > self.max_memory_bytes:
+            return
+        old = self._memory.pop(key, None)
+        if old is not None:
+            self._memory_bytes -= _nbytes(old)
+        self._memory[key] = value
+        self._memory_bytes += size
+        while self._memory and (len(self._memory) > self.max_entries or self._memory_bytes > self.max_memory_bytes):
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= _nbytes(evicted)
+
+    def _read_disk(self, key: tuple):
+        for ext in _EXTENSIONS.values():
+            path = self._disk_path(key, ext)
+            try:
+                if ext == ".npy":
+                    value = np.load(path, allow_pickle=False)
+                elif ext == ".bin":
+                    value = path.read_bytes()
+                else:
+                    value = json.loads(path.read_text())
+            except (FileNotFoundError, NotADirectoryError):
+                continue
+            except Exception as e:
+                logger.warning(f"dropping unreadable cache entry {path}: {e}")
+                path.unlink(missing_ok=True)
+                continue
+            os.utime(path)
+            return value
+        return None
+
+    def _write_disk(self, key: tuple, value):
+        ext = next(ext for kind, ext in _EXTENSIONS.items() if isinstance(value, kind))
+        path = self._disk_path(key, ext)
+        os.makedirs(path.parent, exist_ok=True)
+        # Unique per writer, so concurrent writers never share a temp file
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=path.name + ".", suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            if ext == ".npy":
+                np.save(f, value, allow_pickle=False)
+            elif ext == ".bin":
+                f.write(value)
+            else:
+                f.write(json.dumps(value).encode())
+        previous = path.stat().st_size if path.exists() else 0
+        os.replace(tmp_path, path)
+        self._disk_bytes += path.stat().st_size - previous
+        if self._disk_bytes > self.max_disk_bytes:
+            self._evict_disk()
+
+    def _committed_entries(self) -> list:
+        """(mtime, size, path) of every complete entry on disk
+
+        In-flight ``.tmp`` files of this or another writer are left out, as
+        are entries that disappear while scanning.
+        """
+        entries = []
+        suffixes = set(_EXTENSIONS.values())
+        for p in self.disk_dir.rglob("*"):
+            if p.suffix not in suffixes:
+                continue
+            try:
+                st = p.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_size, p))
+        return entries
+
+    def _evict_disk(self):
+        entries = sorted(self._committed_entries())
+        total = sum(size for _, size, _ in entries)
+        # Evict down to 90% of the limit so we do not rescan on every write
+        target = int(self.max_disk_bytes * 0.9)
+        for _, size, p in entries:
+            if total <= target:
+                break
+            p.unlink(missing_ok=True)
+            total -= size
+        self._disk_bytes = total
+        for d in self.disk_dir.iterdir():
+            if d.is_dir() and not any(d.iterdir()):
+                d.rmdir()
+
+    def get(self, digest: str, version: str, kind: str) -> Any:
+        """Cached value or None"""
+        key = self._key(digest, version, kind)
+        with self._lock:
+            value = self._memory.get(key)
+            if value is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return value
+            if self.disk_dir is not None:
+                value = self._read_disk(key)
+                if value is not None:
+                    self._remember(key, value)
+                    self.hits += 1
+                    return value
+            self.misses += 1
+            return None
+
+    def put(self, digest: str, version: str, kind: str, value):
+        if not isinstance(value, tuple(_EXTENSIONS)):
+            raise TypeError(f"cannot cache value of type {type(value).__name__}")
+        key = self._key(digest, version, kind)
+        with self._lock:
+            self._remember(key, value)
+            if self.disk_dir is not None:
+                try:
+                    self._write_disk(key, value)
+                except OSError as e:
+                    logger.warning(f"could not write cache entry for {digest[:12]}: {e}")
+
+    def get_or_compute(self, digest: str, version: str, kind: str, compute: Callable[[], Any]) -> Any:
+        value = self.get(digest, version, kind)
+        if value is None:
+            value = compute()
+            self.put(digest, version, kind, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self._memory_bytes = 0
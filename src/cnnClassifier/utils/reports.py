@@ -0,0 +1,195 @@
+import io
+import os
+import tempfile
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+import numpy as np
+from PIL import Image
+from fpdf import FPDF
+from cnnClassifier import logger
+from cnnClassifier.utils.gradcam_utils import encode_image
+
+try:
+    from fpdf import FPDF_VERSION
+except ImportError:
+    FPDF_VERSION = "1"
+
+# fpdf2 embeds images from file-like objects, fpdf 1.x only from paths
+_IMAGES_FROM_MEMORY = int(FPDF_VERSION.split(".")[0]) >= 2
+_PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+
+def pdf_to_bytes(pdf: FPDF) -> bytes:
+    """Render ``pdf`` in memory
+
+    fpdf 1.x returns the document as a latin-1 ``str`` from
+    ``output(dest="S")``; fpdf2 returns a ``bytearray``.
+    """
+    out = pdf.output(dest="S")
+    if isinstance(out, str):
+        return out.encode("latin-1")
+    return bytes(out)
+
+
+def _add_image(pdf: FPDF, image, **kwargs):
+    """Place a path, encoded bytes or uint8 RGB array on the current page"""
+    if isinstance(image, (str, os.PathLike)):
+        pdf.image(str(image), **kwargs)
+        return
+
+    if isinstance(image, np.ndarray):
+        data, image_type = encode_image(image, "PNG"), "PNG"
+    else:
+        data = bytes(image)
+        if data.startswith(_PNG_SIGNATURE):
+            image_type = "PNG"
+        else:
+            with Image.open(io.BytesIO(data)) as img:
+                image_type = img.format
+
+    if _IMAGES_FROM_MEMORY:
+        pdf.image(io.BytesIO(data), **kwargs)
+        return
+
+    fd, path = tempfile.mkstemp(suffix=f".{image_type.lower()}")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        pdf.image(path, type=image_type, **kwargs)
+    finally:
+        os.remove(path)
+
+
+def prediction_report(label, image, confidence: Optional[float] = None, overlay=None,
+                      method: Optional[str] = None) -> bytes:
+    """Prediction report as PDF bytes
+
+    Args:
+        label (str): predicted class
+        image: scan as a path, encoded bytes or uint8 RGB array
+        confidence (float, optional): confidence in percent
+        overlay (optional): explanation overlay, as a uint8 RGB array or
+            encoded bytes, to place next to the scan
+        method (str, optional): explanation method, e.g. ``"gradcam"``
+    """
+    pdf = FPDF()
+    pdf.add_page()
+    pdf.set_font("Arial", size=14)
+    pdf.cell(200, 10, txt="Kidney Tumor Prediction Report", ln=True, align="C")
+    pdf.ln(10)
+
+    pdf.set_font("Arial", size=12)
+    pdf.cell(200, 10, txt=f"Prediction: {label}", ln=True)
+    if confidence is not None:
+        pdf.cell(200, 10, txt=f"Confidence: {confidence:.2f}%", ln=True)
+    pdf.ln(5)
+
+    if overlay is None:
+        _add_image(pdf, image, x=10, y=50, w=100)
+    else:
+        _add_image(pdf, image, x=10, y=50, w=90)
+        _add_image(pdf, overlay, x=110, y=50, w=90)
+        pdf.set_xy(110, 145)
+        pdf.set_font("Arial", size=10)
+        pdf.cell(90, 8, txt=f"Explanation ({(method or 'heatmap').upper()})", align="C")
+    return pdf_to_bytes(pdf)
+
+
+class CardPDF(FPDF):
+    def __init__(self, title: str):
+        super().__init__()
+        self.title_text = title
+
+    def header(self):
+        self.set_font("Arial", "B", 16)
+        self.cell(0, 10, self.title_text, ln=True, align="C")
+        self.ln(10)
+
+    def chapter_title(self, title):
+        self.set_font("Arial", "B", 14)
+        self.cell(0, 10, title, ln=True)
+        self.ln(5)
+
+    def chapter_body(self, body):
+        self.set_font("Arial", "", 12)
+        self.multi_cell(0, 10, body)
+        self.ln()
+
+    def add_section(self, title, body):
+        self.chapter_title(title)
+        self.chapter_body(body)
+
+
+def card_report(title: str, sections) -> bytes:
+    """Text-only document made of (title, body) sections, as PDF bytes"""
+    pdf = CardPDF(title)
+    pdf.add_page()
+    for section_title, body in sections:
+        pdf.add_section(section_title, body)
+    return pdf_to_bytes(pdf)
+
+
+class ReportHandle:
+    """Pollable handle on a report being rendered by ``ReportService``"""
+
+    def __init__(self, future: Future, key: Optional[str] = None):
+        self._future = future
+        self.key = key
+
+    @property
+    def status(self) -> str:
+        if self._future.running():
+            return "running"
+        if not self._future.done():
+            return "pending"
+        return "failed" if self._future.exception() is not None else "done"
+
+    def done(self) -> bool:
+        return self._future.done()
+
+    def result(self, timeout: Optional[float] = None) -> bytes:
+        """PDF bytes; blocks until rendered and re-raises rendering errors"""
+        return self._future.result(timeout)
+
+    def iter_chunks(self, chunk_size: int = 64 * 1024, timeout: Optional[float] = None):
+        """Stream the finished PDF in chunks, e.g. for an HTTP response"""
+        data = self.result(timeout)
+        for start in range(0, len(data), chunk_size):
+            yield data[start:start + chunk_size]
+
+
+class ReportService:
+    """Render PDF reports on a small worker pool, off the request path
+
+    ``submit`` queues a report and returns immediately with a
+    ``ReportHandle``. ``static`` does the same for documents whose content
+    never changes for a given key (e.g. the model card): they are rendered
+    once per process and every later call gets the same handle.
+    """
+
+    def __init__(self, max_workers: int = 2):
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="report")
+        self._static: Dict[str, ReportHandle] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, render: Callable[..., bytes], *args, **kwargs) -> ReportHandle:
+        return ReportHandle(self._pool.submit(render, *args, **kwargs))
+
+    def static(self, key: str, render: Callable[..., bytes], *args, **kwargs) -> ReportHandle:
+        with self._lock:
+            handle = self._static.get(key)
+            if handle is not None and not (handle.done() and handle.status == "failed"):
+                return handle
+            if handle is not None:
+                logger.warning(f"re-rendering report {key!r} after a failed attempt")
+            handle = ReportHandle(self._pool.submit(render, *args, **kwargs), key=key)
+            self._static[key] = handle
+            return handle
+
+    def shutdown(self, wait: bool = True):
+        self._pool.shutdown(wait=wait)
+
+
+report_service = ReportService()
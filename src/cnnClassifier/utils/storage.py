@@ -0,0 +1,122 @@
+import os
+import time
+import threading
+from pathlib import Path
+from typing import Optional
+from cnnClassifier import logger
+
+
+class StorageManager:
+    """Bounded directory for files the app writes on behalf of users
+
+    Files older than ``ttl_seconds`` (by last write or access through
+    ``open_path``) are deleted, and when the directory grows past
+    ``quota_bytes`` the least recently used files go first until usage is
+    back under ``low_watermark`` of the quota. ``store`` enforces the quota
+    synchronously; ``start_sweeper`` additionally expires files in the
+    background every ``sweep_interval`` seconds.
+    """
+
+    def __init__(self, root_dir: Path, quota_bytes: int = 1024 * 2**20, ttl_seconds: Optional[float] = 24 * 3600,
+                 sweep_interval: float = 600.0, low_watermark: float = 0.9):
+        self.root_dir = Path(root_dir)
+        self.quota_bytes = quota_bytes
+        self.ttl_seconds = ttl_seconds
+        self.sweep_interval = sweep_interval
+        self.low_watermark = low_watermark
+
+        os.makedirs(self.root_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._usage = self._scan_usage()
+
+    def _entries(self):
+        entries = []
+        with os.scandir(self.root_dir) as it:
+            for entry in it:
+                if entry.is_file(follow_symlinks=False) and not entry.name.endswith(".tmp"):
+                    st = entry.stat(follow_symlinks=False)
+                    entries.append((st.st_mtime, st.st_size, entry.path))
+        return entries
+
+    def _scan_usage(self) -> int:
+        return sum(size for _, size, _ in self._entries())
+
+    def usage(self) -> int:
+        """Bytes currently stored"""
+        return self._usage
+
+    def path_for(self, name: str) -> Path:
+        return self.root_dir / Path(name).name
+
+    def exists(self, name: str) -> bool:
+        return self.path_for(name).exists()
+
+    def store(self, name: str, data: bytes) -> Path:
+        """Atomically write ``data`` under ``name``; existing files are only touched"""
+        path = self.path_for(name)
+        with self._lock:
+            if path.exists():
+                os.utime(path)
+                return path
+            if len(data) > self.quota_bytes:
+                raise ValueError(f"{name} ({len(data)} bytes) exceeds the storage quota of {self.quota_bytes} bytes")
+
+            tmp_path = path.with_name(path.name + ".tmp")
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+            self._usage += len(data)
+            if self._usage > self.quota_bytes:
+                self._evict(time.time(), protect=str(path))
+        return path
+
+    def open_path(self, name: str) -> Path:
+        """Path of a stored file, marking it as recently used"""
+        path = self.path_for(name)
+        os.utime(path)
+        return path
+
+    def _evict(self, now: float, protect: Optional[str] = None):
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        target = int(self.quota_bytes * self.low_watermark)
+        removed = 0
+        for mtime, size, path in entries:
+            expired = self.ttl_seconds is not None and now - mtime > self.ttl_seconds
+            if (not expired and total <= target) or path == protect:
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed += 1
+        self._usage = total
+        if removed:
+            logger.info(f"storage sweep removed {removed} file(s) from {self.root_dir}, {total / 2**20:.1f} MB in use")
+
+    def sweep(self):
+        """Delete expired files, then the least recently used ones over quota"""
+        with self._lock:
+            self._evict(time.time())
+
+    def _run(self):
+        while not self._stop.wait(self.sweep_interval):
+            try:
+                self.sweep()
+            except Exception as e:
+                logger.warning(f"storage sweep of {self.root_dir} failed: {e}")
+
+    def start_sweeper(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="storage-sweeper", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)